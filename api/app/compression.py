@@ -0,0 +1,131 @@
+import gzip
+import os
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Brotli is optional: pip install brotli
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types never worth compressing here: SSE must reach the client event by event
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in order of preference"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+def negotiate_encoding(accept_encoding: Optional[str], supported: List[str]) -> Optional[str]:
+    """Pick the supported encoding with the highest q-value in Accept-Encoding; ties keep server order"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best: Tuple[float, Optional[str]] = (0.0, None)
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best[0]:
+            best = (q, encoding)
+    return best[1]
+
+def add_vary_accept_encoding(headers: MutableHeaders) -> None:
+    """Add Accept-Encoding to Vary, merged with any existing value and never twice"""
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+        return
+    fields = {field.strip().lower() for field in vary.split(",")}
+    if not fields & {"accept-encoding", "*"}:
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+class CompressionMiddleware:
+    """
+    Compress complete responses above `minimum_size` with brotli or gzip,
+    whichever the client prefers.
+
+    Streamed responses (more than one body message), server-sent events and
+    responses that already carry a Content-Encoding are passed through as-is.
+    Every response but server-sent events carries `Vary: Accept-Encoding`,
+    compressed or not, so shared caches keep the encodings apart.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES):
+                    passthrough = True
+                    await send(message)
+                    return
+                add_vary_accept_encoding(headers)
+                if encoding is None or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # held until we know whether the body is worth compressing
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small: send untouched
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
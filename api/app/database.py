@@ -1,12 +1,61 @@
 import os
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=os.getenv("DEBUG", "False").lower() == "true"
-)
+# Applied to every new SQLite connection; override any of them via env vars
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative = KiB, i.e. 64 MiB
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+def _is_sqlite_file(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _engine_options(url) -> dict:
+    """Pool sizing from env vars; file-backed SQLite gets a real pool instead of NullPool"""
+    options = {
+        "echo": os.getenv("DEBUG", "False").lower() == "true"
+    }
+    if url.get_backend_name() == "sqlite" and not _is_sqlite_file(url):
+        return options  # in-memory SQLite keeps its single static connection
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "-1")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "False").lower() == "true"
+    )
+    if _is_sqlite_file(url):
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            if value:
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def create_database_engine(database_url: str = DATABASE_URL) -> AsyncEngine:
+    """Create the async engine with pool settings and, for SQLite, connection pragmas"""
+    url = make_url(database_url)
+    db_engine = create_async_engine(url, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
+engine = create_database_engine()
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -14,9 +63,25 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+async def init_database(db_engine: AsyncEngine = engine):
+    """Create missing tables, upgrade existing ones and create any missing indexes"""
+    from app.migrations import upgrade_schema
+    from app.models import Base
+
+    def create_schema(sync_conn):
+        Base.metadata.create_all(sync_conn)
+        upgrade_schema(sync_conn)
+        # create_all skips existing tables entirely, including their new indexes
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+    async with db_engine.begin() as conn:
+        await conn.run_sync(create_schema)
+
 async def get_database():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
@@ -0,0 +1,310 @@
+"""
+Dependency-free Prometheus metrics.
+
+Counters, gauges and histograms live in one process-wide registry and are
+rendered in the Prometheus text exposition format by `GET /metrics`.
+Recording is a dict lookup plus an addition, cheap enough for every request.
+
+Stage timings use `STAGE_SECONDS`:
+
+    with STAGE_SECONDS.time(stage="db_write"):
+        await db.commit()
+"""
+
+import math
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+class SampledCounter(Counter):
+    """A counter mirroring a monotonic total kept by another object, copied in at scrape time"""
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+class _Timer:
+    __slots__ = ("histogram", "key", "started")
+
+    def __init__(self, histogram: "Histogram", key: LabelValues):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram._observe(self.key, time.perf_counter() - self.started)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._observe(self._key(labels), value)
+
+    def time(self, **labels: str) -> _Timer:
+        """Context manager observing the duration of its block in seconds"""
+        return _Timer(self, self._key(labels))
+
+    def _observe(self, key: LabelValues, value: float) -> None:
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), self._counts[key]):
+                cumulative += count
+                labels = _format_labels(bucket_labels, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "recipe_stage_seconds",
+    "Time spent per processing stage",
+    ["stage"]
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by handler and status",
+    ["method", "handler", "status"]
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served"
+))
+UPSTREAM_RESPONSES = REGISTRY.register(Counter(
+    "openrouter_responses_total",
+    "OpenRouter responses by model and status code (`error` for transport failures)",
+    ["model", "status"]
+))
+FALLBACKS_SERVED = REGISTRY.register(Counter(
+    "recipe_fallbacks_served_total",
+    "Responses answered with the static fallback recipes",
+    ["endpoint"]
+))
+STREAMS_INTERRUPTED = REGISTRY.register(Counter(
+    "recipe_streams_interrupted_total",
+    "Streamed analyses that failed after sending some recipes; the partial result is not cached or stored"
+))
+LLM_INVALID_RECIPES = REGISTRY.register(Counter(
+    "recipe_llm_invalid_recipes_total",
+    "Recipes dropped from LLM responses because they failed validation"
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "recipe_cache_requests_total",
+    "Recipe lookups by source: cache, stored recipes, or miss",
+    ["result"]
+))
+RUNTIME_GAUGE = REGISTRY.register(Gauge(
+    "recipe_runtime",
+    "Point-in-time runtime state, sampled at scrape time",
+    ["component", "stat"]
+))
+RUNTIME_EVENTS = REGISTRY.register(SampledCounter(
+    "recipe_runtime_events_total",
+    "Runtime event counts since process start, sampled at scrape time",
+    ["component", "event"]
+))
+
+# recipe_cache.stats() keys that only ever grow; the rest are levels
+_CACHE_EVENTS = ("hits", "misses", "evictions", "expirations")
+
+def collect_runtime_gauges(state, engine) -> None:
+    """Refresh the sampled gauges and event counters from the objects the lifespan put on app.state"""
+    scheduler = getattr(state, "upstream_scheduler", None)
+    if scheduler is not None:
+        RUNTIME_GAUGE.set(scheduler.active, component="upstream", stat="active")
+        RUNTIME_GAUGE.set(scheduler.waiting, component="upstream", stat="waiting")
+        RUNTIME_EVENTS.set(scheduler.rejected, component="upstream", event="rejected")
+        RUNTIME_EVENTS.set(scheduler.retries, component="upstream", event="retries")
+
+    single_flight = getattr(state, "single_flight", None)
+    if single_flight is not None:
+        RUNTIME_GAUGE.set(len(single_flight), component="single_flight", stat="in_flight")
+
+    writer = getattr(state, "analysis_writer", None)
+    if writer is not None:
+        RUNTIME_GAUGE.set(writer.pending, component="analysis_writer", stat="pending")
+        RUNTIME_EVENTS.set(writer.written, component="analysis_writer", event="written")
+        RUNTIME_EVENTS.set(writer.failed, component="analysis_writer", event="failed")
+
+    jobs = getattr(state, "analysis_jobs", None)
+    if jobs is not None:
+        RUNTIME_EVENTS.set(jobs.completed, component="analysis_jobs", event="completed")
+        RUNTIME_EVENTS.set(jobs.failed, component="analysis_jobs", event="failed")
+
+    similar_index = getattr(state, "similar_index", None)
+    if similar_index is not None:
+        RUNTIME_GAUGE.set(len(similar_index), component="similar_index", stat="ingredient_sets")
+
+    cache = getattr(state, "recipe_cache", None)
+    if cache is not None:
+        for stat, value in cache.stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+            if stat in _CACHE_EVENTS:
+                RUNTIME_EVENTS.set(value, component="recipe_cache", event=stat)
+            else:
+                RUNTIME_GAUGE.set(value, component="recipe_cache", stat=stat)
+
+    model_pool = getattr(state, "model_pool", None)
+    if model_pool is not None:
+        for model, stats in model_pool.stats().items():
+            RUNTIME_GAUGE.set(1 if stats["state"] == "open" else 0, component=f"model:{model}", stat="circuit_open")
+            RUNTIME_EVENTS.set(stats["trips"], component=f"model:{model}", event="circuit_trips")
+        RUNTIME_EVENTS.set(model_pool.hedges, component="upstream", event="hedges")
+
+    pool = engine.sync_engine.pool
+    for stat in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, stat, None)
+        if method is not None:
+            RUNTIME_GAUGE.set(method(), component="db_pool", stat=stat)
+
+def observe_since_request_start(scope_state: Optional[dict], stage: str) -> None:
+    """Record the time since MetricsMiddleware saw the request, e.g. body parsing and validation"""
+    started = (scope_state or {}).get("metrics_started")
+    if started is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+class MetricsMiddleware:
+    """Track in-flight requests and per-handler latency for every HTTP request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        scope.setdefault("state", {})["metrics_started"] = started
+        status = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], handler=handler, status=status
+            )
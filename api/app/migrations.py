@@ -0,0 +1,230 @@
+"""
+Lightweight, idempotent schema upgrades for databases created by earlier versions.
+
+`init_database()` runs these on startup; to upgrade a database without
+starting the API:
+
+    python -m app.migrations
+"""
+
+import asyncio
+import json
+from collections import Counter
+from typing import Dict
+
+from sqlalchemy import inspect, text
+
+from app.services.ingredient_canonicalizer import canonicalize_ingredients
+from app.services.nutrition_service import parse_grams
+from app.services.stats_service import rebuild_nutrition_rollup
+
+# Columns added to existing tables since the first release: table -> {column: DDL type}
+ADDED_COLUMNS: Dict[str, Dict[str, str]] = {
+    "generated_recipes": {
+        "difficulty": "VARCHAR",
+    },
+    "recipe_analyses": {
+        "canonical_ingredients": "TEXT",
+        "model": "VARCHAR",
+        "prompt_variant": "VARCHAR",
+        "prompt_tokens": "INTEGER",
+        "completion_tokens": "INTEGER",
+        "total_tokens": "INTEGER",
+        "cost": "FLOAT",
+        "upstream_latency_ms": "FLOAT",
+    },
+}
+
+GRAM_COLUMNS = ("protein", "carbs", "fat", "fiber", "sugar")
+
+def add_missing_columns(sync_conn) -> None:
+    """ALTER TABLE ... ADD COLUMN for every declared column the table lacks"""
+    inspector = inspect(sync_conn)
+    tables = set(inspector.get_table_names())
+    for table, columns in ADDED_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl_type in columns.items():
+            if name not in existing:
+                sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+def backfill_nutrition_grams(sync_conn, batch_size: int = 1000) -> int:
+    """
+    Convert nutrient strings such as "18g" stored by earlier versions into grams.
+
+    SQLite keeps unconvertible text in REAL columns as-is, so only rows where a
+    nutrient column still holds text are touched. Returns the number of rows fixed.
+    """
+    if sync_conn.dialect.name != "sqlite":
+        return 0  # other backends reject text in float columns, so there is nothing to fix
+
+    text_filter = " OR ".join(f"typeof({column}) = 'text'" for column in GRAM_COLUMNS)
+    select_stmt = text(
+        f"SELECT rowid, {', '.join(GRAM_COLUMNS)} FROM generated_recipes "
+        f"WHERE rowid > :after AND ({text_filter}) ORDER BY rowid LIMIT :limit"
+    )
+    update_stmt = text(
+        f"UPDATE generated_recipes SET {', '.join(f'{c} = :{c}' for c in GRAM_COLUMNS)} WHERE rowid = :rowid"
+    )
+
+    fixed = 0
+    after = 0
+    while True:
+        rows = sync_conn.execute(select_stmt, {"after": after, "limit": batch_size}).all()
+        if not rows:
+            return fixed
+        params = [
+            {"rowid": row[0], **{column: parse_grams(value) for column, value in zip(GRAM_COLUMNS, row[1:])}}
+            for row in rows
+        ]
+        sync_conn.execute(update_stmt, params)
+        fixed += len(rows)
+        after = rows[-1][0]
+
+def backfill_canonical_ingredients(sync_conn, batch_size: int = 1000) -> int:
+    """Store the canonical ingredient names of analyses saved before they were recorded"""
+    select_stmt = text(
+        "SELECT rowid, ingredients FROM recipe_analyses "
+        "WHERE rowid > :after AND canonical_ingredients IS NULL ORDER BY rowid LIMIT :limit"
+    )
+    update_stmt = text("UPDATE recipe_analyses SET canonical_ingredients = :canonical WHERE rowid = :rowid")
+
+    fixed = 0
+    after = 0
+    while True:
+        rows = sync_conn.execute(select_stmt, {"after": after, "limit": batch_size}).all()
+        if not rows:
+            return fixed
+        params = []
+        for rowid, ingredients in rows:
+            try:
+                canonical = canonicalize_ingredients(json.loads(ingredients))
+            except (TypeError, ValueError):
+                continue
+            params.append({"rowid": rowid, "canonical": json.dumps(canonical)})
+        if params:
+            sync_conn.execute(update_stmt, params)
+        fixed += len(params)
+        after = rows[-1][0]
+
+def backfill_stats_rollups(sync_conn, batch_size: int = 1000) -> int:
+    """
+    Fill the /api/stats rollups from analyses stored before they existed.
+
+    Each stored analysis counts as one served request for its hour and its
+    ingredients; cached responses and fallbacks of the past were not recorded.
+    Returns the number of analyses counted.
+    """
+    # Rebuilt from scratch, so running it again does not double count
+    sync_conn.execute(text("DELETE FROM analysis_stats_hourly"))
+    sync_conn.execute(text("DELETE FROM ingredient_stats"))
+    # Same text format SQLAlchemy stores DateTime in, so later upserts hit these rows
+    sync_conn.execute(text(
+        "INSERT INTO analysis_stats_hourly (hour, requests, analyses, fallbacks) "
+        "SELECT strftime('%Y-%m-%d %H:00:00.000000', created_at), COUNT(*), COUNT(*), 0 "
+        "FROM recipe_analyses WHERE created_at IS NOT NULL GROUP BY 1"
+    ))
+    rebuild_nutrition_rollup(sync_conn)
+
+    select_stmt = text(
+        "SELECT rowid, canonical_ingredients FROM recipe_analyses "
+        "WHERE rowid > :after ORDER BY rowid LIMIT :limit"
+    )
+    ingredients = Counter()
+    counted = 0
+    after = 0
+    while True:
+        rows = sync_conn.execute(select_stmt, {"after": after, "limit": batch_size}).all()
+        if not rows:
+            break
+        for _, canonical in rows:
+            try:
+                ingredients.update(json.loads(canonical))
+            except (TypeError, ValueError):
+                continue
+            counted += 1
+        after = rows[-1][0]
+
+    if ingredients:
+        sync_conn.execute(
+            text("INSERT INTO ingredient_stats (ingredient, requests) VALUES (:ingredient, :requests)"),
+            [{"ingredient": name, "requests": count} for name, count in ingredients.items()]
+        )
+    return counted
+
+# Full-text index over stored recipes, kept in sync by triggers on generated_recipes.
+# It keeps its own copy of the text (keyed by recipe_id) rather than referencing
+# generated_recipes by rowid, which VACUUM may renumber.
+RECIPE_SEARCH_DDL = (
+    """
+    CREATE VIRTUAL TABLE recipe_search USING fts5(
+        title, ingredients, instructions, recipe_id UNINDEXED,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_recipes_search_insert AFTER INSERT ON generated_recipes BEGIN
+        INSERT INTO recipe_search (title, ingredients, instructions, recipe_id)
+        VALUES (new.title, new.ingredients, new.instructions, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_recipes_search_delete AFTER DELETE ON generated_recipes BEGIN
+        DELETE FROM recipe_search WHERE recipe_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS generated_recipes_search_update
+    AFTER UPDATE OF title, ingredients, instructions ON generated_recipes BEGIN
+        DELETE FROM recipe_search WHERE recipe_id = old.id;
+        INSERT INTO recipe_search (title, ingredients, instructions, recipe_id)
+        VALUES (new.title, new.ingredients, new.instructions, new.id);
+    END
+    """,
+)
+
+def create_recipe_search_index(sync_conn) -> None:
+    """Create the FTS5 recipe index and its triggers, indexing existing rows once"""
+    exists = sync_conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipe_search'"
+    ).first()
+    if exists:
+        return
+
+    for statement in RECIPE_SEARCH_DDL:
+        sync_conn.exec_driver_sql(statement)
+    sync_conn.exec_driver_sql(
+        "INSERT INTO recipe_search (title, ingredients, instructions, recipe_id) "
+        "SELECT title, ingredients, instructions, id FROM generated_recipes"
+    )
+
+# One-off data migrations, tracked in SQLite's user_version so they run once
+DATA_MIGRATIONS = (
+    backfill_nutrition_grams,
+    backfill_canonical_ingredients,
+    backfill_stats_rollups,
+)
+
+def upgrade_schema(sync_conn) -> None:
+    add_missing_columns(sync_conn)
+    if sync_conn.dialect.name != "sqlite":
+        return
+
+    create_recipe_search_index(sync_conn)
+
+    version = sync_conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for number, migration in enumerate(DATA_MIGRATIONS, start=1):
+        if version < number:
+            migration(sync_conn)
+            sync_conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+async def main() -> None:
+    from app.database import engine, init_database
+
+    await init_database()
+    await engine.dispose()
+    print("Database schema is up to date")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,24 +10,40 @@ class RecipeAnalysis(Base):
     __tablename__ = "recipe_analyses"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    ingredients = Column(Text, nullable=False)  # JSON string of ingredients
+    ingredients = Column(Text, nullable=False)  # JSON string of ingredients, as submitted
+    canonical_ingredients = Column(Text)  # JSON string of their canonical names, as sent to the LLM
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Upstream usage of the completion that produced this analysis
+    model = Column(String)
+    prompt_variant = Column(String)  # full or compact
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    total_tokens = Column(Integer)
+    cost = Column(Float)  # USD, as reported by OpenRouter
+    upstream_latency_ms = Column(Float)
+    
     # Relationship to generated recipes
     recipes = relationship("GeneratedRecipe", back_populates="analysis")
+    
+    __table_args__ = (
+        # Serves the newest-first, keyset-paginated history query
+        Index("ix_recipe_analyses_created_at_id", "created_at", "id"),
+    )
 
 class GeneratedRecipe(Base):
     __tablename__ = "generated_recipes"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    analysis_id = Column(String, ForeignKey("recipe_analyses.id"), nullable=False)
+    analysis_id = Column(String, ForeignKey("recipe_analyses.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     ingredients = Column(Text, nullable=False)  # JSON string
     instructions = Column(Text, nullable=False)  # JSON string
     prep_time = Column(Integer)  # in minutes
     servings = Column(Integer)
+    difficulty = Column(String)  # Easy, Medium, Hard
     
-    # Nutritional information
+    # Nutritional information per serving (grams, except calories)
     calories = Column(Float)
     protein = Column(Float)
     carbs = Column(Float)
@@ -38,4 +54,62 @@ class GeneratedRecipe(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship back to analysis
-    analysis = relationship("RecipeAnalysis", back_populates="recipes") 
\ No newline at end of file
+    analysis = relationship("RecipeAnalysis", back_populates="recipes")
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    ingredients = Column(Text, nullable=False)  # JSON string of ingredients
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    idempotency_key = Column(String, unique=True)  # client-supplied, so resubmits return the same job
+    result = Column(Text)  # JSON RecipeAnalysisResponse once succeeded
+    error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    lease_expires_at = Column(DateTime)  # a running job past its lease is reclaimed by another worker
+    
+    __table_args__ = (
+        # Serves the worker's claim query: oldest claimable job first
+        Index("ix_analysis_jobs_status_created_at", "status", "created_at"),
+    )
+
+# Rollups behind /api/stats, updated as analyses are served and written so
+# dashboards never scan recipe_analyses or generated_recipes
+
+class AnalysisHourlyStats(Base):
+    __tablename__ = "analysis_stats_hourly"
+    
+    hour = Column(DateTime, primary_key=True)  # UTC, truncated to the hour
+    requests = Column(Integer, nullable=False, default=0)  # analyses served, including cached ones and fallbacks
+    analyses = Column(Integer, nullable=False, default=0)  # new analyses stored
+    fallbacks = Column(Integer, nullable=False, default=0)
+
+class IngredientStats(Base):
+    __tablename__ = "ingredient_stats"
+    
+    ingredient = Column(String, primary_key=True)  # canonical name
+    requests = Column(Integer, nullable=False, default=0)
+
+class DifficultyNutritionStats(Base):
+    __tablename__ = "nutrition_stats_by_difficulty"
+    
+    difficulty = Column(String, primary_key=True)  # "" for recipes without one
+    recipe_count = Column(Integer, nullable=False, default=0)
+    
+    # Sums and non-null counts per nutrient, so averages skip missing values like AVG() does
+    calories_total = Column(Float, nullable=False, default=0)
+    calories_count = Column(Integer, nullable=False, default=0)
+    protein_total = Column(Float, nullable=False, default=0)
+    protein_count = Column(Integer, nullable=False, default=0)
+    carbs_total = Column(Float, nullable=False, default=0)
+    carbs_count = Column(Integer, nullable=False, default=0)
+    fat_total = Column(Float, nullable=False, default=0)
+    fat_count = Column(Integer, nullable=False, default=0)
+    fiber_total = Column(Float, nullable=False, default=0)
+    fiber_count = Column(Integer, nullable=False, default=0)
+    sugar_total = Column(Float, nullable=False, default=0)
+    sugar_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,95 @@
+"""
+Recompute the nutrition of every stored recipe from the bundled nutrient table.
+
+Recipes are read in primary-key order, `--batch-size` at a time; each batch is
+one matrix product and one bulk UPDATE. Recipes whose ingredient lines the
+table covers less than `--min-coverage` keep their stored values:
+
+    python -m app.recompute_nutrition
+    python -m app.recompute_nutrition --min-coverage 0.8 --dry-run
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import GeneratedRecipe
+from app.services.nutrition_calculator import NutritionCalculator
+from app.services.nutrition_service import NUTRIENT_COLUMNS
+from app.services.stats_service import rebuild_nutrition_rollup
+
+def _ingredient_lines(raw: Optional[str]) -> List[str]:
+    try:
+        lines = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return [line for line in lines if isinstance(line, str)] if isinstance(lines, list) else []
+
+async def recompute_nutrition(
+    session_factory: async_sessionmaker,
+    calculator: NutritionCalculator,
+    batch_size: int = 2000,
+    dry_run: bool = False
+) -> Tuple[int, int]:
+    """Returns (recipes scanned, recipes updated)"""
+    scanned = updated = 0
+    after = ""
+    while True:
+        async with session_factory() as db:
+            result = await db.execute(
+                select(GeneratedRecipe.id, GeneratedRecipe.ingredients, GeneratedRecipe.servings)
+                .where(GeneratedRecipe.id > after)
+                .order_by(GeneratedRecipe.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                if updated and not dry_run:
+                    # The per-difficulty averages behind /api/stats summed the old values
+                    await db.run_sync(lambda session: rebuild_nutrition_rollup(session.connection()))
+                    await db.commit()
+                return scanned, updated
+
+            values, coverage = calculator.calculate([(_ingredient_lines(row.ingredients), row.servings) for row in rows])
+            changes = []
+            for row, nutrients, covered in zip(rows, values.round(1).tolist(), coverage):
+                if covered < calculator.min_coverage:
+                    continue
+                change = dict(zip(NUTRIENT_COLUMNS, nutrients), id=row.id)
+                change["calories"] = round(change["calories"])
+                changes.append(change)
+
+            if changes and not dry_run:
+                # Bulk UPDATE by primary key: one executemany per batch
+                await db.execute(update(GeneratedRecipe), changes)
+                await db.commit()
+
+        scanned += len(rows)
+        updated += len(changes)
+        after = rows[-1].id
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--min-coverage", type=float, default=None, help="Defaults to NUTRITION_MIN_COVERAGE")
+    parser.add_argument("--dry-run", action="store_true", help="Count the recipes that would change without writing")
+    args = parser.parse_args()
+
+    from app.database import AsyncSessionLocal, engine, init_database
+
+    await init_database()
+    started = time.perf_counter()
+    scanned, updated = await recompute_nutrition(
+        AsyncSessionLocal, NutritionCalculator(min_coverage=args.min_coverage), args.batch_size, args.dry_run
+    )
+    await engine.dispose()
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"{verb} {updated} of {scanned} recipes in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
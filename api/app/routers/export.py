@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app.compression import negotiate_encoding
+from app.services.export_service import EXPORT_FORMATS, ExportService
+
+router = APIRouter(
+    tags=["export"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/export")
+async def export_recipes(
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Stream every stored analysis with its recipes, oldest first.
+    
+    - **format**: `ndjson` (one analysis per line, recipes nested) or `csv` (one recipe per row)
+    - **start** / **end**: Optional creation-time range (start inclusive, end exclusive)
+    
+    Memory use does not grow with the number of analyses. The body is gzipped
+    on the fly when the client sends `Accept-Encoding: gzip`.
+    """
+    
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be 'ndjson' or 'csv'"
+        )
+    
+    gzip = negotiate_encoding(accept_encoding, ["gzip"]) == "gzip"
+    filename = f"recipes-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(
+        ExportService().export(format, start, end, gzip),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers
+    )
@@ -1,6 +1,11 @@
 from datetime import datetime
-from fastapi import APIRouter
-from app.schemas import HealthResponse
+from fastapi import APIRouter, Request, Response, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
+
+from app.database import engine
+from app.metrics import REGISTRY, collect_runtime_gauges
+from app.schemas import HealthResponse, ReadinessResponse
 
 router = APIRouter(
     tags=["health"],
@@ -14,4 +19,61 @@ async def health_check():
         status="healthy",
         timestamp=datetime.utcnow(),
         version="1.0.0"
-    ) 
\ No newline at end of file
+    )
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse, "description": "Not ready to serve traffic"}}
+)
+async def readiness_check(request: Request, response: Response):
+    """
+    Readiness probe: the database answers.
+    
+    Only local dependencies fail the probe. Model circuits are reported but
+    do not: when OpenRouter is down every replica's circuits open together,
+    and cached, stored and fallback answers are still worth serving. The
+    indexes and write-behind queue are reported too; requests work without
+    them, just more slowly.
+    """
+    state = request.app.state
+    checks = {}
+    ready = True
+    
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+        ready = False
+    
+    model_pool = getattr(state, "model_pool", None)
+    if model_pool is not None:
+        checks["upstream"] = "ok" if model_pool.available() else "all model circuits open"
+    
+    index = getattr(state, "ingredient_index", None)
+    if index is not None:
+        checks["ingredient_index"] = "ok" if index.ready else "loading"
+    
+    similar_index = getattr(state, "similar_index", None)
+    if similar_index is not None:
+        checks["similar_index"] = "ok" if similar_index.ready else "loading"
+    
+    writer = getattr(state, "analysis_writer", None)
+    if writer is not None:
+        checks["analysis_writer"] = f"ok ({writer.pending} pending)"
+    
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        timestamp=datetime.utcnow(),
+        checks=checks
+    )
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus metrics in the text exposition format"""
+    collect_runtime_gauges(request.app.state, engine)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
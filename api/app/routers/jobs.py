@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.database import get_database
+from app.models import AnalysisJob
+from app.schemas import AnalysisJobResponse, ApiError, RecipeAnalysisRequest, RecipeAnalysisResponse
+from app.services.analysis_jobs import AnalysisJobQueue, SUCCEEDED, FAILED
+
+router = APIRouter(
+    tags=["analysis-jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+# Dependency to get the job queue created in the app lifespan
+def get_analysis_jobs(request: Request) -> AnalysisJobQueue:
+    jobs = getattr(request.app.state, "analysis_jobs", None)
+    if jobs is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis jobs are disabled (ANALYSIS_JOBS_ENABLED=False)"
+        )
+    return jobs
+
+def _to_response(job: AnalysisJob) -> AnalysisJobResponse:
+    return AnalysisJobResponse(
+        id=job.id,
+        status=job.status,
+        attempts=job.attempts or 0,
+        createdAt=job.created_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at,
+        result=RecipeAnalysisResponse.model_validate_json(job.result) if job.result else None,
+        error=job.error
+    )
+
+@router.post(
+    "/analysis-jobs",
+    response_model=AnalysisJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={400: {"model": ApiError, "description": "Invalid request"}}
+)
+async def submit_analysis_job(
+    request: RecipeAnalysisRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_database),
+    jobs: AnalysisJobQueue = Depends(get_analysis_jobs),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Queue an ingredient analysis and return its job id immediately.
+    
+    - **ingredients**: Same body as `/analyze-recipes`
+    - Poll the URL in the `Location` header until `status` is `succeeded` or `failed`
+    - Send an `Idempotency-Key` header to make retries after a dropped connection return the same job
+    """
+    
+    try:
+        job, created = await jobs.submit(db, request.ingredients, idempotency_key)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to queue analysis job: {str(e)}"
+        )
+    
+    response.headers["Location"] = f"/api/analysis-jobs/{job.id}"
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return _to_response(job)
+
+@router.get(
+    "/analysis-jobs/{job_id}",
+    response_model=AnalysisJobResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_analysis_job(
+    job_id: str,
+    response: Response,
+    db: AsyncSession = Depends(get_database),
+    jobs: AnalysisJobQueue = Depends(get_analysis_jobs)
+):
+    """
+    Status of an analysis job, with the recipes once it has succeeded.
+    
+    Unfinished jobs carry a `Retry-After` header suggesting when to poll again.
+    """
+    
+    job = await jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Analysis job {job_id} not found"
+        )
+    
+    if job.status not in (SUCCEEDED, FAILED):
+        response.headers["Retry-After"] = "1"
+    return _to_response(job)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.database import get_database
+from app.schemas import NutritionSummaryResponse
+from app.services.nutrition_service import NutritionService
+
+router = APIRouter(
+    tags=["nutrition"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get(
+    "/nutrition/summary",
+    response_model=NutritionSummaryResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_nutrition_summary(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    difficulty: Optional[str] = None,
+    group_by: Optional[str] = None,
+    db: AsyncSession = Depends(get_database)
+):
+    """
+    Aggregate per-serving nutrition of stored recipes in a single SQL query.
+    
+    - **start** / **end**: Optional creation-time range (start inclusive, end exclusive)
+    - **difficulty**: Only include recipes of this difficulty (Easy, Medium, Hard)
+    - **group_by**: Set to `difficulty` for one aggregate per difficulty level
+    - Returns average/min/max calories and grams of protein, carbs, fat, fiber and sugar
+    """
+    
+    if group_by not in (None, "difficulty"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group_by must be 'difficulty'"
+        )
+    
+    try:
+        groups = await NutritionService().get_summary(
+            db, start, end, difficulty, group_by_difficulty=group_by == "difficulty"
+        )
+        return NutritionSummaryResponse(groups=groups)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute nutrition summary: {str(e)}"
+        )
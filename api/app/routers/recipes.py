@@ -1,26 +1,121 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+import math
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import Any, List, Optional
 
 from app.database import get_database
-from app.schemas import RecipeAnalysisRequest, RecipeAnalysisResponse, ApiError
+from app.metrics import observe_since_request_start
+from app.schemas import (
+    RecipeAnalysisRequest, RecipeAnalysisResponse, RecipeSearchResponse,
+    BatchAnalysisRequest, BatchAnalysisResponse, ApiError, LEGACY_RECIPE_FIELDS
+)
+from app.services.analysis_writer import AnalysisWriter
+from app.services.ingredient_index import IngredientIndex
+from app.services.model_pool import ModelPool
 from app.services.openrouter_service import OpenRouterService
+from app.services.recipe_cache import RecipeCache
 from app.services.recipe_service import RecipeService
+from app.services.similar_index import SimilarAnalysisIndex
+from app.services.single_flight import SingleFlight
+from app.services.stats_service import StatsRecorder
+from app.services.upstream_scheduler import UpstreamBusyError, UpstreamScheduler
 
 router = APIRouter(
     tags=["recipes"],
     responses={404: {"description": "Not found"}},
 )
 
+# Dependency to get the shared HTTP client created in the app lifespan
+def get_http_client(request: Request) -> Optional[httpx.AsyncClient]:
+    return getattr(request.app.state, "http_client", None)
+
+# Dependency to get the shared outbound admission controller
+def get_upstream_scheduler(request: Request) -> Optional[UpstreamScheduler]:
+    return getattr(request.app.state, "upstream_scheduler", None)
+
+# Dependency to get the per-model circuit breakers and latency stats
+def get_model_pool(request: Request) -> Optional[ModelPool]:
+    return getattr(request.app.state, "model_pool", None)
+
 # Dependency to get OpenRouter service
-def get_openrouter_service() -> OpenRouterService:
-    return OpenRouterService()
+def get_openrouter_service(
+    http_client: Optional[httpx.AsyncClient] = Depends(get_http_client),
+    scheduler: Optional[UpstreamScheduler] = Depends(get_upstream_scheduler),
+    model_pool: Optional[ModelPool] = Depends(get_model_pool)
+) -> OpenRouterService:
+    return OpenRouterService(http_client, scheduler, model_pool)
+
+# Dependency to get the process-wide recipe cache
+def get_recipe_cache(request: Request) -> Optional[RecipeCache]:
+    return getattr(request.app.state, "recipe_cache", None)
+
+# Dependency to get the process-wide registry of in-flight LLM calls
+def get_single_flight(request: Request) -> Optional[SingleFlight]:
+    return getattr(request.app.state, "single_flight", None)
+
+# Dependency to get the background write-behind queue
+def get_analysis_writer(request: Request) -> Optional[AnalysisWriter]:
+    return getattr(request.app.state, "analysis_writer", None)
+
+# Dependency to get the inverted index over stored recipes
+def get_ingredient_index(request: Request) -> Optional[IngredientIndex]:
+    return getattr(request.app.state, "ingredient_index", None)
+
+# Dependency to get the MinHash/LSH index over past analyses' ingredient sets
+def get_similar_index(request: Request) -> Optional[SimilarAnalysisIndex]:
+    return getattr(request.app.state, "similar_index", None)
+
+# Dependency to get the counters behind /api/stats
+def get_stats_recorder(request: Request) -> Optional[StatsRecorder]:
+    return getattr(request.app.state, "stats_recorder", None)
 
 # Dependency to get Recipe service
 def get_recipe_service(
-    openrouter_service: OpenRouterService = Depends(get_openrouter_service)
+    openrouter_service: OpenRouterService = Depends(get_openrouter_service),
+    cache: Optional[RecipeCache] = Depends(get_recipe_cache),
+    single_flight: Optional[SingleFlight] = Depends(get_single_flight),
+    writer: Optional[AnalysisWriter] = Depends(get_analysis_writer),
+    ingredient_index: Optional[IngredientIndex] = Depends(get_ingredient_index),
+    similar_index: Optional[SimilarAnalysisIndex] = Depends(get_similar_index),
+    stats: Optional[StatsRecorder] = Depends(get_stats_recorder)
 ) -> RecipeService:
-    return RecipeService(openrouter_service)
+    return RecipeService(openrouter_service, cache, single_flight, writer, ingredient_index, similar_index, stats)
+
+# Dependency to choose the lean response format: `?fields=lean` or `X-API-Version: 2`
+def get_lean_response(
+    fields: Optional[str] = Query(None, description="`lean` omits legacy duplicate recipe fields"),
+    x_api_version: Optional[str] = Header(None)
+) -> bool:
+    if fields is not None:
+        return fields.strip().lower() == "lean"
+    return x_api_version is not None and x_api_version.strip() == "2"
+
+_HISTORY_ADAPTER = TypeAdapter(List[RecipeAnalysisResponse])
+
+def _lean_json(data: Any, exclude: dict) -> Response:
+    """Serialize straight to JSON without the legacy recipe fields, bypassing response_model"""
+    if isinstance(data, BaseModel):
+        content = data.model_dump_json(exclude=exclude)
+    else:
+        content = _HISTORY_ADAPTER.dump_json(data, exclude=exclude)
+    return Response(content=content, media_type="application/json")
+
+def _allows_cached_response(cache_control: Optional[str]) -> bool:
+    """`Cache-Control: no-cache` (or `no-store`) forces a fresh generation"""
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    return not directives & {"no-cache", "no-store"}
+
+def _busy_error(error: UpstreamBusyError) -> HTTPException:
+    """503 with a Retry-After hint when outbound calls are being shed"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
 
 @router.post(
     "/analyze-recipes",
@@ -28,21 +123,29 @@ def get_recipe_service(
     status_code=status.HTTP_200_OK,
     responses={
         400: {"model": ApiError, "description": "Invalid request"},
-        500: {"model": ApiError, "description": "Internal server error"}
+        500: {"model": ApiError, "description": "Internal server error"},
+        503: {"model": ApiError, "description": "Recipe generation at capacity; see Retry-After"}
     }
 )
 async def analyze_recipes(
     request: RecipeAnalysisRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_database),
-    recipe_service: RecipeService = Depends(get_recipe_service)
+    recipe_service: RecipeService = Depends(get_recipe_service),
+    cache_control: Optional[str] = Header(None),
+    lean: bool = Depends(get_lean_response)
 ):
     """
     Analyze ingredients and generate recipe suggestions with nutritional information.
     
     - **ingredients**: List of ingredients (1-20 items, non-empty strings)
     - Returns list of AI-generated recipes with nutritional analysis
+    - Send `Cache-Control: no-cache` to bypass cached results
+    - Pass `?fields=lean` (or `X-API-Version: 2`) to omit legacy duplicate fields
+    - Answers 503 with `Retry-After` when recipe generation is at capacity
     """
     
+    observe_since_request_start(http_request.scope.get("state"), "request_validation")
     try:
         # Additional validation beyond Pydantic (Pydantic already handles basic validation)
         # Clean and validate ingredients
@@ -57,41 +160,192 @@ async def analyze_recipes(
         request.ingredients = cleaned_ingredients
         
         # Generate recipes
-        response = await recipe_service.analyze_ingredients(request, db)
+        response = await recipe_service.analyze_ingredients(
+            request, db, use_cache=_allows_cached_response(cache_control)
+        )
+        if lean:
+            return _lean_json(response, {"recipes": {"__all__": LEGACY_RECIPE_FIELDS}})
         return response
         
     except HTTPException:
         raise
+    except UpstreamBusyError as e:
+        raise _busy_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to analyze recipes: {str(e)}"
         )
 
+@router.post(
+    "/analyze-recipes/batch",
+    response_model=BatchAnalysisResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        400: {"model": ApiError, "description": "Invalid request"},
+        500: {"model": ApiError, "description": "Internal server error"}
+    }
+)
+async def analyze_recipes_batch(
+    batch: BatchAnalysisRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_database),
+    recipe_service: RecipeService = Depends(get_recipe_service),
+    cache_control: Optional[str] = Header(None),
+    lean: bool = Depends(get_lean_response)
+):
+    """
+    Analyze up to 100 ingredient sets in one call.
+    
+    - **requests**: List of `/analyze-recipes` request bodies
+    - Returns one result per request, in input order; failed items carry an `error`
+    """
+    
+    observe_since_request_start(http_request.scope.get("state"), "request_validation")
+    try:
+        results = await recipe_service.analyze_batch(
+            batch.requests, db, use_cache=_allows_cached_response(cache_control)
+        )
+        response = BatchAnalysisResponse(results=results)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to analyze recipe batch: {str(e)}"
+        )
+    
+    if lean:
+        return _lean_json(response, {"results": {"__all__": {"result": {"recipes": {"__all__": LEGACY_RECIPE_FIELDS}}}}})
+    return response
+
+@router.post(
+    "/analyze-recipes/stream",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Server-sent recipe events"},
+        400: {"model": ApiError, "description": "Invalid request"}
+    }
+)
+async def analyze_recipes_stream(
+    request: RecipeAnalysisRequest,
+    http_request: Request,
+    recipe_service: RecipeService = Depends(get_recipe_service),
+    cache_control: Optional[str] = Header(None),
+    lean: bool = Depends(get_lean_response)
+):
+    """
+    Streaming variant of `/analyze-recipes` using server-sent events.
+    
+    - Emits a `recipe` event for each recipe as soon as it has been generated
+    - Finishes with a `done` event carrying the summary message
+    - Sends a single `error` event (with `retryAfter` seconds) when generation is at capacity
+    - Ends with an `error` event marked `partial` instead of `done` when generation fails midway
+    """
+    
+    observe_since_request_start(http_request.scope.get("state"), "request_validation")
+    events = recipe_service.stream_ingredients(
+        request, use_cache=_allows_cached_response(cache_control)
+    )
+    
+    async def event_stream():
+        async for event, data in events:
+            yield _format_sse(event, data, LEGACY_RECIPE_FIELDS if lean else None)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _format_sse(event: str, data: Any, exclude: Optional[set] = None) -> str:
+    payload = data.model_dump_json(exclude=exclude) if isinstance(data, BaseModel) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
 @router.get(
     "/recipe-history",
     response_model=List[RecipeAnalysisResponse],
     status_code=status.HTTP_200_OK
 )
 async def get_recipe_history(
+    response: Response,
     limit: int = 10,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_database),
-    recipe_service: RecipeService = Depends(get_recipe_service)
+    recipe_service: RecipeService = Depends(get_recipe_service),
+    lean: bool = Depends(get_lean_response)
 ):
     """
     Get recent recipe analysis history.
     
     - **limit**: Number of recent analyses to return (default: 10, max: 50)
+    - **cursor**: Value of the `X-Next-Cursor` header from the previous page
+    
+    The `X-Next-Cursor` response header is omitted on the last page.
+    Pass `?fields=lean` (or `X-API-Version: 2`) to omit legacy duplicate fields.
     """
     
     if limit > 50:
         limit = 50
+    if limit < 1:
+        limit = 1
     
     try:
-        history = await recipe_service.get_recipe_history(db, limit)
-        return history
+        history, next_cursor = await recipe_service.get_recipe_history(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch recipe history: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+    
+    if lean:
+        response = _lean_json(history, {"__all__": {"recipes": {"__all__": LEGACY_RECIPE_FIELDS}}})
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response if lean else history
+
+@router.get(
+    "/recipes/search",
+    response_model=RecipeSearchResponse,
+    status_code=status.HTTP_200_OK,
+    responses={400: {"model": ApiError, "description": "Invalid query"}}
+)
+async def search_recipes(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_database),
+    recipe_service: RecipeService = Depends(get_recipe_service),
+    lean: bool = Depends(get_lean_response)
+):
+    """
+    Full-text search over stored recipes, best matches first.
+    
+    - **q**: Words to find in recipe titles, ingredients and instructions
+    - **limit**: Results per page (default: 20, max: 50)
+    - **offset**: Pass `nextOffset` from the previous page to continue
+    """
+    
+    limit = min(max(limit, 1), 50)
+    offset = max(offset, 0)
+    
+    try:
+        results = await recipe_service.search_recipes(db, q, limit, offset)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search recipes: {str(e)}"
+        )
+    
+    if lean:
+        return _lean_json(results, {"results": {"__all__": {"recipe": LEGACY_RECIPE_FIELDS}}})
+    return results
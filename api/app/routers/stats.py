@@ -0,0 +1,48 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.database import get_database
+from app.schemas import StatsResponse
+from app.services.stats_service import STATS_INTERVALS, StatsService
+
+router = APIRouter(
+    tags=["stats"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get(
+    "/stats",
+    response_model=StatsResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_stats(
+    interval: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    top: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_database)
+):
+    """
+    Dashboard statistics, read from rollup tables kept up to date as analyses are served and stored.
+    
+    - **interval**: `hour` or `day` buckets for the activity breakdown
+    - **start** / **end**: Optional UTC window (start inclusive, end exclusive); defaults to the last 24 hours, or 30 days by day
+    - **top**: Number of most-requested ingredients to return (1-100)
+    - Returns analyses served and stored, fallback rate, most-requested ingredients and average macros by difficulty
+    """
+    
+    if interval not in STATS_INTERVALS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="interval must be 'hour' or 'day'"
+        )
+    
+    try:
+        return await StatsService().get_stats(db, interval, start, end, top)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute stats: {str(e)}"
+        )
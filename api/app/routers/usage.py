@@ -0,0 +1,49 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.database import get_database
+from app.schemas import UsageSummaryResponse
+from app.services.usage_service import USAGE_GROUPS, UsageService
+
+router = APIRouter(
+    tags=["usage"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get(
+    "/usage/summary",
+    response_model=UsageSummaryResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_usage_summary(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    model: Optional[str] = None,
+    group_by: Optional[str] = None,
+    db: AsyncSession = Depends(get_database)
+):
+    """
+    Aggregate the upstream token usage, cost and latency recorded with each analysis.
+    
+    - **start** / **end**: Optional creation-time range (start inclusive, end exclusive)
+    - **model**: Only include analyses generated by this model
+    - **group_by**: `model` or `prompt_variant` for one aggregate per model or prompt variant
+    - Returns total and average prompt/completion tokens and cost, and average/min/max latency
+    """
+    
+    if group_by is not None and group_by not in USAGE_GROUPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group_by must be 'model' or 'prompt_variant'"
+        )
+    
+    try:
+        groups = await UsageService().get_summary(db, start, end, model, group_by)
+        return UsageSummaryResponse(groups=groups)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute usage summary: {str(e)}"
+        )
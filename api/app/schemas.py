@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class NutritionalInfo(BaseModel):
@@ -8,6 +8,7 @@ class NutritionalInfo(BaseModel):
     carbs: str = Field(..., description="Carbohydrates amount (e.g., '60g')")
     fat: Optional[str] = Field(None, description="Fat amount (e.g., '15g')")
     fiber: Optional[str] = Field(None, description="Fiber amount (e.g., '8g')")
+    sugar: Optional[str] = Field(None, description="Sugar amount (e.g., '5g')")
 
 class Recipe(BaseModel):
     id: str
@@ -24,6 +25,9 @@ class Recipe(BaseModel):
     prepTime: Optional[int] = Field(None, ge=1, description="Preparation time in minutes (deprecated)")
     servings: Optional[int] = Field(None, ge=1, description="Number of servings")
 
+# Duplicates of name/nutrition/cookingTime kept for old clients; lean responses omit them
+LEGACY_RECIPE_FIELDS = {"title", "nutritionalInfo", "prepTime"}
+
 class RecipeAnalysisRequest(BaseModel):
     ingredients: List[str] = Field(..., min_items=1, max_items=20)
     
@@ -41,6 +45,104 @@ class RecipeAnalysisResponse(BaseModel):
     recipes: List[Recipe]
     message: Optional[str] = None
 
+class BatchAnalysisRequest(BaseModel):
+    requests: List[RecipeAnalysisRequest] = Field(..., min_items=1, max_items=100)
+
+class BatchAnalysisItem(BaseModel):
+    index: int = Field(..., description="Position of the request in the batch")
+    status: str = Field(..., description="ok or error")
+    result: Optional[RecipeAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchAnalysisItem]
+
+class AnalysisJobResponse(BaseModel):
+    id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    attempts: int = 0
+    createdAt: Optional[datetime] = None
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    result: Optional[RecipeAnalysisResponse] = Field(None, description="Set once the job has succeeded")
+    error: Optional[str] = Field(None, description="Set when the job has failed")
+
+class RecipeSearchResult(BaseModel):
+    recipe: Recipe
+    analysisId: str
+    score: float = Field(..., description="bm25 relevance; lower is more relevant")
+
+class RecipeSearchResponse(BaseModel):
+    results: List[RecipeSearchResult]
+    nextOffset: Optional[int] = Field(None, description="Offset of the next page, if any")
+
+class NutrientStats(BaseModel):
+    avg: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class NutritionAggregate(BaseModel):
+    difficulty: Optional[str] = Field(None, description="Difficulty level, when filtered or grouped by it")
+    recipeCount: int
+    calories: NutrientStats = Field(..., description="Calories per serving")
+    protein: NutrientStats = Field(..., description="Protein per serving in grams")
+    carbs: NutrientStats = Field(..., description="Carbohydrates per serving in grams")
+    fat: NutrientStats = Field(..., description="Fat per serving in grams")
+    fiber: NutrientStats = Field(..., description="Fiber per serving in grams")
+    sugar: NutrientStats = Field(..., description="Sugar per serving in grams")
+
+class NutritionSummaryResponse(BaseModel):
+    groups: List[NutritionAggregate]
+
+class UsageAggregate(BaseModel):
+    model: Optional[str] = Field(None, description="Model, when filtered or grouped by it")
+    promptVariant: Optional[str] = Field(None, description="Prompt variant (full or compact), when grouped by it")
+    analysisCount: int
+    promptTokens: int = Field(..., description="Total prompt tokens")
+    completionTokens: int = Field(..., description="Total completion tokens")
+    avgPromptTokens: Optional[float] = None
+    avgCompletionTokens: Optional[float] = None
+    totalCost: Optional[float] = Field(None, description="Total cost in USD, as reported by OpenRouter")
+    avgCost: Optional[float] = Field(None, description="Average cost per analysis in USD")
+    avgLatencyMs: Optional[float] = Field(None, description="Average upstream latency per analysis")
+    minLatencyMs: Optional[float] = None
+    maxLatencyMs: Optional[float] = None
+
+class UsageSummaryResponse(BaseModel):
+    groups: List[UsageAggregate]
+
+class ActivityBucket(BaseModel):
+    start: datetime = Field(..., description="Start of the hour or day (UTC)")
+    requests: int = Field(..., description="Analyses served, including cached ones and fallbacks")
+    analyses: int = Field(..., description="New analyses generated and stored")
+    fallbacks: int
+
+class IngredientCount(BaseModel):
+    ingredient: str = Field(..., description="Canonical ingredient name")
+    requests: int
+
+class DifficultyMacros(BaseModel):
+    difficulty: Optional[str] = Field(None, description="Difficulty level; null for recipes without one")
+    recipeCount: int
+    calories: Optional[float] = Field(None, description="Average calories per serving")
+    protein: Optional[float] = Field(None, description="Average protein per serving in grams")
+    carbs: Optional[float] = Field(None, description="Average carbohydrates per serving in grams")
+    fat: Optional[float] = Field(None, description="Average fat per serving in grams")
+    fiber: Optional[float] = Field(None, description="Average fiber per serving in grams")
+    sugar: Optional[float] = Field(None, description="Average sugar per serving in grams")
+
+class StatsResponse(BaseModel):
+    interval: str = Field(..., description="hour or day")
+    start: datetime
+    end: datetime
+    requests: int = Field(..., description="Analyses served in the window")
+    analyses: int = Field(..., description="New analyses stored in the window")
+    fallbacks: int
+    fallbackRate: Optional[float] = Field(None, description="Fallbacks per analysis served in the window")
+    activity: List[ActivityBucket] = Field(..., description="Per hour or day, oldest first; quiet periods are omitted")
+    topIngredients: List[IngredientCount] = Field(..., description="Most-requested ingredients, all time")
+    macrosByDifficulty: List[DifficultyMacros] = Field(..., description="Average macros of stored recipes, all time")
+
 class ApiError(BaseModel):
     message: str
     status: Optional[int] = None
@@ -48,4 +150,9 @@ class ApiError(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
-    version: str = "1.0.0" 
\ No newline at end of file
+    version: str = "1.0.0" 
+
+class ReadinessResponse(BaseModel):
+    status: str = Field(..., description="ready or not_ready")
+    timestamp: datetime
+    checks: Dict[str, str] = Field(..., description="Component name -> ok, or what is wrong")
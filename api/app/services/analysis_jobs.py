@@ -0,0 +1,273 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import AsyncSessionLocal
+from app.models import AnalysisJob
+from app.schemas import RecipeAnalysisResponse
+from app.services.upstream_scheduler import UpstreamBusyError
+
+# (ingredients, session) -> response; the lifespan wires this to RecipeService.analyze_ingredients
+# without fallbacks, so a failed LLM call raises and the job is retried
+AnalyzeFn = Callable[[List[str], AsyncSession], Awaitable[RecipeAnalysisResponse]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class AnalysisJobQueue:
+    """
+    Durable analysis jobs stored in the `analysis_jobs` table, drained by a
+    pool of in-process workers.
+
+    Workers claim the oldest queued job with a single UPDATE ... RETURNING,
+    so several workers (or several processes sharing the database) never run
+    the same job twice. A claimed job holds a lease that its worker renews
+    every third of `lease` while the analysis runs; if the worker dies the
+    lease expires and another worker picks the job up again, up to
+    `max_attempts` times. The attempt number identifies the claim, so a
+    worker that lost its lease can no longer finish or requeue the job.
+    """
+
+    def __init__(
+        self,
+        analyze: AnalyzeFn,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        workers: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        retention_hours: Optional[float] = None
+    ):
+        self.analyze = analyze
+        self.session_factory = session_factory
+        self.workers = workers or int(os.getenv("ANALYSIS_JOB_WORKERS", "4"))
+        self.lease = timedelta(seconds=lease_seconds or float(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "120")))
+        self.max_attempts = max_attempts or int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+        self.poll_interval = poll_interval or float(os.getenv("ANALYSIS_JOB_POLL_SECONDS", "1"))
+        self.retention = timedelta(hours=retention_hours or float(os.getenv("ANALYSIS_JOB_RETENTION_HOURS", "24")))
+
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge: Optional[datetime] = None
+
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        ingredients: List[str],
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[AnalysisJob, bool]:
+        """Queue a job; returns (job, created). A repeated idempotency key returns the original job."""
+        if idempotency_key:
+            existing = await self._find_by_key(db, idempotency_key)
+            if existing is not None:
+                return existing, False
+
+        job = AnalysisJob(ingredients=json.dumps(ingredients), idempotency_key=idempotency_key, status=QUEUED)
+        db.add(job)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another request with the same key won the race
+            await db.rollback()
+            return await self._find_by_key(db, idempotency_key), False
+
+        self._wakeup.set()
+        return job, True
+
+    async def get(self, db: AsyncSession, job_id: str) -> Optional[AnalysisJob]:
+        return await db.get(AnalysisJob, job_id)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """
+        Stop claiming jobs and give running ones up to `drain_timeout` seconds
+        to finish; jobs still running after that go back to the queue.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks and drain_timeout > 0:
+            await asyncio.wait(self._tasks, timeout=drain_timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _find_by_key(self, db: AsyncSession, idempotency_key: str) -> Optional[AnalysisJob]:
+        result = await db.execute(select(AnalysisJob).where(AnalysisJob.idempotency_key == idempotency_key))
+        return result.scalar_one_or_none()
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                print(f"Failed to claim analysis job: {e}")
+                claimed = None
+
+            if claimed is None:
+                if self._stopping:
+                    break
+                await self._purge_finished()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(*claimed)
+
+    async def _claim(self) -> Optional[Tuple[str, List[str], int]]:
+        """Atomically mark the oldest claimable job as running; returns (id, ingredients, attempts)"""
+        now = datetime.utcnow()
+        claimable = or_(
+            AnalysisJob.status == QUEUED,
+            and_(AnalysisJob.status == RUNNING, AnalysisJob.lease_expires_at < now)
+        )
+        oldest = select(AnalysisJob.id).where(claimable).order_by(AnalysisJob.created_at).limit(1).scalar_subquery()
+        stmt = (
+            update(AnalysisJob)
+            .where(AnalysisJob.id == oldest, claimable)
+            .values(
+                status=RUNNING,
+                attempts=AnalysisJob.attempts + 1,
+                started_at=now,
+                lease_expires_at=now + self.lease
+            )
+            .returning(AnalysisJob.id, AnalysisJob.ingredients, AnalysisJob.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.session_factory() as db:
+            row = (await db.execute(stmt)).first()
+            await db.commit()
+        if row is None:
+            return None
+        return row.id, json.loads(row.ingredients), row.attempts
+
+    async def _run(self, job_id: str, ingredients: List[str], attempts: int) -> None:
+        if attempts > self.max_attempts:
+            # Its earlier workers died mid-run (lease expired) too many times
+            await self._finish(job_id, attempts, FAILED, error="Job exceeded its maximum attempts")
+            return
+
+        work = asyncio.create_task(self._analyze(ingredients))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, attempts, work))
+        try:
+            response = await work
+        except asyncio.CancelledError:
+            if heartbeat.done() and heartbeat.result():
+                return  # the lease was lost; the job belongs to another worker now
+            await asyncio.shield(self._requeue(job_id, attempts, refund_attempt=True))
+            raise
+        except UpstreamBusyError as e:
+            # Shed by our own admission control: not the job's fault, try again shortly
+            await self._requeue(job_id, attempts, refund_attempt=True)
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            print(f"Analysis job {job_id} failed (attempt {attempts}): {e}")
+            if attempts < self.max_attempts:
+                await self._requeue(job_id, attempts)
+            else:
+                await self._finish(job_id, attempts, FAILED, error=str(e))
+        else:
+            await self._finish(job_id, attempts, SUCCEEDED, result=response.model_dump_json())
+        finally:
+            heartbeat.cancel()
+
+    async def _analyze(self, ingredients: List[str]) -> RecipeAnalysisResponse:
+        async with self.session_factory() as db:
+            return await self.analyze(ingredients, db)
+
+    async def _heartbeat(self, job_id: str, attempts: int, work: asyncio.Task) -> bool:
+        """
+        Renew the lease until cancelled. Returns True after cancelling `work`
+        when another worker has claimed the job since.
+        """
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                async with self.session_factory() as db:
+                    result = await db.execute(
+                        update(AnalysisJob)
+                        .where(self._owned(job_id, attempts))
+                        .values(lease_expires_at=datetime.utcnow() + self.lease)
+                    )
+                    await db.commit()
+            except Exception as e:
+                # Transient; the next beat still lands well inside the lease
+                print(f"Failed to renew the lease of analysis job {job_id}: {e}")
+                continue
+            if result.rowcount == 0:
+                print(f"Analysis job {job_id} was claimed by another worker; abandoning attempt {attempts}")
+                work.cancel()
+                return True
+
+    @staticmethod
+    def _owned(job_id: str, attempts: int):
+        """The job is still running under the claim that made attempt `attempts`"""
+        return and_(AnalysisJob.id == job_id, AnalysisJob.status == RUNNING, AnalysisJob.attempts == attempts)
+
+    async def _requeue(self, job_id: str, attempts: int, refund_attempt: bool = False) -> None:
+        values = {"status": QUEUED, "lease_expires_at": None}
+        if refund_attempt:
+            values["attempts"] = AnalysisJob.attempts - 1
+        async with self.session_factory() as db:
+            await db.execute(update(AnalysisJob).where(self._owned(job_id, attempts)).values(**values))
+            await db.commit()
+        self._wakeup.set()
+
+    async def _finish(
+        self,
+        job_id: str,
+        attempts: int,
+        status: str,
+        result: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> None:
+        async with self.session_factory() as db:
+            updated = await db.execute(
+                update(AnalysisJob)
+                .where(self._owned(job_id, attempts))
+                .values(status=status, result=result, error=error, finished_at=datetime.utcnow(), lease_expires_at=None)
+            )
+            await db.commit()
+        if updated.rowcount == 0:
+            return  # the lease was lost and another worker owns the job
+        if status == SUCCEEDED:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    async def _purge_finished(self) -> None:
+        """Delete finished jobs past the retention period, at most once an hour"""
+        now = datetime.utcnow()
+        if self._last_purge is not None and now - self._last_purge < timedelta(hours=1):
+            return
+        self._last_purge = now
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    delete(AnalysisJob).where(
+                        AnalysisJob.status.in_([SUCCEEDED, FAILED]),
+                        AnalysisJob.finished_at < now - self.retention
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"Failed to purge finished analysis jobs: {e}")
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import AsyncSessionLocal
+from app.metrics import STAGE_SECONDS
+from app.models import RecipeAnalysis, GeneratedRecipe
+from app.schemas import Recipe
+from app.services.ingredient_canonicalizer import canonicalize_ingredients
+from app.services.nutrition_service import parse_grams
+from app.services.stats_service import add_analysis_rollups
+from app.services.usage_service import CompletionUsage
+
+@dataclass
+class PendingAnalysis:
+    """A finished analysis waiting to be persisted"""
+    ingredients: List[str]
+    recipes: List[Recipe]
+    usage: Optional[CompletionUsage] = None
+    canonical_ingredients: Optional[List[str]] = None  # derived from `ingredients` when not given
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+def build_analysis_rows(pending: PendingAnalysis) -> list:
+    """Build the ORM rows for an analysis and its generated recipes"""
+    usage = pending.usage or CompletionUsage()
+    rows = [
+        RecipeAnalysis(
+            id=pending.id,
+            ingredients=json.dumps(pending.ingredients),
+            canonical_ingredients=json.dumps(
+                pending.canonical_ingredients
+                if pending.canonical_ingredients is not None
+                else canonicalize_ingredients(pending.ingredients)
+            ),
+            created_at=pending.created_at,
+            model=usage.model,
+            prompt_variant=usage.prompt_variant,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            cost=usage.cost,
+            upstream_latency_ms=usage.latency_ms
+        )
+    ]
+    for recipe in pending.recipes:
+        # Nutrient strings like "18g" are stored as grams so SQL can aggregate them
+        nutrition = recipe.nutrition
+        rows.append(GeneratedRecipe(
+            id=recipe.id,
+            analysis_id=pending.id,
+            title=recipe.name,
+            ingredients=json.dumps(recipe.ingredients),
+            instructions=json.dumps(recipe.instructions),
+            prep_time=recipe.prepTime or parse_minutes(recipe.cookingTime),
+            servings=recipe.servings,
+            difficulty=recipe.difficulty.strip().capitalize() if recipe.difficulty else None,
+            calories=nutrition.calories,
+            protein=parse_grams(nutrition.protein),
+            carbs=parse_grams(nutrition.carbs),
+            fat=parse_grams(nutrition.fat),
+            fiber=parse_grams(nutrition.fiber),
+            sugar=parse_grams(nutrition.sugar),
+            created_at=pending.created_at
+        ))
+    return rows
+
+def parse_minutes(cooking_time: Optional[str]) -> Optional[int]:
+    """Convert "1 hour 15 minutes" / "25 min" style cooking times to minutes"""
+    if not cooking_time:
+        return None
+    text = cooking_time.lower()
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hour|hours)\b", text)
+    minutes = re.search(r"(\d+)\s*(?:m|min|mins|minute|minutes)\b", text)
+    if not hours and not minutes:
+        bare = re.search(r"\d+", text)
+        return int(bare.group()) if bare else None
+    total = (float(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+    return int(total) or None
+
+async def write_analyses(db: AsyncSession, batch: Iterable[PendingAnalysis]) -> None:
+    """Persist a batch of analyses, and add them to the stats rollups, in a single short transaction"""
+    try:
+        with STAGE_SECONDS.time(stage="db_write"):
+            rows = []
+            for pending in batch:
+                rows += build_analysis_rows(pending)
+            db.add_all(rows)
+            await add_analysis_rollups(
+                db,
+                [row for row in rows if isinstance(row, RecipeAnalysis)],
+                [row for row in rows if isinstance(row, GeneratedRecipe)]
+            )
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+class AnalysisWriter:
+    """
+    Write-behind queue for finished analyses.
+
+    Requests hand their results to `submit` and return without waiting for the
+    commit; a single background task drains the queue and writes whatever has
+    accumulated in one transaction, so SQLite's write lock is held briefly and
+    by one writer at a time.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        batch_size: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        on_written: Optional[Callable[[PendingAnalysis], None]] = None
+    ):
+        self.session_factory = session_factory
+        self.on_written = on_written
+        self.batch_size = batch_size or int(os.getenv("RECIPE_WRITE_BATCH_SIZE", "100"))
+        self._queue: "asyncio.Queue[PendingAnalysis]" = asyncio.Queue(
+            maxsize=max_queue_size or int(os.getenv("RECIPE_WRITE_QUEUE_SIZE", "1000"))
+        )
+        self._task: Optional[asyncio.Task] = None
+
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything that is queued, then stop the background task"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, pending: PendingAnalysis) -> None:
+        """Queue an analysis for writing; only waits when the queue is full"""
+        await self._queue.put(pending)
+
+    async def flush(self) -> None:
+        """Wait until everything submitted so far has been written"""
+        await self._queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: List[PendingAnalysis]) -> None:
+        try:
+            async with self.session_factory() as db:
+                await write_analyses(db, batch)
+            self.written += len(batch)
+            if self.on_written is not None:
+                for pending in batch:
+                    self.on_written(pending)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed += 1
+                print(f"Failed to persist analysis {batch[0].id}: {e}")
+                return
+
+        # Retry one by one so a single bad row does not drop the whole batch
+        for pending in batch:
+            await self._write([pending])
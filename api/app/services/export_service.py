@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import AsyncSessionLocal
+from app.models import GeneratedRecipe, RecipeAnalysis
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_ANALYSIS_COLUMNS = (
+    RecipeAnalysis.id, RecipeAnalysis.created_at, RecipeAnalysis.ingredients, RecipeAnalysis.canonical_ingredients,
+    RecipeAnalysis.model, RecipeAnalysis.prompt_variant, RecipeAnalysis.prompt_tokens,
+    RecipeAnalysis.completion_tokens, RecipeAnalysis.cost, RecipeAnalysis.upstream_latency_ms,
+)
+_RECIPE_COLUMNS = (
+    GeneratedRecipe.id, GeneratedRecipe.title, GeneratedRecipe.ingredients, GeneratedRecipe.instructions,
+    GeneratedRecipe.prep_time, GeneratedRecipe.servings, GeneratedRecipe.difficulty, GeneratedRecipe.calories,
+    GeneratedRecipe.protein, GeneratedRecipe.carbs, GeneratedRecipe.fat, GeneratedRecipe.fiber, GeneratedRecipe.sugar,
+)
+
+# Output names, in column order; JSON-text columns are written through as they are stored
+_ANALYSIS_FIELDS = (
+    "id", "createdAt", "ingredients", "canonicalIngredients", "model", "promptVariant",
+    "promptTokens", "completionTokens", "cost", "upstreamLatencyMs",
+)
+_RECIPE_FIELDS = (
+    "id", "name", "ingredients", "instructions", "prepTime", "servings", "difficulty",
+    "calories", "protein", "carbs", "fat", "fiber", "sugar",
+)
+_JSON_TEXT_FIELDS = {"ingredients", "canonicalIngredients", "instructions"}
+
+CSV_HEADER = ["analysisId", "analysisCreatedAt", "analysisIngredients", "canonicalIngredients", "model",
+              "promptVariant", "promptTokens", "completionTokens", "cost", "upstreamLatencyMs",
+              "recipeId", "name", "recipeIngredients", "instructions", "prepTime", "servings", "difficulty",
+              "calories", "protein", "carbs", "fat", "fiber", "sugar"]
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+def _json_value(name: str, value) -> str:
+    if value is None:
+        return "null"
+    if name in _JSON_TEXT_FIELDS:
+        return value  # already JSON; skipping the loads/dumps round trip
+    if isinstance(value, str):
+        return _encode_string(value)
+    if isinstance(value, datetime):
+        return f'"{value.isoformat()}"'
+    return repr(value)  # int and float reprs are valid JSON numbers, and far cheaper than json.dumps
+
+def _json_object(keys: Sequence[str], fields: Sequence[str], values: Iterable) -> str:
+    return "{" + ",".join(key + _json_value(name, value) for key, name, value in zip(keys, fields, values)) + "}"
+
+_ANALYSIS_KEYS = [f'"{name}":' for name in _ANALYSIS_FIELDS]
+_RECIPE_KEYS = [f'"{name}":' for name in _RECIPE_FIELDS]
+
+class ExportService:
+    """
+    Streams every stored analysis with its recipes as NDJSON (one analysis per
+    line) or CSV (one recipe per row).
+
+    Rows come from a single joined query read `batch_size` at a time through a
+    server-side cursor and are written out as plain tuples, never as ORM or
+    Pydantic objects, so memory stays flat however many analyses are stored.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        batch_size: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+        self.chunk_size = chunk_size or int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+
+    async def export(
+        self,
+        export_format: str = "ndjson",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        gzip: bool = False
+    ) -> AsyncIterator[bytes]:
+        """Encoded output in chunks of roughly `chunk_size` bytes, gzipped when asked"""
+        lines = self._ndjson(start, end) if export_format == "ndjson" else self._csv(start, end)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits 31: gzip container
+
+        buffer: List[str] = []
+        size = 0
+        async for line in lines:
+            buffer.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                chunk = "".join(buffer).encode()
+                buffer, size = [], 0
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+
+        chunk = "".join(buffer).encode()
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+
+    async def _rows(self, start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[tuple]:
+        """(analysis columns..., recipe columns...) oldest analysis first; recipe columns are None for analyses without recipes"""
+        stmt = (
+            select(*_ANALYSIS_COLUMNS, *_RECIPE_COLUMNS)
+            .outerjoin(GeneratedRecipe, GeneratedRecipe.analysis_id == RecipeAnalysis.id)
+            .order_by(RecipeAnalysis.created_at, RecipeAnalysis.id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        if start is not None:
+            stmt = stmt.where(RecipeAnalysis.created_at >= start)
+        if end is not None:
+            stmt = stmt.where(RecipeAnalysis.created_at < end)
+
+        # Its own session: the request-scoped one may be closed while the response streams
+        async with self.session_factory() as db:
+            result = await db.stream(stmt)
+            async for partition in result.partitions():
+                for row in partition:
+                    yield tuple(row)
+
+    async def _ndjson(self, start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[str]:
+        split = len(_ANALYSIS_COLUMNS)
+        analysis: Optional[tuple] = None
+        recipes: List[str] = []
+        async for row in self._rows(start, end):
+            if analysis is None or row[0] != analysis[0]:
+                if analysis is not None:
+                    yield self._ndjson_line(analysis, recipes)
+                analysis, recipes = row[:split], []
+            if row[split] is not None:
+                recipes.append(_json_object(_RECIPE_KEYS, _RECIPE_FIELDS, row[split:]))
+        if analysis is not None:
+            yield self._ndjson_line(analysis, recipes)
+
+    @staticmethod
+    def _ndjson_line(analysis: tuple, recipes: List[str]) -> str:
+        return _json_object(_ANALYSIS_KEYS, _ANALYSIS_FIELDS, analysis)[:-1] + ',"recipes":[' + ",".join(recipes) + "]}\n"
+
+    async def _csv(self, start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        async for row in self._rows(start, end):
+            writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple
+
+# Bundled dictionary; INGREDIENT_SYNONYMS_PATH points at a replacement with the same layout
+SYNONYMS_PATH = os.path.join(os.path.dirname(__file__), "ingredient_synonyms.json")
+
+_QUANTITY_PATTERN = re.compile(
+    r"^[\d\s/.,½¼¾⅓⅔-]*"
+    r"(?:(?:cups?|tbsps?|tablespoons?|tsps?|teaspoons?|g|grams?|kg|kilograms?|ml|l|liters?|litres?|oz|ounces?|"
+    r"lbs?|pounds?|pints?|quarts?|cloves?|pinch(?:es)?|dash(?:es)?|handfuls?|bunch(?:es)?|sprigs?|stalks?|"
+    r"heads?|slices?|cans?|jars?|packages?|pieces?)\b\.?)?\s*(?:of\s+)?",
+    re.IGNORECASE
+)
+
+def normalize_ingredient(ingredient: str) -> str:
+    """Lowercase an ingredient and strip quantities, units and notes: "2 cups Rice, cooked" -> "rice" """
+    text = ingredient.lower()
+    text = re.sub(r"\(.*?\)", " ", text).split(",")[0]
+    text = _QUANTITY_PATTERN.sub("", text.strip())
+    return " ".join(re.findall(r"[a-zà-ÿ]+", text))
+
+class SynonymDictionary(NamedTuple):
+    """The synonyms file compiled into flat lookups"""
+    synonyms: Dict[str, str]  # normalized, singular variant -> canonical name
+    plurals: Dict[str, str]  # irregular plural -> singular
+    uncountable: FrozenSet[str]
+    descriptors: FrozenSet[str]  # words dropped from a phrase: "fresh", "chopped", ...
+    version: str  # content hash; indexes built with another dictionary are rebuilt
+
+def singularize(word: str, plurals: Dict[str, str], uncountable: FrozenSet[str]) -> str:
+    """English plural to singular by suffix rules: "tomatoes" -> "tomato", "berries" -> "berry" """
+    if word in plurals:
+        return plurals[word]
+    if word in uncountable or len(word) < 4 or not word.endswith("s") or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "sses", "xes", "zes", "oes")):
+        return word[:-2]
+    return word[:-1]
+
+def _singular_phrase(words: List[str], dictionary: SynonymDictionary) -> str:
+    if not words:
+        return ""
+    return " ".join(words[:-1] + [singularize(words[-1], dictionary.plurals, dictionary.uncountable)])
+
+@lru_cache(maxsize=None)
+def load_dictionary(path: str = "") -> SynonymDictionary:
+    """Read and compile the synonyms file, once per path"""
+    path = path or os.getenv("INGREDIENT_SYNONYMS_PATH", SYNONYMS_PATH)
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw)
+
+    dictionary = SynonymDictionary(
+        synonyms={},
+        plurals=dict(data.get("plurals", {})),
+        uncountable=frozenset(data.get("uncountable", ())),
+        descriptors=frozenset(data.get("descriptors", ())),
+        version=hashlib.sha1(raw).hexdigest()[:12]
+    )
+    # Variants are normalized like requests, so entries can be written naturally
+    # ("Greek yoghurt", "clove of garlic") and canonical names map to themselves
+    for canonical, variants in data.get("synonyms", {}).items():
+        for variant in [canonical, *variants]:
+            key = _singular_phrase(normalize_ingredient(variant).split(), dictionary)
+            if dictionary.synonyms.get(key, canonical) != canonical:
+                print(f"Ingredient synonym {variant!r} maps to both {dictionary.synonyms[key]!r} and {canonical!r}")
+                continue
+            dictionary.synonyms[key] = canonical
+    return dictionary
+
+@lru_cache(maxsize=16384)
+def canonicalize_ingredient(ingredient: str) -> str:
+    """
+    The canonical name of an ingredient, or "" if nothing is left of it:
+    "2 cups Roma Tomatoes, diced" -> "tomato", "Scallions" -> "green onion".
+    Canonical names map to themselves.
+    """
+    dictionary = load_dictionary()
+    words = normalize_ingredient(ingredient).split()
+    phrase = _singular_phrase(words, dictionary)
+    if phrase in dictionary.synonyms:
+        return dictionary.synonyms[phrase]
+
+    # "fresh roma tomatoes" -> "roma tomato", unless that leaves nothing
+    kept = [word for word in words if word not in dictionary.descriptors] or words
+    phrase = _singular_phrase(kept, dictionary)
+    return dictionary.synonyms.get(phrase, phrase)
+
+def canonicalize_ingredients(ingredients: Iterable[str]) -> List[str]:
+    """
+    Canonical names of a request's ingredients, in order and without duplicates.
+    An ingredient with no canonical form (e.g. only a quantity) is kept lowercased.
+    """
+    canonical: Dict[str, None] = {}
+    for ingredient in ingredients:
+        name = canonicalize_ingredient(ingredient) or " ".join(ingredient.lower().split())
+        if name:
+            canonical[name] = None
+    return list(canonical)
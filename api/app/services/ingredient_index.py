@@ -0,0 +1,134 @@
+import asyncio
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import GeneratedRecipe
+from app.schemas import Recipe
+from app.services.ingredient_canonicalizer import canonicalize_ingredient
+
+def ingredient_terms(ingredient: str) -> Set[str]:
+    """Index terms for a recipe ingredient: its canonical name and head word ("red onions" -> red onion, onion)"""
+    phrase = canonicalize_ingredient(ingredient)
+    if not phrase:
+        return set()
+    return {phrase, phrase.rsplit(" ", 1)[-1]}
+
+class IngredientIndex:
+    """
+    In-memory inverted index from normalized ingredient to stored recipe ids.
+
+    `search` scores recipes by how many of the requested ingredients they use
+    (coverage), breaking ties by Jaccard similarity so recipes with fewer
+    unrelated extras rank first.
+    """
+
+    def __init__(
+        self,
+        min_score: Optional[float] = None,
+        min_results: Optional[int] = None,
+        max_results: Optional[int] = None
+    ):
+        self.min_score = min_score if min_score is not None else float(os.getenv("RECIPE_RETRIEVAL_MIN_SCORE", "0.75"))
+        self.min_results = min_results if min_results is not None else int(os.getenv("RECIPE_RETRIEVAL_MIN_RESULTS", "2"))
+        self.max_results = max_results if max_results is not None else int(os.getenv("RECIPE_RETRIEVAL_MAX_RESULTS", "3"))
+
+        self._postings: Dict[str, Set[str]] = {}
+        self._recipe_sizes: Dict[str, int] = {}
+        self._loaded_until: Optional[datetime] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._recipe_sizes)
+
+    def add(self, recipe_id: str, ingredients: Iterable[str]) -> None:
+        """Index one recipe; ids that are already indexed are skipped"""
+        if recipe_id in self._recipe_sizes:
+            return
+        size = 0
+        for ingredient in ingredients:
+            terms = ingredient_terms(ingredient)
+            if not terms:
+                continue
+            size += 1
+            for term in terms:
+                self._postings.setdefault(term, set()).add(recipe_id)
+        self._recipe_sizes[recipe_id] = size
+
+    def add_recipes(self, recipes: Iterable[Recipe]) -> None:
+        for recipe in recipes:
+            self.add(recipe.id, recipe.ingredients)
+
+    def search(self, ingredients: Iterable[str]) -> List[Tuple[str, float]]:
+        """
+        Return up to `max_results` (recipe_id, coverage) pairs whose coverage of
+        the requested ingredients clears `min_score`, or [] if fewer than
+        `min_results` recipes qualify.
+        """
+        requested = sorted({canonicalize_ingredient(i) for i in ingredients} - {""})
+        if not requested or not self._recipe_sizes:
+            return []
+
+        postings = [self._postings.get(term, set()) for term in requested]
+        needed = math.ceil(self.min_score * len(requested))
+
+        # A recipe that uses `needed` of the n requested ingredients must appear in
+        # at least one of the n - needed + 1 rarest posting lists
+        by_rarity = sorted(postings, key=len)
+        candidates: Set[str] = set()
+        for posting in by_rarity[:len(requested) - needed + 1]:
+            candidates |= posting
+
+        scored = []
+        for recipe_id in candidates:
+            hits = sum(1 for posting in postings if recipe_id in posting)
+            if hits < needed:
+                continue
+            coverage = hits / len(requested)
+            union = len(requested) + max(self._recipe_sizes[recipe_id] - hits, 0)
+            scored.append((coverage, hits / union, recipe_id))
+
+        if len(scored) < self.min_results:
+            return []
+
+        scored.sort(reverse=True)
+        return [(recipe_id, coverage) for coverage, _, recipe_id in scored[:self.max_results]]
+
+    async def load(self, session_factory: async_sessionmaker, batch_size: int = 5000) -> None:
+        """
+        Warm the index from every stored recipe, streaming rows in batches.
+
+        Later calls only read recipes stored since the previous load, picking up
+        those written by other worker processes.
+        """
+        stmt = select(GeneratedRecipe.id, GeneratedRecipe.ingredients, GeneratedRecipe.created_at)
+        if self._loaded_until is not None:
+            # Write-behind commits rows a little after their created_at; re-reading
+            # a window is cheap because already indexed ids are skipped
+            stmt = stmt.where(GeneratedRecipe.created_at >= self._loaded_until - timedelta(minutes=5))
+
+        async with session_factory() as db:
+            result = await db.stream(stmt.execution_options(yield_per=batch_size))
+            async for recipe_id, ingredients, created_at in result:
+                if created_at is not None and (self._loaded_until is None or created_at > self._loaded_until):
+                    self._loaded_until = created_at
+                try:
+                    self.add(recipe_id, json.loads(ingredients))
+                except (TypeError, ValueError):
+                    continue
+        self.ready = True
+
+    async def load_and_refresh(self, session_factory: async_sessionmaker, refresh_seconds: float = 0) -> None:
+        """Load the index, then every `refresh_seconds` (when set) add recipes stored since"""
+        await self.load(session_factory)
+        while refresh_seconds > 0:
+            await asyncio.sleep(refresh_seconds)
+            try:
+                await self.load(session_factory)
+            except Exception as e:
+                print(f"Failed to refresh ingredient index: {e}")
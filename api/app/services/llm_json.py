@@ -0,0 +1,219 @@
+import json
+import re
+import uuid
+from typing import Any, Dict, List, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.metrics import LLM_INVALID_RECIPES, STAGE_SECONDS
+from app.schemas import Recipe
+from app.services.nutrition_calculator import default_calculator
+
+# Built once: constructing a TypeAdapter compiles the validator for the whole list
+RECIPE_LIST_ADAPTER = TypeAdapter(List[Recipe])
+
+_FENCE = "```"
+_FENCE_LANGUAGE = re.compile(r"[a-zA-Z]*")
+# Inside JSON: a complete string, a structural character, a bare scalar, or an unterminated string
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],]|[^\s{}\[\],"]+|"', re.DOTALL)
+_OPEN = re.compile(r"[{\[]")
+_LEADING_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# strict=False accepts raw newlines and tabs inside strings
+_DECODER = json.JSONDecoder(strict=False)
+
+class RecipeStreamParser:
+    """
+    Incrementally extract recipe objects from a streamed LLM completion.
+
+    Feed text chunks as they arrive; every recipe object that becomes complete
+    is returned immediately, without waiting for the rest of the document.
+    Recipes are the objects directly inside the top-level `"recipes"` array
+    (or inside a bare top-level array). Text around the JSON is ignored,
+    trailing commas are dropped and an unfinished last object is never emitted,
+    so a truncated completion still yields every recipe it completed.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._object_start = -1
+        self._last_comma = -1
+        self._trailing_commas: List[int] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return the recipe dicts completed by it"""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        pos = self._pos
+
+        # Walk structural tokens rather than characters: whole strings and
+        # scalars are skipped by the regex engine in one step
+        while True:
+            match = (_TOKEN if self._stack else _OPEN).search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token = match.group()
+            if token == '"':
+                pos = match.start()  # string not closed yet; resume here on the next chunk
+                break
+            i = match.start()
+            pos = match.end()
+            char = token[0]
+
+            if char == ",":
+                self._last_comma = i
+                continue
+            if char in "}]" and self._last_comma != -1 and self._object_start != -1:
+                # `[1, 2,]` / `{"a": 1,}`: remember the comma so it is cut out when loading
+                self._trailing_commas.append(self._last_comma)
+            self._last_comma = -1
+
+            if char in "{[":
+                if char == "{" and self._stack in (["{", "["], ["["]):
+                    self._object_start = i
+                    self._trailing_commas = []
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if char == "}" and self._object_start != -1 and self._stack in (["{", "["], ["["]):
+                    recipe = self._load(buffer, self._object_start, pos, self._trailing_commas)
+                    if recipe is not None:
+                        completed.append(recipe)
+                    self._object_start = -1
+                    self._trailing_commas = []
+
+        # Drop text that can no longer be part of a pending recipe object
+        keep_from = self._object_start if self._object_start != -1 else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._object_start != -1:
+            self._object_start = 0
+        if self._last_comma != -1:
+            self._last_comma -= keep_from
+        self._trailing_commas = [position - keep_from for position in self._trailing_commas]
+
+        return completed
+
+    @staticmethod
+    def _load(buffer: str, start: int, end: int, skip: List[int]) -> Optional[Dict[str, Any]]:
+        if skip:
+            pieces = []
+            for position in skip:
+                pieces.append(buffer[start:position])
+                start = position + 1
+            pieces.append(buffer[start:end])
+            text = "".join(pieces)
+        else:
+            text = buffer[start:end]
+        try:
+            data = _DECODER.decode(text)
+        except json.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
+
+def extract_recipe_objects(content: str) -> List[Dict[str, Any]]:
+    """
+    Pull every complete recipe object out of a finished LLM completion.
+
+    Handles markdown code fences, prose before or after the JSON, trailing
+    commas, raw control characters in strings and truncated output.
+    """
+    # str.find rather than a lazy DOTALL regex: fenced completions are long
+    fence = content.find(_FENCE)
+    if fence != -1:
+        body_start = _FENCE_LANGUAGE.match(content, fence + 3).end()
+        body_end = content.find(_FENCE, body_start)
+        content = content[body_start:body_end] if body_end != -1 else content[body_start:]
+
+    # Well-formed output (the common case) is a single json.loads
+    try:
+        document = json.loads(content)
+    except json.JSONDecodeError:
+        document = None
+    recipes = document.get("recipes") if isinstance(document, dict) else document
+    if isinstance(recipes, list):
+        return [recipe for recipe in recipes if isinstance(recipe, dict)]
+
+    # Prose around the document or raw control characters in strings: decode
+    # from the first bracket; raw_decode ignores anything after the document
+    start = _OPEN.search(content)
+    if start is not None:
+        try:
+            document, _ = _DECODER.raw_decode(content, start.start())
+        except json.JSONDecodeError:
+            document = None
+        recipes = document.get("recipes") if isinstance(document, dict) else document
+        if isinstance(recipes, list):
+            return [recipe for recipe in recipes if isinstance(recipe, dict)]
+
+    # Malformed or truncated output: salvage every complete recipe object
+    return RecipeStreamParser().feed(content)
+
+def normalize_recipe_data(recipe_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map an LLM recipe dict onto the Recipe schema: legacy field names, defaults,
+    numeric nutrient amounts, and a fresh id (LLM ids like "recipe_1" repeat
+    across analyses). Nutrition the LLM left out is calculated from the ingredients.
+    """
+    ingredients = recipe_data.get("ingredients")
+    servings = recipe_data.get("servings", 4)
+    nutrition = recipe_data.get("nutrition", recipe_data.get("nutritionalInfo"))
+    if nutrition is None and isinstance(ingredients, list) and ingredients:
+        nutrition = default_calculator().nutrition(
+            ingredients, servings if isinstance(servings, int) and servings > 0 else None
+        ).model_dump()
+    elif isinstance(nutrition, dict):
+        nutrition = dict(nutrition)
+        calories = nutrition.get("calories")
+        if isinstance(calories, str):
+            match = _LEADING_NUMBER.search(calories)
+            nutrition["calories"] = round(float(match.group())) if match else calories
+        elif isinstance(calories, float):
+            nutrition["calories"] = round(calories)
+        for key in ("protein", "carbs", "fat", "fiber", "sugar"):
+            value = nutrition.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                nutrition[key] = f"{value:g}g"
+
+    name = recipe_data.get("name", recipe_data.get("title", "Unnamed Recipe"))
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "ingredients": ingredients,
+        "instructions": recipe_data.get("instructions"),
+        "cookingTime": recipe_data.get("cookingTime", f"{recipe_data.get('prepTime', 30)} minutes"),
+        "difficulty": recipe_data.get("difficulty", "Medium"),
+        "nutrition": nutrition,
+        # Legacy fields for backward compatibility
+        "title": recipe_data.get("title", name),
+        "nutritionalInfo": nutrition,
+        "prepTime": recipe_data.get("prepTime"),
+        "servings": servings,
+    }
+
+def validate_recipes(recipe_data: List[Dict[str, Any]]) -> List[Recipe]:
+    """
+    Validate normalized recipe dicts in one call, dropping any that fail.
+
+    The whole list goes through the cached adapter at once; only when some
+    items are invalid are those removed and the rest validated again.
+    """
+    if not recipe_data:
+        return []
+    try:
+        return RECIPE_LIST_ADAPTER.validate_python(recipe_data)
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        LLM_INVALID_RECIPES.inc(len(invalid))
+        valid = [data for index, data in enumerate(recipe_data) if index not in invalid]
+        return RECIPE_LIST_ADAPTER.validate_python(valid) if valid else []
+
+def parse_recipes(content: str) -> List[Recipe]:
+    """Extract, normalize and validate the recipes in an LLM completion"""
+    with STAGE_SECONDS.time(stage="json_parse"):
+        objects = extract_recipe_objects(content)
+    with STAGE_SECONDS.time(stage="pydantic_validation"):
+        return validate_recipes([normalize_recipe_data(data) for data in objects])
@@ -0,0 +1,155 @@
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+DEFAULT_MODEL = "anthropic/claude-3-haiku"  # Using a cost-effective model
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls are
+    refused for `reset_timeout` seconds; then a single probe call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe is allowed"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # A probe that never reported back (e.g. a cancelled hedge) frees up after reset_timeout
+        now = time.monotonic()
+        if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+
+class LatencyWindow:
+    """Rolling window of recent response times, used to pick the hedge delay"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+class ModelPool:
+    """
+    Ordered list of OpenRouter models with a circuit breaker and latency window each.
+
+    Shared across requests (one per process) so that failures seen by one
+    request make the next ones skip a failing model immediately instead of
+    waiting out its timeout.
+    """
+
+    def __init__(
+        self,
+        models: Optional[List[str]] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        hedging: Optional[bool] = None,
+        hedge_delay: Optional[float] = None,
+        hedge_min_delay: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None
+    ):
+        if models is None:
+            models = [m.strip() for m in os.getenv("OPENROUTER_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+        self.models = models or [DEFAULT_MODEL]
+
+        failure_threshold = failure_threshold or int(os.getenv("OPENROUTER_BREAKER_FAILURES", "5"))
+        reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv("OPENROUTER_BREAKER_RESET_SECONDS", "30"))
+        self.breakers: Dict[str, CircuitBreaker] = {
+            model: CircuitBreaker(failure_threshold, reset_timeout) for model in self.models
+        }
+        self.latencies: Dict[str, LatencyWindow] = {model: LatencyWindow() for model in self.models}
+
+        self.hedging = hedging if hedging is not None else os.getenv("OPENROUTER_HEDGING", "False").lower() == "true"
+        self.default_hedge_delay = hedge_delay if hedge_delay is not None else float(os.getenv("OPENROUTER_HEDGE_DELAY", "10"))
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else float(os.getenv("OPENROUTER_HEDGE_MIN_DELAY", "1"))
+        self.hedge_min_samples = hedge_min_samples or int(os.getenv("OPENROUTER_HEDGE_MIN_SAMPLES", "20"))
+        self.hedges = 0
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def available(self) -> List[str]:
+        """Models whose circuit is not open, in preference order"""
+        return [model for model in self.models if self.breakers[model].state != CircuitBreaker.OPEN]
+
+    def allow(self, model: str) -> bool:
+        """Claim a call for `model`; False if its circuit is open or a probe is already out"""
+        return self.breakers[model].allow()
+
+    def record_success(self, model: str, seconds: Optional[float] = None) -> None:
+        self.breakers[model].record_success()
+        if seconds is not None:
+            self.latencies[model].add(seconds)
+
+    def record_failure(self, model: str) -> None:
+        self.breakers[model].record_failure()
+
+    def hedge_delay(self, model: str) -> float:
+        """The model's observed p95, or the configured default until enough samples exist"""
+        window = self.latencies[model]
+        if len(window) < self.hedge_min_samples:
+            return self.default_hedge_delay
+        return max(self.hedge_min_delay, window.percentile(0.95))
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            model: {
+                "state": self.breakers[model].state,
+                "failures": self.breakers[model].failures,
+                "trips": self.breakers[model].trips,
+                "p95Seconds": self.latencies[model].percentile(0.95),
+            }
+            for model in self.models
+        }
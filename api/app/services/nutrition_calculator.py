@@ -0,0 +1,215 @@
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.schemas import NutritionalInfo, Recipe
+from app.services.ingredient_canonicalizer import canonicalize_ingredient
+from app.services.nutrition_service import NUMBER_PATTERN, NUTRIENT_COLUMNS, parse_number
+
+# Bundled table; NUTRIENT_TABLE_PATH points at a replacement with the same columns
+NUTRIENT_TABLE_PATH = os.path.join(os.path.dirname(__file__), "nutrient_table.csv")
+
+DEFAULT_SERVINGS = 4  # what normalize_recipe_data assumes when the LLM gives none
+WATER_GRAMS_PER_CUP = 236.6  # for volumes of ingredients without a grams_per_cup
+
+# How an amount becomes grams: the table's default amount, a mass, a volume in cups, or a count
+DEFAULT, MASS, VOLUME, COUNT = 0, 1, 2, 3
+
+# unit -> (kind, grams or cups per unit); counted units use the ingredient's grams_per_piece
+_UNITS: Dict[str, Tuple[int, float]] = {
+    **dict.fromkeys(("g", "gram", "grams"), (MASS, 1.0)),
+    **dict.fromkeys(("kg", "kilogram", "kilograms"), (MASS, 1000.0)),
+    **dict.fromkeys(("oz", "ounce", "ounces"), (MASS, 28.35)),
+    **dict.fromkeys(("lb", "lbs", "pound", "pounds"), (MASS, 453.6)),
+    **dict.fromkeys(("can", "cans"), (MASS, 400.0)),
+    **dict.fromkeys(("cup", "cups"), (VOLUME, 1.0)),
+    **dict.fromkeys(("tbsp", "tbsps", "tablespoon", "tablespoons"), (VOLUME, 1 / 16)),
+    **dict.fromkeys(("tsp", "tsps", "teaspoon", "teaspoons"), (VOLUME, 1 / 48)),
+    **dict.fromkeys(("ml", "milliliter", "milliliters", "millilitre", "millilitres"), (VOLUME, 1 / 236.6)),
+    **dict.fromkeys(("l", "liter", "liters", "litre", "litres"), (VOLUME, 1000 / 236.6)),
+    **dict.fromkeys(("pint", "pints"), (VOLUME, 2.0)),
+    **dict.fromkeys(("quart", "quarts"), (VOLUME, 4.0)),
+    **dict.fromkeys(("pinch", "pinches"), (VOLUME, 1 / 768)),
+    **dict.fromkeys(("dash", "dashes"), (VOLUME, 1 / 384)),
+    **dict.fromkeys(("clove", "cloves", "slice", "slices", "piece", "pieces", "whole"), (COUNT, 1.0)),
+}
+
+_FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3}
+_AMOUNT_PATTERN = re.compile(
+    rf"^\s*(?P<amount>\d+\s+\d+/\d+|\d+/\d+|(?:{NUMBER_PATTERN})\s*[½¼¾⅓⅔]?|[½¼¾⅓⅔])"
+    rf"(?:\s*(?:-|–|to)\s*(?P<high>{NUMBER_PATTERN}))?\s*(?P<unit>[a-z]+)?\b\.?"
+)
+
+class NutrientTable(NamedTuple):
+    """The nutrient table as arrays indexed by row"""
+    index: Dict[str, int]  # canonical ingredient name -> row
+    per_gram: np.ndarray  # rows x NUTRIENT_COLUMNS
+    grams_per_cup: np.ndarray  # NaN where unknown
+    grams_per_piece: np.ndarray  # NaN where unknown
+    default_grams: np.ndarray
+
+@lru_cache(maxsize=None)
+def load_nutrient_table(path: str = "") -> NutrientTable:
+    """Read the nutrient table once per path"""
+    path = path or os.getenv("NUTRIENT_TABLE_PATH", NUTRIENT_TABLE_PATH)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(line for line in f if not line.startswith("#")))
+
+    def column(name: str) -> np.ndarray:
+        return np.array([float(row[name]) if row[name] else math.nan for row in rows])
+
+    return NutrientTable(
+        index={row["name"]: position for position, row in enumerate(rows)},
+        per_gram=np.column_stack([column(name) for name in NUTRIENT_COLUMNS]) / 100.0,
+        grams_per_cup=column("grams_per_cup"),
+        grams_per_piece=column("grams_per_piece"),
+        default_grams=column("default_grams")
+    )
+
+def _parse_number(text: str) -> float:
+    text = text.strip()
+    whole, _, fraction = text.partition(" ")
+    if "/" in text:
+        if fraction:
+            numerator, denominator = fraction.split("/")
+            return float(whole) + float(numerator) / float(denominator)
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator)
+    if text[-1] in _FRACTIONS:
+        whole = text[:-1].strip()
+        return (parse_number(whole) if whole else 0.0) + _FRACTIONS[text[-1]]
+    return parse_number(text)
+
+def parse_amount(line: str) -> Tuple[Optional[float], int, float]:
+    """
+    Leading amount of an ingredient line as (amount, kind, factor):
+    "1 1/2 cups rice" -> (1.5, VOLUME, 1.0), "200g pasta" -> (200, MASS, 1.0),
+    "3 eggs" -> (3, COUNT, 1.0), "salt to taste" -> (None, DEFAULT, 0).
+    """
+    text = re.sub(r"\(.*?\)", " ", line.lower())
+    match = _AMOUNT_PATTERN.match(text)
+    if not match:
+        return None, DEFAULT, 0.0
+    try:
+        amount = _parse_number(match.group("amount"))
+        if match.group("high"):
+            amount = (amount + _parse_number(match.group("high"))) / 2
+    except (ValueError, ZeroDivisionError):
+        return None, DEFAULT, 0.0
+    kind, factor = _UNITS.get(match.group("unit") or "", (COUNT, 1.0))
+    return amount, kind, factor
+
+@lru_cache(maxsize=65536)
+def match_ingredient(line: str) -> Optional[Tuple[int, float, int, float]]:
+    """Table row and parsed amount of an ingredient line, or None if the table lacks it"""
+    table = load_nutrient_table()
+    name = canonicalize_ingredient(line)
+    row = table.index.get(name)
+    if row is None and " " in name:
+        # "cherry tomato" -> "tomato"
+        row = table.index.get(canonicalize_ingredient(name.rsplit(" ", 1)[-1]))
+    if row is None:
+        return None
+    amount, kind, factor = parse_amount(line)
+    return row, amount if amount is not None else 0.0, kind, factor
+
+class NutritionCalculator:
+    """
+    Per-serving nutrition from a recipe's ingredient lines and the bundled
+    nutrient table.
+
+    Each line is matched to a table row and its amount converted to grams;
+    a batch of recipes becomes one recipes x ingredients matrix of grams, and
+    their nutrients are its product with the per-gram nutrient matrix.
+    Lines the table lacks count as nothing, and lines without an amount
+    ("salt to taste") as the table's default amount, so results come with
+    the share of lines that were recognized and had an amount.
+    """
+
+    def __init__(self, table: Optional[NutrientTable] = None, min_coverage: Optional[float] = None):
+        self.table = table or load_nutrient_table()
+        self.min_coverage = min_coverage if min_coverage is not None else float(os.getenv("NUTRITION_MIN_COVERAGE", "0.6"))
+
+    def calculate(self, recipes: Sequence[Tuple[Sequence[str], Optional[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nutrients per serving for (ingredients, servings) pairs: an array of
+        len(recipes) x NUTRIENT_COLUMNS, and the share of each recipe's
+        ingredient lines found in the table with an explicit amount.
+        """
+        table = self.table
+        recipe_rows: List[int] = []
+        matches: List[Tuple[int, float, int, float]] = []
+        coverage = np.zeros(len(recipes))
+        servings = np.empty(len(recipes))
+        for position, (ingredients, serving_count) in enumerate(recipes):
+            found = 0
+            for line in ingredients:
+                match = match_ingredient(line) if isinstance(line, str) else None
+                if match is not None:
+                    recipe_rows.append(position)
+                    matches.append(match)
+                    # A default portion is a guess; it must not make the result look measured
+                    if match[2] != DEFAULT:
+                        found += 1
+            coverage[position] = found / len(ingredients) if ingredients else 0.0
+            servings[position] = serving_count or DEFAULT_SERVINGS
+
+        grams = np.zeros((len(recipes), len(table.default_grams)))
+        if matches:
+            rows, amounts, kinds, factors = (np.array(values) for values in zip(*matches))
+            # Amounts to grams for every line at once; unknown unit weights fall back
+            # to water for volumes and to the default amount per piece for counts
+            per_cup = np.where(np.isnan(table.grams_per_cup[rows]), WATER_GRAMS_PER_CUP, table.grams_per_cup[rows])
+            per_piece = np.where(np.isnan(table.grams_per_piece[rows]), table.default_grams[rows], table.grams_per_piece[rows])
+            line_grams = np.select(
+                [kinds == MASS, kinds == VOLUME, kinds == COUNT],
+                [amounts * factors, amounts * factors * per_cup, amounts * factors * per_piece],
+                default=table.default_grams[rows]
+            )
+            np.add.at(grams, (np.array(recipe_rows), rows), line_grams)
+
+        return grams @ table.per_gram / servings[:, None], coverage
+
+    def nutrition(self, ingredients: Sequence[str], servings: Optional[int] = None) -> NutritionalInfo:
+        """Calculated nutrition of one recipe, however little of it the table covers"""
+        values, _ = self.calculate([(ingredients, servings)])
+        return self._to_info(values[0])
+
+    def apply(self, recipes: List[Recipe]) -> List[Recipe]:
+        """
+        Replace the recipes' nutrition with calculated values where at least
+        `min_coverage` of the lines were recognized with an amount; others keep the LLM's
+        """
+        if not recipes:
+            return recipes
+        values, coverage = self.calculate([(recipe.ingredients, recipe.servings) for recipe in recipes])
+        updated = []
+        for recipe, row, covered in zip(recipes, values, coverage):
+            if covered < self.min_coverage:
+                updated.append(recipe)
+                continue
+            info = self._to_info(row)
+            updated.append(recipe.model_copy(update={"nutrition": info, "nutritionalInfo": info}))
+        return updated
+
+    @staticmethod
+    def _to_info(row: np.ndarray) -> NutritionalInfo:
+        calories, protein, carbs, fat, fiber, sugar = (float(value) for value in row)
+        return NutritionalInfo(
+            calories=round(calories),
+            protein=f"{round(protein, 1):g}g",
+            carbs=f"{round(carbs, 1):g}g",
+            fat=f"{round(fat, 1):g}g",
+            fiber=f"{round(fiber, 1):g}g",
+            sugar=f"{round(sugar, 1):g}g"
+        )
+
+@lru_cache(maxsize=None)
+def default_calculator() -> NutritionCalculator:
+    """A calculator over the configured table, built once per process"""
+    return NutritionCalculator()
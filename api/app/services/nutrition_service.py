@@ -0,0 +1,120 @@
+import re
+from datetime import datetime
+from typing import Any, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import GeneratedRecipe
+from app.schemas import NutrientStats, NutritionAggregate
+
+# Grams per unit; LLMs write amounts like "18g", "1.2 kg", "450mg", "~20 grams"
+_UNIT_GRAMS = {
+    "": 1.0,
+    "g": 1.0, "gr": 1.0, "gram": 1.0, "grams": 1.0,
+    "kg": 1000.0, "kilogram": 1000.0, "kilograms": 1000.0,
+    "mg": 0.001, "milligram": 0.001, "milligrams": 0.001,
+    "mcg": 0.000001, "µg": 0.000001, "ug": 0.000001, "microgram": 0.000001, "micrograms": 0.000001,
+    "oz": 28.3495, "ounce": 28.3495, "ounces": 28.3495,
+}
+
+# "1,200" is a thousands separator, "1,5" a decimal comma
+NUMBER_PATTERN = r"\d{1,3}(?:,\d{3})+(?![\d,])(?:\.\d+)?|\d+(?:[.,]\d+)?"
+
+_AMOUNT_PATTERN = re.compile(
+    rf"(?P<low>{NUMBER_PATTERN})\s*(?:(?:-|–|to)\s*(?P<high>{NUMBER_PATTERN}))?\s*(?P<unit>[a-zµ]*)",
+    re.IGNORECASE
+)
+
+NUTRIENT_COLUMNS = ("calories", "protein", "carbs", "fat", "fiber", "sugar")
+
+def parse_number(text: str) -> float:
+    """A number matched by `NUMBER_PATTERN`: "1,200" -> 1200.0, "1,5" -> 1.5, "2.5" -> 2.5"""
+    if re.fullmatch(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?", text):
+        return float(text.replace(",", ""))
+    return float(text.replace(",", "."))
+
+def parse_grams(value: Any) -> Optional[float]:
+    """
+    Convert an LLM nutrient amount into grams.
+
+    Accepts numbers and strings such as "18g", "1.2 kg", "450 mg", "~20 grams",
+    "1,200 mg" (thousands separator), "1,5 g" (decimal comma) or "10-12g"
+    (midpoint). "trace" is 0. Returns None when no amount is found.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    if text.startswith("trace"):
+        return 0.0
+
+    match = _AMOUNT_PATTERN.search(text)
+    if not match:
+        return None
+
+    unit = match.group("unit")
+    if unit not in _UNIT_GRAMS:
+        return None
+
+    low = parse_number(match.group("low"))
+    high = match.group("high")
+    amount = (low + parse_number(high)) / 2 if high else low
+    return round(amount * _UNIT_GRAMS[unit], 3)
+
+class NutritionService:
+    """SQL-side aggregation over the numeric nutrition columns"""
+
+    async def get_summary(
+        self,
+        db: AsyncSession,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        difficulty: Optional[str] = None,
+        group_by_difficulty: bool = False
+    ) -> List[NutritionAggregate]:
+        """Average/min/max calories and macros per serving, computed in one query"""
+
+        columns = []
+        for name in NUTRIENT_COLUMNS:
+            column = getattr(GeneratedRecipe, name)
+            columns += [func.avg(column), func.min(column), func.max(column)]
+
+        filters = []
+        if start is not None:
+            filters.append(GeneratedRecipe.created_at >= start)
+        if end is not None:
+            filters.append(GeneratedRecipe.created_at < end)
+        if difficulty:
+            filters.append(func.lower(GeneratedRecipe.difficulty) == difficulty.lower())
+
+        if group_by_difficulty:
+            stmt = (
+                select(GeneratedRecipe.difficulty, func.count(GeneratedRecipe.id), *columns)
+                .where(*filters)
+                .group_by(GeneratedRecipe.difficulty)
+                .order_by(GeneratedRecipe.difficulty)
+            )
+            result = await db.execute(stmt)
+            return [self._to_aggregate(row[0], row[1:]) for row in result.all()]
+
+        stmt = select(func.count(GeneratedRecipe.id), *columns).where(*filters)
+        result = await db.execute(stmt)
+        return [self._to_aggregate(difficulty, result.one())]
+
+    @staticmethod
+    def _to_aggregate(difficulty: Optional[str], row) -> NutritionAggregate:
+        count, *values = row
+        stats = {}
+        for i, name in enumerate(NUTRIENT_COLUMNS):
+            avg, minimum, maximum = values[i * 3:i * 3 + 3]
+            stats[name] = NutrientStats(
+                avg=round(avg, 2) if avg is not None else None,
+                min=minimum,
+                max=maximum
+            )
+        return NutritionAggregate(difficulty=difficulty, recipeCount=count, **stats)
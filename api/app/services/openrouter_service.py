@@ -1,102 +1,434 @@
+import asyncio
 import os
 import json
+import random
 import httpx
-import uuid
-from typing import List, Dict, Any
-from app.schemas import Recipe, NutritionalInfo
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from app.metrics import STAGE_SECONDS, UPSTREAM_RESPONSES
+from app.schemas import Recipe
+from app.services.llm_json import RecipeStreamParser, normalize_recipe_data, parse_recipes, validate_recipes
+from app.services.model_pool import ModelPool
+from app.services.nutrition_calculator import NutritionCalculator
+from app.services.upstream_scheduler import (
+    UpstreamBusyError, UpstreamHTTPError, UpstreamScheduler, parse_retry_after
+)
+from app.services.usage_service import CompletionUsage
+
+FULL_PROMPT = "full"
+COMPACT_PROMPT = "compact"
+
+# Tokens of JSON scaffolding around the recipes in a compact-prompt completion
+COMPACT_OVERHEAD_TOKENS = 100
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create a keep-alive, connection-pooled HTTP client for OpenRouter calls"""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("OPENROUTER_TIMEOUT", "30")),
+        connect=float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5")),
+        pool=float(os.getenv("OPENROUTER_POOL_TIMEOUT", "10"))
+    )
+    
+    # HTTP/2 needs the optional `h2` package (pip install "httpx[http2]")
+    http2 = os.getenv("OPENROUTER_HTTP2", "False").lower() == "true"
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("OPENROUTER_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+    
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open"""
 
 class OpenRouterService:
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        scheduler: Optional[UpstreamScheduler] = None,
+        model_pool: Optional[ModelPool] = None
+    ):
+        self.http_client = http_client
+        self.scheduler = scheduler
+        self.model_pool = model_pool or ModelPool()
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.api_url = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1")
-        self.model = "anthropic/claude-3-haiku"  # Using a cost-effective model
+        self.model = self.model_pool.primary
+        self.recipe_count = int(os.getenv("OPENROUTER_RECIPE_COUNT", "3"))
+        self.compact_prompt_ratio = float(os.getenv("OPENROUTER_COMPACT_PROMPT_RATIO", "0"))
+        self.tokens_per_recipe = int(os.getenv("OPENROUTER_TOKENS_PER_RECIPE", "400"))
+        # Without nutrition in the prompt, every recipe's nutrition is calculated from the table
+        self.prompt_nutrition = os.getenv("OPENROUTER_PROMPT_NUTRITION", "True").lower() == "true"
+        self.nutrition_calculator = (
+            NutritionCalculator() if os.getenv("NUTRITION_CALCULATOR_ENABLED", "True").lower() == "true" else None
+        )
         
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable is required")
     
+    @asynccontextmanager
+    async def _client(self):
+        """Yield the shared HTTP client, or a short-lived one when none was injected"""
+        if self.http_client is not None:
+            yield self.http_client
+        else:
+            async with create_http_client() as client:
+                yield client
+    
     async def generate_recipes(self, ingredients: List[str]) -> List[Recipe]:
         """Generate recipes based on ingredients using OpenRouter LLM"""
-        prompt = self._create_recipe_prompt(ingredients)
+        recipes, _ = await self.generate_recipes_with_usage(ingredients)
+        return recipes
+    
+    async def generate_recipes_with_usage(self, ingredients: List[str]) -> Tuple[List[Recipe], CompletionUsage]:
+        """Generate recipes, along with the token usage, cost and latency of the completion"""
+        variant = self._choose_prompt_variant()
+        prompt = self._create_recipe_prompt(ingredients, variant)
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a professional chef and nutritionist. Generate recipes in valid JSON format only."
-                            },
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 2000
-                    },
-                    timeout=30.0
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
-                
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-                
-                # Try to extract JSON if LLM included extra text
-                if not content.startswith('{'):
-                    # Look for JSON content between markers or extract first JSON block
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        content = content[json_start:json_end]
-                
-                # Parse the JSON response
-                try:
-                    recipes_data = json.loads(content)
-                except json.JSONDecodeError as e:
-                    # Try to fix common JSON issues
-                    print(f"Initial JSON parse failed: {e}")
-                    print(f"Content: {content[:500]}...")
-                    
-                    # Try to clean up the JSON
-                    content = content.replace('\n', ' ').replace('\t', ' ')
-                    content = ' '.join(content.split())  # Normalize whitespace
-                    recipes_data = json.loads(content)
-                
-                # Convert to Recipe objects
-                recipes = []
-                for i, recipe_data in enumerate(recipes_data.get("recipes", [])):
-                    # Ensure recipe has an ID
-                    if "id" not in recipe_data:
-                        recipe_data["id"] = f"recipe_{i+1}_{str(uuid.uuid4())[:8]}"
-                    
-                    recipe = self._parse_recipe_data(recipe_data)
-                    if recipe:
-                        recipes.append(recipe)
-                
-                if not recipes:
-                    raise Exception("No valid recipes could be parsed from LLM response")
-                
-                return recipes[:3]  # Return max 3 recipes
-                
+            models = self.model_pool.available()
+            if not models:
+                raise CircuitOpenError("All configured models are unavailable (circuit open)")
+            
+            # Hedging adds upstream load, so skip it while callers are already queueing
+            saturated = self.scheduler is not None and self.scheduler.waiting > 0
+            if self.model_pool.hedging and len(models) > 1 and not saturated:
+                return await self._generate_hedged(prompt, variant, models[0], models[1:])
+            return await self._generate_with_failover(prompt, variant, models)
+            
         except json.JSONDecodeError as e:
             raise Exception(f"Failed to parse LLM response as JSON: {str(e)}")
+        except UpstreamBusyError:
+            raise
         except httpx.TimeoutException:
             raise Exception("Request to OpenRouter API timed out")
         except Exception as e:
             raise Exception(f"Error generating recipes: {str(e)}")
     
-    def _create_recipe_prompt(self, ingredients: List[str]) -> str:
+    async def _generate_with_failover(
+        self, prompt: str, variant: str, models: List[str]
+    ) -> Tuple[List[Recipe], CompletionUsage]:
+        """Try each model in order until one returns recipes"""
+        error: Optional[Exception] = None
+        for model in models:
+            try:
+                return await self._generate_with_model(prompt, variant, model)
+            except UpstreamBusyError:
+                raise
+            except Exception as e:
+                print(f"Model {model} failed: {e}")
+                error = e
+        raise error
+    
+    async def _generate_hedged(
+        self, prompt: str, variant: str, primary: str, alternates: List[str]
+    ) -> Tuple[List[Recipe], CompletionUsage]:
+        """
+        Call the primary model; if it has not answered within its p95, race a
+        request to the alternates and take whichever returns recipes first.
+        """
+        pending = {asyncio.create_task(self._generate_with_model(prompt, variant, primary))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.model_pool.hedge_delay(primary))
+            if done:
+                task = done.pop()
+                if task.exception() is None:
+                    return task.result()
+                if isinstance(task.exception(), UpstreamBusyError):
+                    raise task.exception()
+                print(f"Model {primary} failed: {task.exception()}")
+                return await self._generate_with_failover(prompt, variant, alternates)
+            
+            self.model_pool.hedges += 1
+            pending.add(asyncio.create_task(self._generate_with_failover(prompt, variant, alternates)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower request is abandoned; cancelling it frees its upstream slot
+            for task in pending:
+                task.cancel()
+    
+    async def _generate_with_model(
+        self, prompt: str, variant: str, model: str
+    ) -> Tuple[List[Recipe], CompletionUsage]:
+        """One non-streaming completion against `model`, recorded on its circuit breaker"""
+        if not self.model_pool.allow(model):
+            raise CircuitOpenError(f"Circuit open for model {model}")
+        
+        started = time.monotonic()
+        try:
+            response, latency = await self._post_completion(self._create_payload(prompt, model=model, variant=variant))
+        except UpstreamBusyError:
+            raise  # our own load shedding says nothing about the model's health
+        except UpstreamHTTPError as e:
+            if not e.throttled:  # neither does a rate limit
+                self.model_pool.record_failure(model)
+            raise
+        except Exception:
+            self.model_pool.record_failure(model)
+            raise
+        self.model_pool.record_success(model, time.monotonic() - started)
+        
+        usage = CompletionUsage(model=model, prompt_variant=variant, latency_ms=round(latency * 1000, 1))
+        return self._parse_completion(response, usage), usage
+    
+    def _parse_completion(self, response: httpx.Response, usage: CompletionUsage) -> List[Recipe]:
+        """Extract the recipes from a chat-completions response, recording its usage block"""
+        result = response.json()
+        usage.update(result.get("usage"))
+        content = result["choices"][0]["message"]["content"]
+        
+        recipes = parse_recipes(content)
+        if not recipes:
+            print(f"No recipes in LLM response: {content[:500]}...")
+            raise Exception("No valid recipes could be parsed from LLM response")
+        
+        return self._calculate_nutrition(recipes[:self.recipe_count])
+    
+    def _calculate_nutrition(self, recipes: List[Recipe]) -> List[Recipe]:
+        """Swap the LLM's nutrition estimates for values calculated from the nutrient table, where it covers the recipe"""
+        if self.nutrition_calculator is None:
+            return recipes
+        with STAGE_SECONDS.time(stage="nutrition_calculation"):
+            return self.nutrition_calculator.apply(recipes)
+    
+    async def stream_recipes(
+        self,
+        ingredients: List[str],
+        usage: Optional[CompletionUsage] = None
+    ) -> AsyncIterator[Recipe]:
+        """
+        Stream recipes from OpenRouter, yielding each one as soon as its JSON is complete.
+        
+        A model that fails before producing a recipe is skipped in favour of the
+        next one; once recipes have been sent the stream is not switched.
+        `usage`, when given, is filled in once the stream has finished.
+        """
+        variant = self._choose_prompt_variant()
+        prompt = self._create_recipe_prompt(ingredients, variant)
+        usage = usage if usage is not None else CompletionUsage()
+        count = 0
+        
+        try:
+            models = self.model_pool.available()
+            if not models:
+                raise CircuitOpenError("All configured models are unavailable (circuit open)")
+            
+            for position, model in enumerate(models):
+                try:
+                    async for recipe in self._stream_from_model(prompt, variant, model, usage):
+                        count += 1
+                        yield recipe
+                    break
+                except UpstreamBusyError:
+                    raise
+                except Exception as e:
+                    if count or position == len(models) - 1:
+                        raise
+                    print(f"Model {model} failed: {e}")
+                
+        except UpstreamBusyError:
+            raise
+        except httpx.TimeoutException:
+            raise Exception("Request to OpenRouter API timed out")
+        except Exception as e:
+            raise Exception(f"Error streaming recipes: {str(e)}")
+    
+    async def _stream_from_model(
+        self, prompt: str, variant: str, model: str, usage: CompletionUsage
+    ) -> AsyncIterator[Recipe]:
+        """Stream one completion from `model`, recorded on its circuit breaker"""
+        if not self.model_pool.allow(model):
+            raise CircuitOpenError(f"Circuit open for model {model}")
+        
+        parser = RecipeStreamParser()
+        count = 0
+        try:
+            async with self._slot(), self._client() as client:
+                started = time.monotonic()
+                async with client.stream(
+                    "POST",
+                    f"{self.api_url}/chat/completions",
+                    headers=self._headers(),
+                    json=self._create_payload(prompt, stream=True, model=model, variant=variant)
+                ) as response:
+                    UPSTREAM_RESPONSES.inc(model=model, status=str(response.status_code))
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        raise UpstreamHTTPError(
+                            response.status_code,
+                            body.decode(errors="replace"),
+                            retry_after=parse_retry_after(response.headers.get("retry-after"))
+                        )
+                    
+                    # Server-sent events: "data: {chunk}" lines, ":" keep-alive comments, "data: [DONE]"
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        
+                        chunk = json.loads(data)
+                        usage.update(chunk.get("usage"))  # sent with the last chunk
+                        choices = chunk.get("choices") or [{}]
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        # Past the last recipe, keep reading only for the usage chunk
+                        if not delta or count >= self.recipe_count:
+                            continue
+                        
+                        objects = parser.feed(delta)
+                        if not objects:
+                            continue
+                        recipes = validate_recipes([normalize_recipe_data(data) for data in objects])
+                        for recipe in self._calculate_nutrition(recipes):
+                            if count == 0:
+                                self.model_pool.record_success(model)
+                            count += 1
+                            yield recipe
+                            if count >= self.recipe_count:
+                                break
+                
+                usage.model = model
+                usage.prompt_variant = variant
+                usage.latency_ms = round((time.monotonic() - started) * 1000, 1)
+            
+            if count == 0:
+                raise Exception("No valid recipes could be parsed from LLM response")
+        except UpstreamBusyError:
+            raise
+        except httpx.TransportError:
+            UPSTREAM_RESPONSES.inc(model=model, status="error")
+            self.model_pool.record_failure(model)
+            raise
+        except UpstreamHTTPError as e:
+            if not e.throttled:
+                self.model_pool.record_failure(model)
+            raise
+    
+    async def _post_completion(self, payload: Dict[str, Any]) -> Tuple[httpx.Response, float]:
+        """
+        POST a chat completion through the scheduler (rate limit, concurrency cap, retries).
+        
+        Returns the response and the seconds its attempt took, excluding queueing and earlier retries.
+        """
+        
+        model = payload["model"]
+        
+        async def attempt() -> Tuple[httpx.Response, float]:
+            started = time.monotonic()
+            try:
+                with STAGE_SECONDS.time(stage="upstream_llm_call"):
+                    async with self._client() as client:
+                        response = await client.post(
+                            f"{self.api_url}/chat/completions",
+                            headers=self._headers(),
+                            json=payload
+                        )
+            except httpx.TransportError:
+                UPSTREAM_RESPONSES.inc(model=model, status="error")
+                raise
+            UPSTREAM_RESPONSES.inc(model=model, status=str(response.status_code))
+            if response.status_code != 200:
+                raise UpstreamHTTPError(
+                    response.status_code,
+                    response.text,
+                    retry_after=parse_retry_after(response.headers.get("retry-after"))
+                )
+            return response, time.monotonic() - started
+        
+        if self.scheduler is None:
+            return await attempt()
+        return await self.scheduler.run(attempt)
+    
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold an upstream slot when a scheduler is configured (streams are not retried)"""
+        if self.scheduler is None:
+            yield
+        else:
+            async with self.scheduler.slot():
+                yield
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _create_payload(
+        self,
+        prompt: str,
+        stream: bool = False,
+        model: Optional[str] = None,
+        variant: str = FULL_PROMPT
+    ) -> Dict[str, Any]:
+        """Build the chat-completions request body"""
+        payload = {
+            "model": model or self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a professional chef and nutritionist. Generate recipes in valid JSON format only."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": self._max_tokens(variant),
+            # Ask OpenRouter to report token counts and cost in the response
+            "usage": {"include": True}
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    def _choose_prompt_variant(self) -> str:
+        """Pick the compact prompt for OPENROUTER_COMPACT_PROMPT_RATIO of calls, so both can be compared"""
+        if self.compact_prompt_ratio > 0 and random.random() < self.compact_prompt_ratio:
+            return COMPACT_PROMPT
+        return FULL_PROMPT
+    
+    def _max_tokens(self, variant: str) -> int:
+        if variant == COMPACT_PROMPT:
+            return COMPACT_OVERHEAD_TOKENS + self.tokens_per_recipe * self.recipe_count
+        return 2000
+    
+    def _create_recipe_prompt(self, ingredients: List[str], variant: str = FULL_PROMPT) -> str:
         """Create a structured prompt for the LLM to generate recipes"""
         ingredients_str = ", ".join(ingredients)
+        if variant == COMPACT_PROMPT:
+            return self._create_compact_prompt(ingredients_str)
+        
+        if self.prompt_nutrition:
+            nutrition_requirement = "\n✓ Include accurate nutritional estimates"
+            nutrition_example = """
+            "nutrition": {
+                "calories": 350,
+                "protein": "18g",
+                "carbs": "45g",
+                "fat": "12g",
+                "fiber": "6g"
+            },"""
+            nutrition_note = "\nNUTRITION: Realistic estimates per serving"
+        else:
+            nutrition_requirement = nutrition_example = nutrition_note = ""
         
         return f"""
 You are a professional chef and nutritionist. Generate 2-3 creative and delicious recipes using these ingredients: {ingredients_str}
@@ -104,8 +436,8 @@ You are a professional chef and nutritionist. Generate 2-3 creative and deliciou
 REQUIREMENTS:
 ✓ Use as many provided ingredients as possible
 ✓ Add reasonable common ingredients if needed
-✓ Create practical, home-cookable recipes
-✓ Include accurate nutritional estimates
+✓ Create practical, home-cookable recipes{nutrition_requirement}
+✓ List every ingredient with its amount
 ✓ Provide clear step-by-step instructions
 ✓ Estimate realistic cooking times and difficulty levels
 
@@ -116,57 +448,36 @@ RESPONSE FORMAT: Return ONLY valid JSON, no other text:
         {{
             "id": "recipe_1",
             "name": "Recipe Name",
-            "ingredients": ["main ingredient", "additional ingredient", "seasoning"],
+            "ingredients": ["300g main ingredient", "1 cup additional ingredient", "1 tsp seasoning"],
             "instructions": [
                 "Step 1: Preparation details",
                 "Step 2: Cooking process", 
                 "Step 3: Final assembly"
             ],
             "cookingTime": "25 minutes",
-            "difficulty": "Easy",
-            "nutrition": {{
-                "calories": 350,
-                "protein": "18g",
-                "carbs": "45g",
-                "fat": "12g",
-                "fiber": "6g"
-            }},
+            "difficulty": "Easy",{nutrition_example}
             "servings": 4
         }}
     ]
 }}
 
 DIFFICULTY LEVELS: Easy (basic cooking), Medium (some skill required), Hard (advanced techniques)
-COOKING TIME: Include prep + cook time (e.g., "30 minutes", "1 hour 15 minutes")
-NUTRITION: Realistic estimates per serving
+COOKING TIME: Include prep + cook time (e.g., "30 minutes", "1 hour 15 minutes"){nutrition_note}
 
 Generate recipes now using: {ingredients_str}
 """
     
-    def _parse_recipe_data(self, recipe_data: Dict[str, Any]) -> Recipe:
-        """Parse recipe data from LLM response into Recipe object"""
-        try:
-            # Handle both new and legacy nutrition formats
-            nutrition_data = recipe_data.get("nutrition", recipe_data.get("nutritionalInfo", {}))
-            nutritional_info = NutritionalInfo(**nutrition_data)
-            
-            # Create recipe with new format, fallback to legacy fields
-            recipe = Recipe(
-                id=recipe_data["id"],
-                name=recipe_data.get("name", recipe_data.get("title", "Unnamed Recipe")),
-                ingredients=recipe_data["ingredients"],
-                instructions=recipe_data["instructions"],
-                cookingTime=recipe_data.get("cookingTime", f"{recipe_data.get('prepTime', 30)} minutes"),
-                difficulty=recipe_data.get("difficulty", "Medium"),
-                nutrition=nutritional_info,
-                # Legacy fields for backward compatibility
-                title=recipe_data.get("title", recipe_data.get("name")),
-                nutritionalInfo=nutritional_info,
-                prepTime=recipe_data.get("prepTime"),
-                servings=recipe_data.get("servings", 4)
-            )
-            return recipe
-        except Exception as e:
-            print(f"Error parsing recipe data: {e}")
-            print(f"Recipe data: {recipe_data}")
-            return None 
\ No newline at end of file
+    def _create_compact_prompt(self, ingredients_str: str) -> str:
+        """A short prompt asking for minified JSON, so fewer tokens go each way"""
+        if self.prompt_nutrition:
+            nutrition_note = "Nutrition is a realistic per-serving estimate. "
+            nutrition_field = ',"nutrition":{"calories":350,"protein":"18g","carbs":"45g","fat":"12g","fiber":"6g","sugar":"5g"}'
+        else:
+            nutrition_note = nutrition_field = ""
+        return (
+            f"Create {self.recipe_count} practical home recipes using mostly: {ingredients_str}. "
+            f"Common pantry items are fine. Give every ingredient an amount. {nutrition_note}"
+            "Reply with minified JSON only, in this shape: "
+            '{"recipes":[{"id":"recipe_1","name":"...","ingredients":["200g ..."],"instructions":["..."],'
+            f'"cookingTime":"25 minutes","difficulty":"Easy|Medium|Hard","servings":4{nutrition_field}}}]}}'
+        )
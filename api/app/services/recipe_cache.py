@@ -0,0 +1,98 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.schemas import Recipe
+
+CacheKey = Tuple[str, ...]
+
+def make_cache_key(ingredients: Iterable[str]) -> CacheKey:
+    """Build an order-insensitive key from the normalized, sorted ingredient set"""
+    normalized = {" ".join(ingredient.lower().split()) for ingredient in ingredients}
+    normalized.discard("")
+    return tuple(sorted(normalized))
+
+class RecipeCache:
+    """In-memory LRU cache of generated recipes bounded by entries, bytes and TTL"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "1000"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("RECIPE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RECIPE_CACHE_TTL_SECONDS", "3600"))
+
+        # key -> (expires_at, size_in_bytes, recipes); most recently used last
+        self._entries: "OrderedDict[CacheKey, Tuple[float, int, List[Recipe]]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, key: CacheKey) -> Optional[List[Recipe]]:
+        """Return cached recipes for the key, or None on a miss or expired entry"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, recipes = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(recipes)
+
+    def set(self, key: CacheKey, recipes: List[Recipe]) -> None:
+        """Store recipes under the key, evicting least recently used entries to fit"""
+        if not self.enabled or not recipes:
+            return
+
+        size = sum(len(recipe.model_dump_json()) for recipe in recipes)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, list(recipes))
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+    def _remove(self, key: CacheKey) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -1,128 +1,521 @@
+import asyncio
+import base64
 import json
+import os
+import re
 import uuid
-from typing import List
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.orm import joinedload
 
+from app.database import AsyncSessionLocal
+from app.metrics import CACHE_REQUESTS, FALLBACKS_SERVED, STAGE_SECONDS, STREAMS_INTERRUPTED
 from app.models import RecipeAnalysis, GeneratedRecipe
-from app.schemas import Recipe, RecipeAnalysisRequest, RecipeAnalysisResponse
+from app.schemas import (
+    BatchAnalysisItem, NutritionalInfo, Recipe, RecipeAnalysisRequest, RecipeAnalysisResponse,
+    RecipeSearchResponse, RecipeSearchResult
+)
+from app.services.analysis_writer import AnalysisWriter, PendingAnalysis, write_analyses
+from app.services.ingredient_canonicalizer import canonicalize_ingredients
+from app.services.ingredient_index import IngredientIndex
+from app.services.nutrition_calculator import default_calculator
 from app.services.openrouter_service import OpenRouterService
+from app.services.recipe_cache import CacheKey, RecipeCache, make_cache_key
+from app.services.similar_index import SimilarAnalysisIndex
+from app.services.single_flight import SingleFlight
+from app.services.stats_service import StatsRecorder
+from app.services.upstream_scheduler import UpstreamBusyError
+from app.services.usage_service import CompletionUsage
+
+def encode_history_cursor(created_at: datetime, analysis_id: str) -> str:
+    """Encode the keyset position of a history entry as an opaque cursor"""
+    raw = json.dumps([created_at.isoformat(), analysis_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a history cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, analysis_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(analysis_id)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+def build_search_query(query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query: all words required, last one as a prefix"""
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
 
 class RecipeService:
-    def __init__(self, openrouter_service: OpenRouterService):
+    def __init__(
+        self,
+        openrouter_service: OpenRouterService,
+        cache: Optional[RecipeCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        writer: Optional[AnalysisWriter] = None,
+        ingredient_index: Optional[IngredientIndex] = None,
+        similar_index: Optional[SimilarAnalysisIndex] = None,
+        stats: Optional[StatsRecorder] = None
+    ):
         self.openrouter_service = openrouter_service
+        self.cache = cache
+        self.single_flight = single_flight
+        self.writer = writer
+        self.ingredient_index = ingredient_index
+        self.similar_index = similar_index
+        self.stats = stats
     
     async def analyze_ingredients(
         self, 
         request: RecipeAnalysisRequest, 
-        db: AsyncSession
+        db: AsyncSession,
+        use_cache: bool = True,
+        fallback: bool = True
     ) -> RecipeAnalysisResponse:
-        """Analyze ingredients and generate recipes with nutritional info"""
+        """
+        Analyze ingredients and generate recipes with nutritional info.
         
-        # Create analysis record
-        analysis = RecipeAnalysis(
-            id=str(uuid.uuid4()),
-            ingredients=json.dumps(request.ingredients)
-        )
-        db.add(analysis)
-        await db.flush()  # Get the ID without committing
+        With `fallback=False` a failed LLM call raises instead of returning
+        the static fallback recipes, e.g. so an analysis job can be retried.
+        """
+        
+        # Canonical names ("2 Roma tomatoes" -> "tomato") key the cache and indexes and go into the prompt
+        ingredients = canonicalize_ingredients(request.ingredients)
+        
+        # Same ingredient set in any order is served from the cache or stored recipes
+        cache_key = make_cache_key(ingredients)
+        if use_cache:
+            found = await self._find_existing(db, cache_key, ingredients)
+            if found is not None:
+                recipes, message = found
+                self._record_served(ingredients)
+                return RecipeAnalysisResponse(recipes=recipes, message=message)
         
         try:
-            # Generate recipes using LLM
-            recipes = await self.openrouter_service.generate_recipes(request.ingredients)
-            
-            # Save generated recipes to database
-            for recipe in recipes:
-                db_recipe = GeneratedRecipe(
-                    id=recipe.id,
-                    analysis_id=analysis.id,
-                    title=recipe.title,
-                    ingredients=json.dumps(recipe.ingredients),
-                    instructions=json.dumps(recipe.instructions),
-                    prep_time=recipe.prepTime,
-                    servings=recipe.servings,
-                    calories=recipe.nutritionalInfo.calories,
-                    protein=recipe.nutritionalInfo.protein,
-                    carbs=recipe.nutritionalInfo.carbs,
-                    fat=recipe.nutritionalInfo.fat,
-                    fiber=recipe.nutritionalInfo.fiber,
-                    sugar=recipe.nutritionalInfo.sugar
-                )
-                db.add(db_recipe)
-            
-            await db.commit()
-            
-            return RecipeAnalysisResponse(
-                recipes=recipes,
-                message=f"Generated {len(recipes)} recipes from your ingredients!"
-            )
-            
+            # Concurrent requests for the same ingredient set share one LLM call
+            recipes, usage, shared = await self._generate_recipes(cache_key, ingredients)
+        except UpstreamBusyError:
+            # Shedding load: let the caller retry rather than serve fallbacks
+            raise
         except Exception as e:
             await db.rollback()
+            if not fallback:
+                raise
+            print(f"Recipe generation failed, serving fallbacks: {e}")
+            FALLBACKS_SERVED.inc(endpoint="analyze")
+            self._record_served(ingredients, fallback=True)
             # Return fallback recipes if LLM fails
-            fallback_recipes = self._create_fallback_recipes(request.ingredients)
+            fallback_recipes = self._create_fallback_recipes(ingredients)
             
             return RecipeAnalysisResponse(
                 recipes=fallback_recipes,
                 message="Using fallback recipes due to service unavailability. Please try again later for AI-generated suggestions."
             )
+        
+        # Only the request that performed the call records the analysis. A failed
+        # write must not cost the caller the recipes that were already paid for.
+        if not shared:
+            try:
+                await self._save_analysis(db, request.ingredients, recipes, usage, ingredients)
+            except Exception as e:
+                await db.rollback()
+                print(f"Failed to persist analysis: {e}")
+        
+        self._record_served(ingredients)
+        return RecipeAnalysisResponse(
+            recipes=recipes,
+            message=f"Generated {len(recipes)} recipes from your ingredients!"
+        )
     
-    async def get_recipe_history(self, db: AsyncSession, limit: int = 10) -> List[RecipeAnalysisResponse]:
-        """Get recent recipe analyses"""
-        
-        stmt = select(RecipeAnalysis).order_by(RecipeAnalysis.created_at.desc()).limit(limit)
-        result = await db.execute(stmt)
-        analyses = result.scalars().all()
-        
-        history = []
-        for analysis in analyses:
-            # Get recipes for this analysis
-            recipe_stmt = select(GeneratedRecipe).where(GeneratedRecipe.analysis_id == analysis.id)
-            recipe_result = await db.execute(recipe_stmt)
-            db_recipes = recipe_result.scalars().all()
-            
-            # Convert to Recipe objects
-            recipes = []
-            for db_recipe in db_recipes:
-                recipe = Recipe(
-                    id=db_recipe.id,
-                    title=db_recipe.title,
-                    ingredients=json.loads(db_recipe.ingredients),
-                    instructions=json.loads(db_recipe.instructions),
-                    nutritionalInfo={
-                        "calories": db_recipe.calories,
-                        "protein": db_recipe.protein,
-                        "carbs": db_recipe.carbs,
-                        "fat": db_recipe.fat,
-                        "fiber": db_recipe.fiber,
-                        "sugar": db_recipe.sugar
-                    },
-                    prepTime=db_recipe.prep_time,
-                    servings=db_recipe.servings
-                )
+    async def stream_ingredients(
+        self,
+        request: RecipeAnalysisRequest,
+        use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream an analysis as `(event, data)` pairs: a `"recipe"` event per recipe
+        as soon as it is generated, then a single `"done"` event with the message.
+        When the upstream is at capacity a single `"error"` event is sent instead,
+        and when generation fails after some recipes were sent an `"error"` event
+        marked `partial` ends the stream; those recipes are neither cached nor stored.
+        """
+        ingredients = canonicalize_ingredients(request.ingredients)
+        cache_key = make_cache_key(ingredients)
+        if use_cache:
+            async with AsyncSessionLocal() as db:
+                found = await self._find_existing(db, cache_key, ingredients)
+            if found is not None:
+                recipes, message = found
+                self._record_served(ingredients)
+                for recipe in recipes:
+                    yield "recipe", recipe
+                yield "done", {"message": message}
+                return
+        
+        recipes = []
+        usage = CompletionUsage()
+        try:
+            async for recipe in self.openrouter_service.stream_recipes(ingredients, usage):
                 recipes.append(recipe)
-            
-            history.append(RecipeAnalysisResponse(recipes=recipes))
+                yield "recipe", recipe
+        except UpstreamBusyError as e:
+            yield "error", {"message": str(e), "retryAfter": e.retry_after}
+            return
+        except Exception as e:
+            if not recipes:
+                # Return fallback recipes if LLM fails before producing anything
+                FALLBACKS_SERVED.inc(endpoint="stream")
+                self._record_served(ingredients, fallback=True)
+                for recipe in self._create_fallback_recipes(ingredients):
+                    yield "recipe", recipe
+                yield "done", {"message": "Using fallback recipes due to service unavailability. Please try again later for AI-generated suggestions."}
+                return
+            if len(recipes) < self.openrouter_service.recipe_count:
+                # A truncated analysis must not be served to later requests as if it were complete
+                print(f"Recipe stream failed after {len(recipes)} recipes: {e}")
+                STREAMS_INTERRUPTED.inc()
+                yield "error", {
+                    "message": f"Recipe generation failed after {len(recipes)} recipes. Please try again.",
+                    "partial": True
+                }
+                return
+        
+        if self.cache is not None:
+            self.cache.set(cache_key, recipes)
+        
+        # The request-scoped session may already be closed while streaming
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._save_analysis(db, request.ingredients, recipes, usage, ingredients)
+            except Exception as e:
+                print(f"Failed to persist streamed analysis: {e}")
+        
+        self._record_served(ingredients)
+        yield "done", {"message": f"Generated {len(recipes)} recipes from your ingredients!"}
+    
+    async def analyze_batch(
+        self,
+        requests: List[RecipeAnalysisRequest],
+        db: AsyncSession,
+        use_cache: bool = True,
+        concurrency: Optional[int] = None
+    ) -> List[BatchAnalysisItem]:
+        """
+        Analyze many ingredient sets at once; results come back in input order.
+        
+        Cache and stored-recipe lookups run first, then the remaining LLM calls
+        fan out under a semaphore and every new analysis is persisted in one
+        bulk insert. Failed items are reported as errors rather than fallbacks.
+        """
+        concurrency = concurrency or int(os.getenv("RECIPE_BATCH_CONCURRENCY", "8"))
+        semaphore = asyncio.Semaphore(concurrency)
+        items: List[Optional[BatchAnalysisItem]] = [None] * len(requests)
+        new_analyses: List[PendingAnalysis] = []
+        
+        # Lookups share the session, so they run one at a time (they take milliseconds)
+        canonical = [canonicalize_ingredients(request.ingredients) for request in requests]
+        misses: Dict[CacheKey, List[int]] = {}
+        for index, ingredients in enumerate(canonical):
+            cache_key = make_cache_key(ingredients)
+            if cache_key in misses:
+                misses[cache_key].append(index)
+                continue
+            found = await self._find_existing(db, cache_key, ingredients) if use_cache else None
+            if found is None:
+                misses[cache_key] = [index]
+            else:
+                recipes, message = found
+                self._record_served(ingredients)
+                items[index] = BatchAnalysisItem(
+                    index=index, status="ok", result=RecipeAnalysisResponse(recipes=recipes, message=message)
+                )
+        
+        async def generate(cache_key: CacheKey, indexes: List[int]):
+            # Duplicates within the batch share one call and one stored analysis
+            ingredients = canonical[indexes[0]]
+            async with semaphore:
+                try:
+                    recipes, usage, shared = await self._generate_recipes(cache_key, ingredients)
+                except Exception as e:
+                    for index in indexes:
+                        items[index] = BatchAnalysisItem(index=index, status="error", error=str(e))
+                    return
+            if not shared:
+                new_analyses.append(PendingAnalysis(
+                    ingredients=requests[indexes[0]].ingredients,
+                    recipes=recipes,
+                    usage=usage,
+                    canonical_ingredients=ingredients
+                ))
+            for index in indexes:
+                self._record_served(canonical[index])
+                items[index] = BatchAnalysisItem(
+                    index=index,
+                    status="ok",
+                    result=RecipeAnalysisResponse(
+                        recipes=recipes,
+                        message=f"Generated {len(recipes)} recipes from your ingredients!"
+                    )
+                )
+        
+        await asyncio.gather(*(generate(cache_key, indexes) for cache_key, indexes in misses.items()))
+        
+        if new_analyses:
+            try:
+                await write_analyses(db, new_analyses)
+                for pending in new_analyses:
+                    self._index_analysis(pending)
+            except Exception as e:
+                print(f"Failed to persist batch of {len(new_analyses)} analyses: {e}")
+        
+        return items
+    
+    async def _find_existing(
+        self,
+        db: AsyncSession,
+        cache_key: CacheKey,
+        ingredients: List[str]
+    ) -> Optional[Tuple[List[Recipe], str]]:
+        """Recipes for these ingredients from the cache or stored recipes, with the response message"""
+        if self.cache is not None:
+            with STAGE_SECONDS.time(stage="cache_lookup"):
+                cached_recipes = self.cache.get(cache_key)
+            if cached_recipes is not None:
+                CACHE_REQUESTS.inc(result="cache")
+                return cached_recipes, f"Generated {len(cached_recipes)} recipes from your ingredients!"
+        
+        # A past analysis of nearly the same set, e.g. the same ingredients plus salt
+        if self.similar_index is not None:
+            with STAGE_SECONDS.time(stage="similar_lookup"):
+                match = self.similar_index.find(ingredients)
+            if match is not None:
+                similar_recipes = await self._load_analysis_recipes(db, match[0])
+                if similar_recipes:
+                    CACHE_REQUESTS.inc(result="similar")
+                    if self.cache is not None:
+                        self.cache.set(cache_key, similar_recipes)
+                    return similar_recipes, f"Found {len(similar_recipes)} saved recipes for similar ingredients!"
+        
+        # Answer from previously generated recipes when enough of them fit
+        with STAGE_SECONDS.time(stage="stored_recipe_lookup"):
+            stored_recipes = await self._find_stored_recipes(db, cache_key, ingredients)
+        if stored_recipes:
+            CACHE_REQUESTS.inc(result="stored")
+            return stored_recipes, f"Found {len(stored_recipes)} saved recipes using your ingredients!"
+        CACHE_REQUESTS.inc(result="miss")
+        return None
+    
+    async def _load_analysis_recipes(self, db: AsyncSession, analysis_id: str) -> List[Recipe]:
+        result = await db.execute(select(GeneratedRecipe).where(GeneratedRecipe.analysis_id == analysis_id))
+        return [self._to_recipe(db_recipe) for db_recipe in result.scalars()]
+    
+    async def _find_stored_recipes(
+        self,
+        db: AsyncSession,
+        cache_key: CacheKey,
+        ingredients: List[str]
+    ) -> List[Recipe]:
+        """Stored recipes that cover enough of the requested ingredients, best first"""
+        if self.ingredient_index is None:
+            return []
+        
+        matches = self.ingredient_index.search(ingredients)
+        if not matches:
+            return []
+        
+        result = await db.execute(
+            select(GeneratedRecipe).where(GeneratedRecipe.id.in_([recipe_id for recipe_id, _ in matches]))
+        )
+        recipes_by_id = {db_recipe.id: db_recipe for db_recipe in result.scalars()}
+        recipes = [self._to_recipe(recipes_by_id[recipe_id]) for recipe_id, _ in matches if recipe_id in recipes_by_id]
+        
+        if len(recipes) < self.ingredient_index.min_results:
+            return []
+        if self.cache is not None:
+            self.cache.set(cache_key, recipes)
+        return recipes
+    
+    async def _save_analysis(
+        self,
+        db: AsyncSession,
+        ingredients: List[str],
+        recipes: List[Recipe],
+        usage: Optional[CompletionUsage] = None,
+        canonical_ingredients: Optional[List[str]] = None
+    ) -> None:
+        """Persist an analysis and its recipes, via the write-behind queue when available"""
+        pending = PendingAnalysis(
+            ingredients=ingredients, recipes=recipes, usage=usage, canonical_ingredients=canonical_ingredients
+        )
+        if self.writer is not None:
+            await self.writer.submit(pending)  # indexes the analysis once written
+        else:
+            await write_analyses(db, [pending])
+            self._index_analysis(pending)
+    
+    def _record_served(self, ingredients: List[str], fallback: bool = False) -> None:
+        """Count a served analysis towards /api/stats"""
+        if self.stats is not None:
+            self.stats.record(ingredients, fallback)
+    
+    def _index_analysis(self, pending: PendingAnalysis) -> None:
+        """Make a stored analysis findable by the ingredient and similar-set indexes"""
+        if self.ingredient_index is not None:
+            self.ingredient_index.add_recipes(pending.recipes)
+        if self.similar_index is not None:
+            self.similar_index.add(pending.id, pending.ingredients)
+    
+    async def _generate_recipes(
+        self,
+        cache_key: CacheKey,
+        ingredients: List[str]
+    ) -> Tuple[List[Recipe], CompletionUsage, bool]:
+        """Call the LLM, coalescing identical in-flight requests; returns (recipes, usage, shared)"""
+        
+        async def generate() -> Tuple[List[Recipe], CompletionUsage]:
+            recipes, usage = await self.openrouter_service.generate_recipes_with_usage(ingredients)
+            if self.cache is not None:
+                self.cache.set(cache_key, recipes)
+            return recipes, usage
+        
+        if self.single_flight is None:
+            recipes, usage = await generate()
+            return recipes, usage, False
+        (recipes, usage), shared = await self.single_flight.do(cache_key, generate)
+        return recipes, usage, shared
+    
+    async def get_recipe_history(
+        self,
+        db: AsyncSession,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[RecipeAnalysisResponse], Optional[str]]:
+        """
+        Get recent recipe analyses, newest first, with their recipes.
+        
+        Pages are keyset-paginated on `(created_at, id)`; pass the returned
+        cursor back to fetch the next page. The cursor is None on the last page.
+        """
+        
+        # One query: the limited analyses joined to their recipes
+        stmt = (
+            select(RecipeAnalysis)
+            .options(joinedload(RecipeAnalysis.recipes))
+            .order_by(RecipeAnalysis.created_at.desc(), RecipeAnalysis.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            created_at, analysis_id = decode_history_cursor(cursor)
+            stmt = stmt.where(or_(
+                RecipeAnalysis.created_at < created_at,
+                and_(RecipeAnalysis.created_at == created_at, RecipeAnalysis.id < analysis_id)
+            ))
+        
+        with STAGE_SECONDS.time(stage="history_query"):
+            result = await db.execute(stmt)
+            analyses = result.unique().scalars().all()
+        
+        next_cursor = None
+        if len(analyses) > limit:
+            analyses = analyses[:limit]
+            next_cursor = encode_history_cursor(analyses[-1].created_at, analyses[-1].id)
         
-        return history
+        history = [
+            RecipeAnalysisResponse(recipes=[self._to_recipe(db_recipe) for db_recipe in analysis.recipes])
+            for analysis in analyses
+        ]
+        return history, next_cursor
+    
+    async def search_recipes(
+        self,
+        db: AsyncSession,
+        query: str,
+        limit: int = 20,
+        offset: int = 0
+    ) -> RecipeSearchResponse:
+        """Full-text search over stored recipe titles, ingredients and instructions, ranked by bm25"""
+        
+        match = build_search_query(query)
+        if match is None:
+            raise ValueError("Search query must contain at least one word")
+        
+        # Titles weigh most, then ingredients, then instructions
+        stmt = text(
+            "SELECT recipe_search.recipe_id, bm25(recipe_search, 10.0, 5.0, 1.0) AS score "
+            "FROM recipe_search WHERE recipe_search MATCH :match "
+            "ORDER BY score LIMIT :limit OFFSET :offset"
+        )
+        result = await db.execute(stmt, {"match": match, "limit": limit + 1, "offset": offset})
+        hits = result.all()
+        
+        next_offset = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_offset = offset + limit
+        
+        recipes_result = await db.execute(
+            select(GeneratedRecipe).where(GeneratedRecipe.id.in_([hit.recipe_id for hit in hits]))
+        )
+        recipes_by_id = {db_recipe.id: db_recipe for db_recipe in recipes_result.scalars()}
+        
+        results = [
+            RecipeSearchResult(
+                recipe=self._to_recipe(recipes_by_id[hit.recipe_id]),
+                analysisId=recipes_by_id[hit.recipe_id].analysis_id,
+                score=hit.score
+            )
+            for hit in hits if hit.recipe_id in recipes_by_id
+        ]
+        return RecipeSearchResponse(results=results, nextOffset=next_offset)
+    
+    @staticmethod
+    def _to_recipe(db_recipe: GeneratedRecipe) -> Recipe:
+        """Convert a stored recipe row back into the API schema"""
+        def grams(value: Optional[float]) -> Optional[str]:
+            return None if value is None else f"{value:g}g"
+        
+        nutrition = NutritionalInfo(
+            calories=int(db_recipe.calories or 0),
+            protein=grams(db_recipe.protein) or "0g",
+            carbs=grams(db_recipe.carbs) or "0g",
+            fat=grams(db_recipe.fat),
+            fiber=grams(db_recipe.fiber),
+            sugar=grams(db_recipe.sugar)
+        )
+        cooking_time = f"{db_recipe.prep_time} minutes" if db_recipe.prep_time else "30 minutes"
+        
+        return Recipe(
+            id=db_recipe.id,
+            name=db_recipe.title,
+            ingredients=json.loads(db_recipe.ingredients),
+            instructions=json.loads(db_recipe.instructions),
+            cookingTime=cooking_time,
+            difficulty=db_recipe.difficulty or "Medium",
+            nutrition=nutrition,
+            # Legacy fields for backward compatibility
+            title=db_recipe.title,
+            nutritionalInfo=nutrition,
+            prepTime=db_recipe.prep_time,
+            servings=db_recipe.servings
+        )
     
     def _create_fallback_recipes(self, ingredients: List[str]) -> List[Recipe]:
         """Create simple fallback recipes when LLM is unavailable"""
-        from app.schemas import NutritionalInfo
         
         # Basic recipe templates based on common ingredients
-        nutrition = NutritionalInfo(
-            calories=250,
-            protein="15g",
-            carbs="20g",
-            fat="12g",
-            fiber="5g"
-        )
+        fallback_ingredients = ingredients + ["salt", "pepper", "cooking oil"]
+        nutrition = default_calculator().nutrition(fallback_ingredients, servings=2)
         
         fallback_recipe = Recipe(
             id=str(uuid.uuid4()),
             name=f"Simple {ingredients[0].title()} Recipe",
-            ingredients=ingredients + ["salt", "pepper", "cooking oil"],
+            ingredients=fallback_ingredients,
             instructions=[
                 f"Prepare all ingredients: {', '.join(ingredients[:3])}",
                 "Heat oil in a pan over medium heat",
@@ -0,0 +1,380 @@
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import RecipeAnalysis
+from app.services.ingredient_canonicalizer import canonicalize_ingredient, load_dictionary
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process saves; os.replace keeps the file whole
+    fcntl = None
+
+SNAPSHOT_VERSION = 2
+
+# SQLite assigns rowids in commit order (one writer at a time) and analyses are
+# never deleted, so "rowid > cursor" is every analysis the index has not read yet
+_ROWID = literal_column("recipe_analyses.rowid")
+
+# Salt for the per-term hash values; band keys must be identical across
+# processes and restarts for snapshots to be reusable
+_SALT = b"recipe-minhash-v1:"
+
+# Band entries are packed into one int64, `key << ENTRY_BITS | entry`, so each band
+# is a single sorted array: 8 bytes per analysis per band, searched with bisect
+ENTRY_BITS = 24
+ENTRY_MASK = (1 << ENTRY_BITS) - 1
+KEY_MASK = (1 << (63 - ENTRY_BITS)) - 1
+
+def _term_hashes(term: str, count: int) -> Tuple[int, ...]:
+    """`count` independent 32-bit hash values of a term, one per MinHash function"""
+    return struct.unpack(f"<{count}I", hashlib.shake_128(_SALT + term.encode()).digest(4 * count))
+
+class SimilarAnalysisIndex:
+    """
+    MinHash/LSH index over the ingredient sets of stored analyses.
+
+    `find` returns the stored analysis whose ingredient set is closest to the
+    requested one, if its Jaccard distance is at most `max_distance`: the
+    same set plus "salt" is a hit where the exact cache key misses.
+
+    Each set gets `bands * rows` MinHash values; sets that agree on all rows
+    of any band become candidates and are verified with their exact Jaccard
+    similarity. Bands are sorted int64 arrays, with inserts since the last
+    compaction kept in small dicts, so lookups cost a signature and a few
+    binary searches even at millions of analyses.
+
+    Identical sets share one entry pointing at the newest analysis. The
+    index is written to `path` periodically and at shutdown, and at startup
+    it is loaded from there and caught up with analyses stored since. A
+    snapshot records the database it was read from and the last rowid read;
+    one taken from another database is ignored and the index rebuilt. With
+    several worker processes only the one holding `<path>.lock` saves.
+    """
+
+    def __init__(
+        self,
+        max_distance: Optional[float] = None,
+        bands: Optional[int] = None,
+        rows: Optional[int] = None,
+        path: Optional[str] = None,
+        compact_after: Optional[int] = None
+    ):
+        self.max_distance = max_distance if max_distance is not None else float(os.getenv("RECIPE_SIMILAR_MAX_DISTANCE", "0.25"))
+        self.bands = bands or int(os.getenv("RECIPE_SIMILAR_BANDS", "16"))
+        self.rows = rows or int(os.getenv("RECIPE_SIMILAR_ROWS", "4"))
+        self.path = path if path is not None else os.getenv("RECIPE_SIMILAR_INDEX_PATH", "./similar_index.pkl")
+        self.compact_after = compact_after or int(os.getenv("RECIPE_SIMILAR_COMPACT_AFTER", "100000"))
+
+        self._vocabulary: Dict[str, int] = {}
+        self._ids: List[str] = []  # entry -> newest analysis id with that ingredient set
+        self._offsets = array("q", [0])  # entry -> slice of _terms
+        self._terms = array("i")
+        self._sorted: List[array] = [array("q") for _ in range(self.bands)]
+        self._recent: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        self._merging: Optional[List[Dict[int, List[int]]]] = None
+        self._recent_count = 0
+        self._compaction: Optional[asyncio.Task] = None
+        self._session_factory: Optional[async_sessionmaker] = None
+        self._database: Optional[str] = None
+        self._loaded_rowid = 0  # catch-up cursor: analyses up to this rowid are indexed
+        self._loaded_id: Optional[str] = None  # the analysis at that rowid, to recognize the database
+        self._dirty = False
+        self._write_lock = threading.Lock()
+        self._saver_lock = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def find(self, ingredients: Iterable[str]) -> Optional[Tuple[str, float]]:
+        """The closest stored analysis within `max_distance`, as (analysis_id, jaccard similarity)"""
+        match = self._find_entry(self._normalize(ingredients))
+        if match is None:
+            return None
+        entry, similarity = match
+        return self._ids[entry], similarity
+
+    def add(self, analysis_id: str, ingredients: Iterable[str]) -> None:
+        """Index one analysis; an identical ingredient set already indexed is re-pointed at it"""
+        terms = self._normalize(ingredients)
+        if not terms or len(self._ids) > ENTRY_MASK:
+            return
+
+        signature = self._signature(terms)
+        existing = self._find_entry(terms, signature, min_similarity=1.0)
+        if existing is not None:
+            self._ids[existing[0]] = analysis_id
+            self._dirty = True
+            return
+
+        entry = len(self._ids)
+        self._ids.append(analysis_id)
+        for term in terms:
+            term_id = self._vocabulary.get(term)
+            if term_id is None:
+                term_id = self._vocabulary[term] = len(self._vocabulary)
+            self._terms.append(term_id)
+        self._offsets.append(len(self._terms))
+        for band, key in enumerate(self._band_keys(signature)):
+            self._recent[band].setdefault(key, []).append(entry)
+        self._recent_count += 1
+        self._dirty = True
+
+        if self._recent_count >= self.compact_after and self._compaction is None:
+            self._compaction = asyncio.get_running_loop().create_task(self.compact())
+
+    async def compact(self) -> None:
+        """Merge recent inserts into the sorted band arrays, one band at a time in a worker thread"""
+        if self._merging is not None or not self._recent_count:
+            return
+        self._merging, self._recent, self._recent_count = self._recent, [{} for _ in range(self.bands)], 0
+        try:
+            # Until the swap, lookups find merged entries in both places; candidates are a set
+            for band in range(self.bands):
+                merged = await asyncio.to_thread(self._merge_band, self._sorted[band], self._merging[band])
+                self._sorted = self._sorted[:band] + [merged] + self._sorted[band + 1:]
+        except BaseException:
+            # Keep the inserts searchable; the next compaction retries them
+            for band, recent in enumerate(self._recent):
+                for key, entries in recent.items():
+                    self._merging[band].setdefault(key, []).extend(entries)
+            self._recent, self._recent_count = self._merging, sum(map(len, self._merging[0].values()))
+            raise
+        finally:
+            self._merging = None
+            self._compaction = None
+
+    async def load_and_catch_up(
+        self,
+        session_factory: async_sessionmaker,
+        save_seconds: float = 0,
+        refresh_seconds: float = 0,
+        batch_size: int = 5000
+    ) -> None:
+        """
+        Load the snapshot if it belongs to this database, add analyses stored
+        since (or all of them without one), then every `refresh_seconds` add
+        those stored by other workers and every `save_seconds` save the index
+        if it changed (each when set).
+        """
+        self._session_factory = session_factory
+        async with session_factory() as db:
+            self._database = db.get_bind().url.render_as_string(hide_password=True)
+            if self.path and os.path.exists(self.path):
+                try:
+                    state = await asyncio.to_thread(self._read_snapshot)
+                except Exception as e:
+                    print(f"Ignoring unreadable similar-analysis snapshot {self.path}: {e}")
+                    state = None
+                if state is not None and not await self._same_database(db, state):
+                    print(f"Similar-analysis snapshot {self.path} was taken from another database; rebuilding")
+                    state = None
+                if state is not None:
+                    # Swapped in on the event loop, so lookups never see half of it;
+                    # anything added meanwhile is stored after the snapshot and re-read below
+                    for name, value in state.items():
+                        setattr(self, name, value)
+
+        await self.catch_up(batch_size)
+        await self.compact()
+        self.ready = True
+
+        await asyncio.gather(
+            self._every(refresh_seconds, self.catch_up, "refresh"),
+            self._every(save_seconds, self.save, "save")
+        )
+
+    async def catch_up(self, batch_size: int = 5000) -> None:
+        """Add the analyses stored after the cursor, by this worker or any other"""
+        stmt = (
+            select(_ROWID, RecipeAnalysis.id, RecipeAnalysis.ingredients)
+            .where(_ROWID > self._loaded_rowid)
+            .order_by(_ROWID)
+            .execution_options(yield_per=batch_size)
+        )
+        added = 0
+        async with self._session_factory() as db:
+            result = await db.stream(stmt)
+            async for rowid, analysis_id, ingredients in result:
+                # Analyses this worker stored were added when written; re-adding only re-points their set
+                try:
+                    self.add(analysis_id, json.loads(ingredients))
+                except (TypeError, ValueError):
+                    pass
+                self._loaded_rowid, self._loaded_id = rowid, analysis_id
+                added += 1
+                if added % batch_size == 0:
+                    await asyncio.sleep(0)  # a full rebuild should not starve requests
+
+    async def save(self) -> None:
+        """Catch up and write the index to `path` atomically, if it changed since the last save"""
+        if not self.path or not self._dirty or not self.ready or not self._claim_saver():
+            return
+        # Moves the cursor past this worker's own analyses, so the next start reads only newer ones
+        await self.catch_up()
+        self._dirty = False
+        state = self._snapshot_state()
+        try:
+            await asyncio.to_thread(self._write_snapshot, state)
+        except BaseException:
+            self._dirty = True
+            raise
+
+    def close(self) -> None:
+        """Let another process take over saving"""
+        if self._saver_lock is not None:
+            self._saver_lock.close()
+            self._saver_lock = None
+
+    async def _every(self, seconds: float, action, name: str) -> None:
+        while seconds > 0:
+            await asyncio.sleep(seconds)
+            try:
+                await action()
+            except Exception as e:
+                print(f"Failed to {name} similar-analysis index: {e}")
+
+    async def _same_database(self, db: AsyncSession, state: dict) -> bool:
+        """Whether the snapshot's cursor analysis is stored at the same rowid here"""
+        if not state["_loaded_rowid"]:
+            return True
+        result = await db.execute(select(RecipeAnalysis.id).where(_ROWID == state["_loaded_rowid"]))
+        return result.scalar() == state["_loaded_id"]
+
+    def _claim_saver(self) -> bool:
+        """Whether this process writes the snapshot: the one holding an exclusive lock on `<path>.lock`"""
+        if self._saver_lock is not None or fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lock = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        # Held until close() or exit; a worker that dies frees it for another
+        self._saver_lock = lock
+        return True
+
+    def _normalize(self, ingredients: Iterable[str]) -> List[str]:
+        return sorted({canonicalize_ingredient(ingredient) for ingredient in ingredients} - {""})
+
+    def _signature(self, terms: List[str]) -> List[int]:
+        count = self.bands * self.rows
+        return list(map(min, zip(*(_term_hashes(term, count) for term in terms))))
+
+    def _band_keys(self, signature: List[int]) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            key = 0
+            for value in signature[band * self.rows:(band + 1) * self.rows]:
+                key = ((key * 1000003) ^ value) & 0xFFFFFFFFFFFFFFFF
+            keys.append(key & KEY_MASK)
+        return keys
+
+    def _find_entry(
+        self,
+        terms: List[str],
+        signature: Optional[List[int]] = None,
+        min_similarity: Optional[float] = None
+    ) -> Optional[Tuple[int, float]]:
+        if not terms or not self._ids:
+            return None
+        signature = signature or self._signature(terms)
+        min_similarity = min_similarity if min_similarity is not None else 1 - self.max_distance
+
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            packed = self._sorted[band]
+            low = key << ENTRY_BITS
+            index = bisect_left(packed, low)
+            while index < len(packed) and packed[index] >> ENTRY_BITS == key:
+                candidates.add(packed[index] & ENTRY_MASK)
+                index += 1
+            for recent in (self._recent, self._merging):
+                if recent is not None:
+                    candidates.update(recent[band].get(key, ()))
+
+        # Terms never seen before can only count towards the union
+        requested = {self._vocabulary.get(term, -1 - n) for n, term in enumerate(terms)}
+        best: Optional[Tuple[int, float]] = None
+        for entry in candidates:
+            stored = set(self._terms[self._offsets[entry]:self._offsets[entry + 1]])
+            shared = len(requested & stored)
+            similarity = shared / (len(requested) + len(stored) - shared)
+            if similarity >= min_similarity and (best is None or similarity > best[1]):
+                best = (entry, similarity)
+        return best
+
+    @staticmethod
+    def _merge_band(packed: array, recent: Dict[int, List[int]]) -> array:
+        values = packed.tolist()
+        values.extend((key << ENTRY_BITS) | entry for key, entries in recent.items() for entry in entries)
+        values.sort()
+        return array("q", values)
+
+    def _params(self) -> tuple:
+        return (SNAPSHOT_VERSION, self._database, self.bands, self.rows, _SALT, ENTRY_BITS, load_dictionary().version)
+
+    def _snapshot_state(self) -> dict:
+        """Copies taken on the event loop, so the thread pickles a consistent state"""
+        recent = [{key: list(entries) for key, entries in band.items()} for band in self._recent]
+        if self._merging is not None:
+            for band, merging in enumerate(self._merging):
+                for key, entries in merging.items():
+                    recent[band].setdefault(key, []).extend(entries)
+        return {
+            "params": self._params(),
+            "loaded_rowid": self._loaded_rowid,
+            "loaded_id": self._loaded_id,
+            "vocabulary": list(self._vocabulary),
+            "ids": list(self._ids),
+            "offsets": array("q", self._offsets),
+            "terms": array("i", self._terms),
+            "sorted": list(self._sorted),  # arrays are replaced, never mutated, by compaction
+            "recent": recent,
+        }
+
+    def _write_snapshot(self, state: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        # A cancelled save keeps writing in its thread; the shutdown save waits for it
+        with self._write_lock:
+            with open(temporary, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic, so a crash or another worker saving at the same time never leaves a torn file
+            os.replace(temporary, self.path)
+
+    def _read_snapshot(self) -> Optional[dict]:
+        """The index attributes stored in the snapshot, or None if it was built with other settings or another database URL"""
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("params") != self._params():
+            print(f"Similar-analysis snapshot {self.path} was built with other settings or another database; rebuilding")
+            return None
+
+        recent = state["recent"]
+        return {
+            "_vocabulary": {term: term_id for term_id, term in enumerate(state["vocabulary"])},
+            "_ids": state["ids"],
+            "_offsets": state["offsets"],
+            "_terms": state["terms"],
+            "_sorted": [self._merge_band(packed, band) for packed, band in zip(state["sorted"], recent)],
+            "_loaded_rowid": state["loaded_rowid"],
+            "_loaded_id": state["loaded_id"],
+            # Inserts made before the swap refer to the old entries; catching up re-adds them
+            "_recent": [{} for _ in range(self.bands)],
+            "_recent_count": 0,
+        }
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto a single in-flight task"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run `fn` once per key while a call is in flight and share its outcome.
+
+        Returns `(result, shared)`, where `shared` is False only for the caller
+        that started the call. Exceptions propagate to every waiter and the key
+        is released as soon as the call finishes, so the next call retries.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+
+        # Shield the shared task so a disconnecting caller (including the one
+        # that started it) does not cancel the call for everyone else
+        result = await asyncio.shield(task)
+        return result, shared
+
+    async def wait_idle(self) -> None:
+        """Wait for every in-flight call to finish, ignoring their outcomes"""
+        while self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+
+    def _release(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved; waiters (if any) re-raise it themselves
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,216 @@
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import AsyncSessionLocal
+from app.models import (
+    AnalysisHourlyStats, DifficultyNutritionStats, GeneratedRecipe, IngredientStats, RecipeAnalysis
+)
+from app.schemas import ActivityBucket, DifficultyMacros, IngredientCount, StatsResponse
+from app.services.nutrition_service import NUTRIENT_COLUMNS
+
+# Window an activity breakdown covers when the caller gives no start
+STATS_INTERVALS = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _upsert(model, key: str, columns: Iterable[str]):
+    """INSERT ... ON CONFLICT DO UPDATE that adds the new values to the stored ones"""
+    stmt = insert(model)
+    table = model.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={column: table.c[column] + stmt.excluded[column] for column in columns}
+    )
+
+_HOURLY_COLUMNS = ("requests", "analyses", "fallbacks")
+_NUTRITION_COLUMNS = ("recipe_count",) + tuple(
+    f"{name}_{part}" for name in NUTRIENT_COLUMNS for part in ("total", "count")
+)
+
+async def add_analysis_rollups(
+    db: AsyncSession,
+    analyses: Sequence[RecipeAnalysis],
+    recipes: Sequence[GeneratedRecipe]
+) -> None:
+    """Add newly written analyses and recipes to the rollups, in the caller's transaction"""
+    hours = Counter(hour_of(analysis.created_at) for analysis in analyses)
+    if hours:
+        await db.execute(
+            _upsert(AnalysisHourlyStats, "hour", _HOURLY_COLUMNS),
+            [{"hour": hour, "requests": 0, "analyses": count, "fallbacks": 0} for hour, count in hours.items()]
+        )
+
+    by_difficulty: Dict[str, Dict[str, float]] = {}
+    for recipe in recipes:
+        row = by_difficulty.setdefault(recipe.difficulty or "", dict.fromkeys(_NUTRITION_COLUMNS, 0))
+        row["recipe_count"] += 1
+        for name in NUTRIENT_COLUMNS:
+            value = getattr(recipe, name)
+            if value is not None:
+                row[f"{name}_total"] += value
+                row[f"{name}_count"] += 1
+    if by_difficulty:
+        await db.execute(
+            _upsert(DifficultyNutritionStats, "difficulty", _NUTRITION_COLUMNS),
+            [{"difficulty": difficulty, **row} for difficulty, row in by_difficulty.items()]
+        )
+
+def rebuild_nutrition_rollup(sync_conn) -> None:
+    """Recompute the per-difficulty nutrition rollup from generated_recipes, e.g. after a bulk rewrite"""
+    sums = ", ".join(f"COALESCE(SUM({name}), 0), COUNT({name})" for name in NUTRIENT_COLUMNS)
+    sync_conn.execute(text("DELETE FROM nutrition_stats_by_difficulty"))
+    sync_conn.execute(text(
+        f"INSERT INTO nutrition_stats_by_difficulty (difficulty, {', '.join(_NUTRITION_COLUMNS)}) "
+        f"SELECT COALESCE(difficulty, ''), COUNT(*), {sums} FROM generated_recipes GROUP BY COALESCE(difficulty, '')"
+    ))
+
+class StatsRecorder:
+    """
+    Counts served analyses per hour and requested ingredients.
+
+    Requests only bump in-memory counters; a background task adds them to the
+    rollup tables every `flush_seconds` in one short transaction, so cache hits
+    never wait on SQLite's write lock. Each worker process flushes its own
+    counts, and the upserts add rather than overwrite.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        flush_seconds: Optional[float] = None
+    ):
+        self.session_factory = session_factory
+        self.flush_seconds = flush_seconds or float(os.getenv("STATS_FLUSH_SECONDS", "5"))
+        self._hours: Dict[datetime, Counter] = {}
+        self._ingredients: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, ingredients: List[str], fallback: bool = False) -> None:
+        """Count one analysis served for these canonical ingredients"""
+        counts = self._hours.setdefault(hour_of(datetime.utcnow()), Counter())
+        counts["requests"] += 1
+        if fallback:
+            counts["fallbacks"] += 1
+        self._ingredients.update(ingredients)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write whatever is still counted"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        hours, self._hours = self._hours, {}
+        ingredients, self._ingredients = self._ingredients, Counter()
+        if not hours and not ingredients:
+            return
+        try:
+            async with self.session_factory() as db:
+                if hours:
+                    await db.execute(
+                        _upsert(AnalysisHourlyStats, "hour", _HOURLY_COLUMNS),
+                        [
+                            {"hour": hour, "requests": counts["requests"], "analyses": 0, "fallbacks": counts["fallbacks"]}
+                            for hour, counts in hours.items()
+                        ]
+                    )
+                if ingredients:
+                    await db.execute(
+                        _upsert(IngredientStats, "ingredient", ("requests",)),
+                        [{"ingredient": name, "requests": count} for name, count in ingredients.items()]
+                    )
+                await db.commit()
+        except Exception as e:
+            # Keep the counts for the next flush
+            print(f"Failed to flush stats: {e}")
+            for hour, counts in hours.items():
+                self._hours.setdefault(hour, Counter()).update(counts)
+            self._ingredients.update(ingredients)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+class StatsService:
+    """Reads the rollup tables; cost depends on the window, not on how many analyses are stored"""
+
+    async def get_stats(
+        self,
+        db: AsyncSession,
+        interval: str = "hour",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        top: int = 20
+    ) -> StatsResponse:
+        end = end or hour_of(datetime.utcnow()) + timedelta(hours=1)
+        start = start or end - STATS_INTERVALS[interval]
+
+        result = await db.execute(
+            select(AnalysisHourlyStats)
+            .where(AnalysisHourlyStats.hour >= hour_of(start), AnalysisHourlyStats.hour < end)
+            .order_by(AnalysisHourlyStats.hour)
+        )
+        activity = self._to_buckets(result.scalars(), interval)
+        requests = sum(bucket.requests for bucket in activity)
+        fallbacks = sum(bucket.fallbacks for bucket in activity)
+
+        result = await db.execute(
+            select(IngredientStats)
+            .order_by(IngredientStats.requests.desc(), IngredientStats.ingredient)
+            .limit(top)
+        )
+        top_ingredients = [IngredientCount(ingredient=row.ingredient, requests=row.requests) for row in result.scalars()]
+
+        result = await db.execute(select(DifficultyNutritionStats).order_by(DifficultyNutritionStats.difficulty))
+        macros = [self._to_macros(row) for row in result.scalars()]
+
+        return StatsResponse(
+            interval=interval,
+            start=start,
+            end=end,
+            requests=requests,
+            analyses=sum(bucket.analyses for bucket in activity),
+            fallbacks=fallbacks,
+            fallbackRate=round(fallbacks / requests, 4) if requests else None,
+            activity=activity,
+            topIngredients=top_ingredients,
+            macrosByDifficulty=macros
+        )
+
+    @staticmethod
+    def _to_buckets(rows: Iterable[AnalysisHourlyStats], interval: str) -> List[ActivityBucket]:
+        buckets: Dict[datetime, Tuple[int, int, int]] = {}
+        for row in rows:
+            key = row.hour if interval == "hour" else row.hour.replace(hour=0)
+            requests, analyses, fallbacks = buckets.get(key, (0, 0, 0))
+            buckets[key] = (requests + row.requests, analyses + row.analyses, fallbacks + row.fallbacks)
+        return [
+            ActivityBucket(start=key, requests=requests, analyses=analyses, fallbacks=fallbacks)
+            for key, (requests, analyses, fallbacks) in buckets.items()
+        ]
+
+    @staticmethod
+    def _to_macros(row: DifficultyNutritionStats) -> DifficultyMacros:
+        averages = {}
+        for name in NUTRIENT_COLUMNS:
+            count = getattr(row, f"{name}_count")
+            averages[name] = round(getattr(row, f"{name}_total") / count, 2) if count else None
+        return DifficultyMacros(difficulty=row.difficulty or None, recipeCount=row.recipe_count, **averages)
@@ -0,0 +1,185 @@
+import asyncio
+import math
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# Upstream statuses worth retrying: timeouts, rate limits and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class UpstreamHTTPError(Exception):
+    """Non-success response from the upstream API"""
+
+    def __init__(self, status_code: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"OpenRouter API error: {status_code} - {body}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRYABLE_STATUS_CODES
+
+    @property
+    def throttled(self) -> bool:
+        """Rate limited or told to come back later: says nothing about the model's health"""
+        return self.status_code == 429 or self.retry_after is not None
+
+class UpstreamBusyError(Exception):
+    """The outbound wait queue is full; callers should retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Recipe generation is at capacity, please retry shortly")
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # The lock keeps waiters first-come, first-served
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class UpstreamScheduler:
+    """
+    Admission control for outbound OpenRouter calls.
+
+    Calls run under a global concurrency cap and a token-bucket rate limit.
+    At most `max_queue` callers may wait for a slot; beyond that `slot()`
+    raises UpstreamBusyError so the API can answer 503 with Retry-After
+    instead of piling up requests. `run()` adds jittered exponential retries
+    that honour the upstream's Retry-After; a Retry-After longer than
+    `retry_max_delay` is passed on to the caller as UpstreamBusyError.
+
+    The OPENROUTER_* limits are for the whole server: under SERVER_WORKERS
+    processes each process's scheduler enforces its share of them.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        retry_max_delay: Optional[float] = None
+    ):
+        workers = max(int(os.getenv("SERVER_WORKERS", "1")), 1)
+        self.max_concurrency = max_concurrency or max(int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "16")) // workers, 1)
+        rate = rate_per_second if rate_per_second is not None else float(os.getenv("OPENROUTER_RATE_LIMIT", "10")) / workers
+        burst = burst if burst is not None else max(float(os.getenv("OPENROUTER_RATE_BURST", "20")) / workers, 1.0)
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("OPENROUTER_MAX_QUEUE", "100"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OPENROUTER_MAX_RETRIES", "3"))
+        self.retry_base_delay = retry_base_delay if retry_base_delay is not None else float(os.getenv("OPENROUTER_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = retry_max_delay if retry_max_delay is not None else float(os.getenv("OPENROUTER_RETRY_MAX_DELAY", "10"))
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self.waiting = 0
+        self.active = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one upstream slot for the duration of the block"""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise UpstreamBusyError(self._estimated_wait())
+
+        self.waiting += 1
+        acquired = False
+        try:
+            await self._semaphore.acquire()
+            acquired = True
+            await self._bucket.acquire()
+        except BaseException:
+            if acquired:
+                self._semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call` in a slot, retrying transient failures; slots are released while backing off"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot():
+                    return await call()
+            except UpstreamHTTPError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                if e.retry_after is not None and e.retry_after > self.retry_max_delay:
+                    # Longer than is worth holding a request for: the client should come back later
+                    raise UpstreamBusyError(math.ceil(e.retry_after)) from e
+                delay = self._backoff(attempt)
+                if e.retry_after is not None:
+                    # Jitter on top, so callers throttled by the same response do not retry in lockstep
+                    delay += e.retry_after
+            except httpx.ReadTimeout:
+                raise  # a model that is too slow will not get faster; let the caller fail over
+            except httpx.TransportError:  # connection errors and connect timeouts
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _estimated_wait(self) -> float:
+        """Rough time for the current queue to drain, used as the Retry-After hint"""
+        rate = self._bucket.rate or self.max_concurrency
+        return float(max(1, math.ceil(self.waiting / rate)))
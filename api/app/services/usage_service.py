@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import RecipeAnalysis
+from app.schemas import UsageAggregate
+
+# Columns a usage summary can be grouped by: query value -> RecipeAnalysis attribute
+USAGE_GROUPS = {"model": "model", "prompt_variant": "prompt_variant"}
+
+@dataclass
+class CompletionUsage:
+    """Token usage, cost and latency of one OpenRouter completion"""
+    model: Optional[str] = None
+    prompt_variant: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+    cost: Optional[float] = None  # USD, as reported by OpenRouter
+    latency_ms: Optional[float] = None
+
+    def update(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Fill in the counts from a response's `usage` block; missing keys are left alone"""
+        if not isinstance(usage, dict):
+            return
+        for name in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if isinstance(usage.get(name), (int, float)):
+                setattr(self, name, int(usage[name]))
+        if isinstance(usage.get("cost"), (int, float)):
+            self.cost = float(usage["cost"])
+        if self.total_tokens is None and self.prompt_tokens is not None and self.completion_tokens is not None:
+            self.total_tokens = self.prompt_tokens + self.completion_tokens
+
+class UsageService:
+    """SQL-side aggregation over the usage recorded with each analysis"""
+
+    async def get_summary(
+        self,
+        db: AsyncSession,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        model: Optional[str] = None,
+        group_by: Optional[str] = None
+    ) -> List[UsageAggregate]:
+        """Token, cost and latency totals and averages per analysis, computed in one query"""
+
+        columns = [
+            func.count(RecipeAnalysis.id),
+            func.sum(RecipeAnalysis.prompt_tokens),
+            func.sum(RecipeAnalysis.completion_tokens),
+            func.avg(RecipeAnalysis.prompt_tokens),
+            func.avg(RecipeAnalysis.completion_tokens),
+            func.sum(RecipeAnalysis.cost),
+            func.avg(RecipeAnalysis.cost),
+            func.avg(RecipeAnalysis.upstream_latency_ms),
+            func.min(RecipeAnalysis.upstream_latency_ms),
+            func.max(RecipeAnalysis.upstream_latency_ms),
+        ]
+
+        # Analyses stored before usage was recorded carry no latency
+        filters = [RecipeAnalysis.upstream_latency_ms.isnot(None)]
+        if start is not None:
+            filters.append(RecipeAnalysis.created_at >= start)
+        if end is not None:
+            filters.append(RecipeAnalysis.created_at < end)
+        if model:
+            filters.append(RecipeAnalysis.model == model)
+
+        if group_by:
+            group_column = getattr(RecipeAnalysis, USAGE_GROUPS[group_by])
+            stmt = (
+                select(group_column, *columns)
+                .where(*filters)
+                .group_by(group_column)
+                .order_by(group_column)
+            )
+            result = await db.execute(stmt)
+            return [self._to_aggregate(row[1:], **{self._group_field(group_by): row[0]}) for row in result.all()]
+
+        result = await db.execute(select(*columns).where(*filters))
+        return [self._to_aggregate(result.one(), model=model)]
+
+    @staticmethod
+    def _group_field(group_by: str) -> str:
+        return "model" if group_by == "model" else "promptVariant"
+
+    @staticmethod
+    def _to_aggregate(row, **group) -> UsageAggregate:
+        def rounded(value: Optional[float], digits: int = 2) -> Optional[float]:
+            return round(value, digits) if value is not None else None
+
+        (count, prompt_tokens, completion_tokens, avg_prompt, avg_completion,
+         cost, avg_cost, avg_latency, min_latency, max_latency) = row
+        return UsageAggregate(
+            analysisCount=count,
+            promptTokens=prompt_tokens or 0,
+            completionTokens=completion_tokens or 0,
+            avgPromptTokens=rounded(avg_prompt),
+            avgCompletionTokens=rounded(avg_completion),
+            totalCost=rounded(cost, 6),
+            avgCost=rounded(avg_cost, 6),
+            avgLatencyMs=rounded(avg_latency),
+            minLatencyMs=rounded(min_latency),
+            maxLatencyMs=rounded(max_latency),
+            **group
+        )
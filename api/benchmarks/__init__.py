@@ -0,0 +1 @@
+# Offline benchmarks; run from the api/ directory, e.g. `python -m benchmarks.bench_write_path`
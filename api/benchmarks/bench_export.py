@@ -0,0 +1,105 @@
+"""
+Streaming export throughput and memory on a large database.
+
+Seeds a temporary SQLite file with N analyses (3 recipes each), then drains
+ExportService for each format, with and without gzip, and reports recipes
+per second and output size. Peak Python memory is measured in a separate,
+traced NDJSON run (tracemalloc slows everything down; RSS would mostly show
+SQLite's mmap and page cache). For comparison, a slice of the analyses is
+also loaded the way history does it: ORM objects with joined recipes,
+converted to Pydantic models:
+
+    python -m benchmarks.bench_export --analyses 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import joinedload
+
+from app.database import create_database_engine, init_database
+from app.models import RecipeAnalysis
+from app.schemas import RecipeAnalysisResponse
+from app.services.export_service import ExportService
+from app.services.recipe_service import RecipeService
+from benchmarks.bench_history import seed
+
+async def drain_export(session_factory, export_format: str, gzip: bool, batch_size: int) -> int:
+    service = ExportService(session_factory, batch_size=batch_size)
+    size = 0
+    async for chunk in service.export(export_format, gzip=gzip):
+        size += len(chunk)
+    return size
+
+async def orm_load(engine, limit: int) -> int:
+    """The history path for `limit` analyses, all held in memory at once"""
+    async with AsyncSession(engine) as db:
+        result = await db.execute(select(RecipeAnalysis).options(joinedload(RecipeAnalysis.recipes)).limit(limit))
+        analyses = result.unique().scalars().all()
+        history = [
+            RecipeAnalysisResponse(recipes=[RecipeService._to_recipe(recipe) for recipe in analysis.recipes])
+            for analysis in analyses
+        ]
+    return len(history)
+
+async def peak_python_mb(coroutine) -> float:
+    tracemalloc.start()
+    try:
+        await coroutine
+        return round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+    finally:
+        tracemalloc.stop()
+
+async def run(analyses: int, batch_size: int, orm_limit: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "export.db")
+    engine = create_database_engine(f"sqlite+aiosqlite:///{path}")
+    await init_database(engine)
+
+    seed_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        pool.submit(seed, path, analyses).result()
+    print(f"seeded {analyses} analyses / {analyses * 3} recipes in {time.perf_counter() - seed_start:.1f}s")
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    report = {"analyses": analyses, "recipes": analyses * 3, "batch_size": batch_size}
+    for export_format in ("ndjson", "csv"):
+        for gzip in (False, True):
+            start = time.perf_counter()
+            size = await drain_export(session_factory, export_format, gzip, batch_size)
+            elapsed = time.perf_counter() - start
+            report[f"{export_format}{'_gzip' if gzip else ''}"] = {
+                "seconds": round(elapsed, 2),
+                "mb": round(size / 1e6, 1),
+                "recipes_per_second": round(analyses * 3 / elapsed)
+            }
+    report["ndjson_peak_python_mb"] = await peak_python_mb(drain_export(session_factory, "ndjson", True, batch_size))
+
+    orm_limit = min(orm_limit, analyses)
+    start = time.perf_counter()
+    await orm_load(engine, orm_limit)
+    report["orm_load"] = {
+        "analyses": orm_limit,
+        "seconds": round(time.perf_counter() - start, 2),
+        "peak_python_mb": await peak_python_mb(orm_load(engine, orm_limit))
+    }
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--orm-limit", type=int, default=20000, help="Analyses loaded through the ORM for comparison")
+    args = parser.parse_args()
+    asyncio.run(run(args.analyses, args.batch_size, args.orm_limit))
+
+if __name__ == "__main__":
+    main()
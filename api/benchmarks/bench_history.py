@@ -0,0 +1,118 @@
+"""
+Recipe history latency on a large database, with and without the
+history indexes and SQLite connection pragmas.
+
+Seeds a temporary SQLite file with N analyses (3 recipes each), then times
+RecipeService.get_recipe_history for the first page and for a page deep in
+the history (reached through its keyset cursor):
+
+    python -m benchmarks.bench_history --analyses 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.database import create_database_engine, init_database
+from app.services.recipe_service import RecipeService, encode_history_cursor
+
+INDEXES = ("ix_recipe_analyses_created_at_id", "ix_generated_recipes_analysis_id")
+
+def seed(path: str, analyses: int) -> list:
+    """Bulk-insert synthetic analyses; returns (created_at, id) of every analysis"""
+    conn = sqlite3.connect(path)
+    start = datetime(2025, 1, 1)
+    keys = []
+    analysis_rows = []
+    recipe_rows = []
+    for i in range(analyses):
+        analysis_id = str(uuid.uuid4())
+        created_at = start + timedelta(seconds=i * 7)
+        keys.append((created_at, analysis_id))
+        analysis_rows.append((analysis_id, json.dumps(["chicken", "rice", f"item {i % 500}"]), created_at.isoformat(" ")))
+        for j in range(3):
+            recipe_rows.append((
+                str(uuid.uuid4()), analysis_id, f"Recipe {i}-{j}",
+                json.dumps(["chicken", "rice", "soy sauce"]), json.dumps(["Step 1", "Step 2"]),
+                25, 4, 350, 18, 45, 12, 6, 4, created_at.isoformat(" ")
+            ))
+    conn.executemany("INSERT INTO recipe_analyses (id, ingredients, created_at) VALUES (?, ?, ?)", analysis_rows)
+    conn.executemany(
+        "INSERT INTO generated_recipes (id, analysis_id, title, ingredients, instructions, prep_time, servings, "
+        "calories, protein, carbs, fat, fiber, sugar, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        recipe_rows
+    )
+    conn.commit()
+    conn.close()
+    return sorted(keys, reverse=True)
+
+async def time_history(engine, cursor, repeat: int) -> float:
+    """Median milliseconds for one 50-entry history page"""
+    service = RecipeService(openrouter_service=None)
+    samples = []
+    for _ in range(repeat):
+        async with AsyncSession(engine) as db:
+            start = time.perf_counter()
+            await service.get_recipe_history(db, limit=50, cursor=cursor)
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def run(analyses: int, repeat: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    url = f"sqlite+aiosqlite:///{path}"
+
+    tuned = create_database_engine(url)
+    await init_database(tuned)
+    await tuned.dispose()
+
+    seed_start = time.perf_counter()
+    keys = seed(path, analyses)
+    print(f"seeded {analyses} analyses / {analyses * 3} recipes in {time.perf_counter() - seed_start:.1f}s")
+
+    deep_created_at, deep_id = keys[len(keys) // 2]
+    deep_cursor = encode_history_cursor(deep_created_at, deep_id)
+
+    # Baseline: no history indexes, bare engine defaults (NullPool, no pragmas)
+    conn = sqlite3.connect(path)
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    conn.close()
+
+    bare = create_async_engine(url)
+    results = {
+        "before_first_page_ms": await time_history(bare, None, repeat),
+        "before_deep_page_ms": await time_history(bare, deep_cursor, repeat),
+    }
+    await bare.dispose()
+
+    tuned = create_database_engine(url)
+    await init_database(tuned)  # recreates the indexes
+    async with tuned.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+    results.update({
+        "after_first_page_ms": await time_history(tuned, None, repeat),
+        "after_deep_page_ms": await time_history(tuned, deep_cursor, repeat),
+    })
+    await tuned.dispose()
+
+    print(json.dumps({name: round(value, 2) for name, value in results.items()}, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.analyses, args.repeat))
+
+if __name__ == "__main__":
+    main()
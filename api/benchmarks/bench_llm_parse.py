@@ -0,0 +1,119 @@
+"""
+Recipe extraction from raw LLM completions, before and after the tolerant
+single-pass parser.
+
+before: the legacy flow - slice from the first "{" to the last "}", json.loads,
+        retry after collapsing all whitespace, then build NutritionalInfo and
+        Recipe separately for each recipe.
+after:  app.services.llm_json.parse_recipes - strip any code fence and try a
+        plain json.loads; only malformed output goes through the tolerant
+        scanner that drops trailing commas and salvages complete objects.
+        Then one validation call for the whole list through a cached
+        TypeAdapter.
+
+Runs over the corpus in benchmarks/data/llm_outputs.json and reports, per
+parser, the share of expected recipes recovered and microseconds per parse:
+
+    python -m benchmarks.bench_llm_parse --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from typing import List
+
+from app.schemas import NutritionalInfo, Recipe
+from app.services.llm_json import parse_recipes
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "llm_outputs.json")
+
+def legacy_parse(content: str) -> List[Recipe]:
+    """The parsing previously inlined in OpenRouterService.generate_recipes"""
+    content = content.strip()
+    if not content.startswith('{'):
+        json_start = content.find('{')
+        json_end = content.rfind('}') + 1
+        if json_start != -1 and json_end > json_start:
+            content = content[json_start:json_end]
+    try:
+        recipes_data = json.loads(content)
+    except json.JSONDecodeError:
+        content = content.replace('\n', ' ').replace('\t', ' ')
+        content = ' '.join(content.split())
+        recipes_data = json.loads(content)
+
+    recipes = []
+    for recipe_data in recipes_data.get("recipes", []):
+        recipe_data["id"] = str(uuid.uuid4())
+        try:
+            nutrition_data = recipe_data.get("nutrition", recipe_data.get("nutritionalInfo", {}))
+            nutritional_info = NutritionalInfo(**nutrition_data)
+            recipes.append(Recipe(
+                id=recipe_data["id"],
+                name=recipe_data.get("name", recipe_data.get("title", "Unnamed Recipe")),
+                ingredients=recipe_data["ingredients"],
+                instructions=recipe_data["instructions"],
+                cookingTime=recipe_data.get("cookingTime", f"{recipe_data.get('prepTime', 30)} minutes"),
+                difficulty=recipe_data.get("difficulty", "Medium"),
+                nutrition=nutritional_info,
+                title=recipe_data.get("title", recipe_data.get("name")),
+                nutritionalInfo=nutritional_info,
+                prepTime=recipe_data.get("prepTime"),
+                servings=recipe_data.get("servings", 4)
+            ))
+        except Exception:
+            continue
+    return recipes
+
+def recovered(parse, content: str) -> int:
+    try:
+        return len(parse(content))
+    except Exception:
+        return 0
+
+def time_parse(parse, content: str, repeat: int) -> float:
+    """Mean microseconds per call; failures are timed too, as production pays for them"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parse(content)
+        except Exception:
+            pass
+    return (time.perf_counter() - started) / repeat * 1e6
+
+def run(repeat: int) -> None:
+    with open(CORPUS_PATH) as corpus:
+        cases = json.load(corpus)["cases"]
+
+    parsers = {"before": legacy_parse, "after": parse_recipes}
+    expected = sum(case["expected"] for case in cases)
+    report = {"cases": {}}
+    totals = {name: {"recovered": 0, "us": 0.0} for name in parsers}
+
+    for case in cases:
+        row = {"expected": case["expected"]}
+        for name, parse in parsers.items():
+            count = recovered(parse, case["content"])
+            micros = time_parse(parse, case["content"], repeat)
+            row[f"{name}_recipes"] = count
+            row[f"{name}_us"] = round(micros, 1)
+            totals[name]["recovered"] += min(count, case["expected"])
+            totals[name]["us"] += micros
+        report["cases"][case["name"]] = row
+
+    for name, total in totals.items():
+        report[f"{name}_success_rate"] = round(total["recovered"] / expected, 3)
+        report[f"{name}_mean_us"] = round(total["us"] / len(cases), 1)
+
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Payload size and encode time of a 50-entry /api/recipe-history response,
+full vs. lean (`?fields=lean`), uncompressed and with each available
+Content-Encoding.
+
+full: what FastAPI does for the default response - jsonable_encoder over
+      the response models, then json.dumps.
+lean: the lean path - one TypeAdapter.dump_json call without the legacy
+      title/nutritionalInfo/prepTime duplicates.
+
+Compression uses CompressionMiddleware's default settings:
+
+    python -m benchmarks.bench_payload --entries 50
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app.compression import CompressionMiddleware, available_encodings
+from app.routers.recipes import _HISTORY_ADAPTER
+from app.schemas import LEGACY_RECIPE_FIELDS, NutritionalInfo, Recipe, RecipeAnalysisResponse
+
+def make_history(entries: int) -> list:
+    """History entries shaped like stored analyses: 3 recipes each, legacy fields filled in"""
+    start = datetime(2025, 1, 1)
+    history = []
+    for i in range(entries):
+        recipes = []
+        for n in range(3):
+            nutrition = NutritionalInfo(calories=420 + n, protein="28g", carbs="46g", fat="14g", fiber="6g", sugar="5g")
+            name = f"Garlic Chicken and Vegetable Stir Fry {i}-{n}"
+            recipes.append(Recipe(
+                id=str(uuid.uuid4()),
+                name=name,
+                ingredients=["chicken breast", "broccoli", "bell pepper", "garlic", "soy sauce", "rice", "sesame oil"],
+                instructions=[
+                    "Cook the rice according to the package instructions.",
+                    "Slice the chicken into thin strips and season with salt and pepper.",
+                    "Stir-fry the chicken in sesame oil until golden, about 6 minutes.",
+                    "Add the vegetables and garlic and cook for 4 more minutes.",
+                    "Toss with soy sauce and serve over the rice.",
+                ],
+                cookingTime="30 minutes",
+                difficulty="Easy",
+                nutrition=nutrition,
+                title=name,
+                nutritionalInfo=nutrition,
+                prepTime=30,
+                servings=4
+            ))
+        history.append(RecipeAnalysisResponse(
+            recipes=recipes,
+            message=f"Analysis from {(start + timedelta(hours=i)).isoformat()}"
+        ))
+    return history
+
+def timed(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+def run(entries: int, repeat: int) -> None:
+    history = make_history(entries)
+    lean_exclude = {"__all__": {"recipes": {"__all__": LEGACY_RECIPE_FIELDS}}}
+    bodies = {
+        "full": lambda: json.dumps(jsonable_encoder(history)).encode(),
+        "lean": lambda: _HISTORY_ADAPTER.dump_json(history, exclude=lean_exclude),
+    }
+    compressor = CompressionMiddleware(app=None)
+
+    report = {}
+    for name, encode in bodies.items():
+        body, encode_ms = timed(encode, repeat)
+        report[name] = {"identity": {"bytes": len(body), "encode_ms": round(encode_ms, 3)}}
+        for encoding in available_encodings():
+            compressed, compress_ms = timed(lambda: compressor._compress(body, encoding), repeat)
+            report[name][encoding] = {
+                "bytes": len(compressed),
+                "encode_ms": round(encode_ms + compress_ms, 3),
+            }
+
+    full_bytes = report["full"]["identity"]["bytes"]
+    report["lean_size_reduction"] = round(1 - report["lean"]["identity"]["bytes"] / full_bytes, 3)
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.entries, args.repeat)
+
+if __name__ == "__main__":
+    main()
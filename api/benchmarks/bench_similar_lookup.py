@@ -0,0 +1,100 @@
+"""
+Near-duplicate lookup in SimilarAnalysisIndex at scale.
+
+Builds the index from N synthetic ingredient sets (3-7 names drawn from a
+2,000-word vocabulary), compacts it, then times `find` for:
+
+  hit   a stored set plus one extra ingredient ("salt")
+  miss  a random set that was never stored
+
+and the snapshot save and load:
+
+    python -m benchmarks.bench_similar_lookup --analyses 200000
+    python -m benchmarks.bench_similar_lookup --analyses 1000000 --bands 8
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import string
+import tempfile
+import time
+
+from app.services.similar_index import SimilarAnalysisIndex
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    """Letters-only names; normalization strips digits"""
+    return ["".join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(size)]
+
+def time_lookups(index: SimilarAnalysisIndex, queries: list) -> dict:
+    started = time.perf_counter()
+    found = sum(1 for query in queries if index.find(query) is not None)
+    elapsed = time.perf_counter() - started
+    return {
+        "lookup_us": round(elapsed / len(queries) * 1e6, 1),
+        "found_ratio": round(found / len(queries), 4),
+    }
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    words = vocabulary(2000, rng)
+    path = os.path.join(tempfile.mkdtemp(), "similar_index.pkl")
+    index = SimilarAnalysisIndex(bands=args.bands, rows=args.rows, path=path, compact_after=args.analyses + 1)
+
+    started = time.perf_counter()
+    queries = []
+    for i in range(args.analyses):
+        ingredients = rng.sample(words, rng.randint(3, 7))
+        index.add(f"analysis-{i}", ingredients)
+        if len(queries) < args.queries and rng.random() < args.queries / args.analyses * 2:
+            queries.append(ingredients + ["salt"])
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await index.compact()
+    compact_seconds = time.perf_counter() - started
+    gc.collect()
+
+    misses = [rng.sample(words, 5) for _ in range(len(queries))]
+    results = {
+        "analyses": args.analyses,
+        "ingredient_sets": len(index),
+        "bands": args.bands,
+        "rows": args.rows,
+        "build_s": round(build_seconds, 2),
+        "compact_s": round(compact_seconds, 2),
+        "hit": time_lookups(index, queries),
+        "miss": time_lookups(index, misses),
+    }
+
+    started = time.perf_counter()
+    await asyncio.to_thread(index._write_snapshot, index._snapshot_state())
+    results["save_s"] = round(time.perf_counter() - started, 2)
+    results["snapshot_mb"] = round(os.path.getsize(path) / 1e6, 1)
+
+    reloaded = SimilarAnalysisIndex(bands=args.bands, rows=args.rows, path=path)
+    started = time.perf_counter()
+    state = await asyncio.to_thread(reloaded._read_snapshot)
+    results["load_s"] = round(time.perf_counter() - started, 2)
+    for name, value in state.items():
+        setattr(reloaded, name, value)
+    results["reload_matches"] = all(reloaded.find(query) == index.find(query) for query in queries[:100])
+
+    os.remove(path)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrent-request throughput of the analysis write path, before and after
+moving persistence off the LLM call.
+
+before: the legacy flow - add the RecipeAnalysis row and flush() (taking
+        SQLite's write lock), await the LLM, then add recipes and commit.
+after:  await the LLM with no database activity, then hand the result to
+        the AnalysisWriter, which commits batches in the background.
+
+The LLM call is simulated with a sleep, so this runs offline:
+
+    python -m benchmarks.bench_write_path --requests 50 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models import Base, RecipeAnalysis
+from app.schemas import NutritionalInfo, Recipe
+from app.services.analysis_writer import AnalysisWriter, PendingAnalysis, build_analysis_rows
+
+def make_recipes(count: int = 3):
+    nutrition = NutritionalInfo(calories=350, protein="18", carbs="45", fat="12", fiber="6", sugar="4")
+    return [
+        Recipe(
+            id=str(uuid.uuid4()),
+            name=f"Benchmark Recipe {i}",
+            ingredients=["chicken", "rice", "soy sauce"],
+            instructions=["Step 1", "Step 2", "Step 3"],
+            cookingTime="25 minutes",
+            difficulty="Easy",
+            nutrition=nutrition,
+            title=f"Benchmark Recipe {i}",
+            nutritionalInfo=nutrition,
+            servings=4
+        )
+        for i in range(count)
+    ]
+
+async def legacy_request(session_factory, llm_latency: float) -> None:
+    async with session_factory() as db:
+        pending = PendingAnalysis(ingredients=["chicken", "rice"], recipes=[])
+        analysis = RecipeAnalysis(id=pending.id, ingredients=json.dumps(pending.ingredients))
+        db.add(analysis)
+        await db.flush()
+        try:
+            await asyncio.sleep(llm_latency)
+            pending.recipes = make_recipes()
+            db.add_all(build_analysis_rows(pending)[1:])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+async def write_behind_request(writer: AnalysisWriter, llm_latency: float) -> None:
+    await asyncio.sleep(llm_latency)
+    await writer.submit(PendingAnalysis(ingredients=["chicken", "rice"], recipes=make_recipes()))
+
+async def run(mode: str, requests: int, llm_latency: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    writer = None
+    if mode == "after":
+        writer = AnalysisWriter(session_factory)
+        writer.start()
+
+    async def one():
+        start = time.perf_counter()
+        if writer is None:
+            await legacy_request(session_factory, llm_latency)
+        else:
+            await write_behind_request(writer, llm_latency)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(requests)], return_exceptions=True)
+    if writer is not None:
+        await writer.stop()
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+
+    latencies = sorted(r for r in results if isinstance(r, float))
+    return {
+        "mode": mode,
+        "ok": len(latencies),
+        "errors": requests - len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+        "max_s": round(latencies[-1], 2) if latencies else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM latency in seconds")
+    args = parser.parse_args()
+
+    for mode in ("before", "after"):
+        print(json.dumps(asyncio.run(run(mode, args.requests, args.llm_latency))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Offline load test: the FastAPI app in-process against a local stub OpenRouter.
+
+Boots the stub chat-completions server on 127.0.0.1 (see stub_openrouter.py),
+points the app at it with a temporary SQLite database and similar-set index
+snapshot (both removed afterwards), then drives:
+
+  analyze  POST /api/analyze-recipes with distinct ingredient sets
+           (a share of them repeated, to exercise the cache)
+  history  GET /api/recipe-history?limit=20 over the analyses just stored
+
+at a fixed concurrency, reporting throughput and p50/p95/p99 latency.
+Needs no network access or API key:
+
+    python -m benchmarks.load_test --requests 400 --concurrency 32 --latency 0.3
+    python -m benchmarks.load_test --save-baseline   # record a new baseline
+
+Without --save-baseline the results are compared to the baseline file and the
+command exits with status 1 if throughput or p95 regressed beyond --tolerance.
+Only compare runs made with the same options on the same machine.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.stub_openrouter import PAYLOAD_SHAPES, StubConfig, StubServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "load_test.json")
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def ingredient_word(n: int) -> str:
+    """Distinct letters-only ingredient names; the ingredient index ignores digits"""
+    letters = []
+    n += 1
+    while n:
+        n, remainder = divmod(n - 1, 26)
+        letters.append(string.ascii_lowercase[remainder])
+    return "stub" + "".join(reversed(letters))
+
+async def drive(name: str, total: int, concurrency: int, call: Callable[[int], "asyncio.Future"]) -> Dict[str, float]:
+    """Run `total` calls with at most `concurrency` in flight; summarize latency and throughput"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                outcome = await call(index)
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[outcome] = statuses.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "outcomes": dict(sorted(statuses.items())),
+    }
+
+async def run(args) -> dict:
+    import httpx
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.shape, seed=args.seed)
+    # Everything the app writes to disk goes to the temporary directory, removed afterwards
+    with StubServer(config) as stub, tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            "OPENROUTER_API_KEY": "offline-benchmark",
+            "OPENROUTER_API_URL": stub.url,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'load.db')}",
+            "RECIPE_SIMILAR_INDEX_PATH": os.path.join(workdir, "similar_index.pkl"),
+        })
+        # Measure the app, not the production outbound rate limit, unless asked to
+        os.environ.setdefault("OPENROUTER_RATE_LIMIT", "0")
+        os.environ.setdefault("OPENROUTER_MAX_CONCURRENCY", str(max(args.concurrency, 16)))
+
+        import main
+
+        rng = random.Random(args.seed)
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+
+                async def analyze(index: int) -> str:
+                    # Repeat an earlier ingredient set for a share of requests
+                    if index and rng.random() < args.repeat_ratio:
+                        index = rng.randrange(index)
+                    ingredients = [ingredient_word(index * 3 + k) for k in range(3)]
+                    response = await client.post("/api/analyze-recipes", json={"ingredients": ingredients})
+                    if response.status_code == 200 and "fallback" in response.json().get("message", ""):
+                        return "fallback"
+                    return str(response.status_code)
+
+                async def history(index: int) -> str:
+                    response = await client.get("/api/recipe-history", params={"limit": 20})
+                    return str(response.status_code)
+
+                results = {"analyze": await drive("analyze", args.requests, args.concurrency, analyze)}
+                writer = main.app.state.analysis_writer
+                if writer is not None:
+                    await writer.flush()
+                results["history"] = await drive("history", args.requests, args.concurrency, history)
+
+        results["stub"] = {"calls": config.calls, "errors": config.errors}
+        results["options"] = {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "shape": args.shape,
+            "repeat_ratio": args.repeat_ratio,
+        }
+        return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (a fraction) in throughput or p95 latency"""
+    regressions = []
+    for scenario in ("analyze", "history"):
+        current, previous = results[scenario], baseline.get(scenario)
+        if not previous:
+            continue
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{scenario} throughput {current['throughput_rps']} rps < baseline {previous['throughput_rps']} rps")
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario} p95 {current['p95_ms']} ms > baseline {previous['p95_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub mean seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--shape", choices=PAYLOAD_SHAPES, default="clean")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Share of analyze requests repeating an earlier ingredient set")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("options") != results["options"]:
+        print("Baseline was recorded with different options; not comparing")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
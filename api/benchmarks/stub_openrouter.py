@@ -0,0 +1,166 @@
+"""
+Local stand-in for the OpenRouter chat-completions API, for offline benchmarks.
+
+Answers `POST /chat/completions` after a configurable latency, fails a
+configurable share of calls, and shapes the completion text like real model
+output (clean JSON, fenced, with prose, trailing commas or truncated).
+Streaming requests get server-sent events split into small deltas.
+
+    python -m benchmarks.stub_openrouter --port 8099 --latency 0.5 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PAYLOAD_SHAPES = ("clean", "fenced", "prose", "trailing_commas", "truncated")
+
+def make_completion_text(shape: str, recipes: int = 3) -> str:
+    """Completion text with `recipes` recipes in the given shape"""
+    items = [
+        {
+            "id": f"recipe_{n + 1}",
+            "name": f"Stub Skillet Dinner {n + 1}",
+            "ingredients": ["chicken breast", "rice", "broccoli", "garlic", "soy sauce"],
+            "instructions": [
+                "Step 1: Cook the rice",
+                "Step 2: Sear the chicken until golden",
+                "Step 3: Add broccoli and garlic, then toss with soy sauce",
+            ],
+            "cookingTime": "25 minutes",
+            "difficulty": ("Easy", "Medium", "Hard")[n % 3],
+            "servings": 4,
+            "nutrition": {"calories": 420 + n, "protein": "32g", "carbs": "48g", "fat": "12g", "fiber": "4g", "sugar": "3g"},
+        }
+        for n in range(recipes)
+    ]
+    text = json.dumps({"recipes": items}, indent=2)
+    if shape == "fenced":
+        return f"```json\n{text}\n```"
+    if shape == "prose":
+        return f"Here are some recipes using your ingredients:\n\n{text}\n\nEnjoy!"
+    if shape == "trailing_commas":
+        return text.replace('"sugar": "3g"', '"sugar": "3g",')
+    if shape == "truncated":
+        return text[:int(len(text) * 0.8)]
+    return text
+
+class StubConfig:
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        shape: str = "clean",
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.shape = shape
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def delay(self) -> float:
+        """Latency with multiplicative jitter, so there is a realistic tail"""
+        return max(0.0, self.latency * (1 + self.random.uniform(-self.jitter, self.jitter * 3)))
+
+def make_usage(payload: dict, text: str) -> dict:
+    """A usage block like OpenRouter's, estimating ~4 characters per token"""
+    prompt_tokens = sum(len(message.get("content", "")) for message in payload.get("messages", [])) // 4
+    completion_tokens = len(text) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cost": round((prompt_tokens * 0.25 + completion_tokens * 1.25) / 1_000_000, 8),
+    }
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="OpenRouter stub")
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        config.calls += 1
+
+        if config.random.random() < config.error_rate:
+            config.errors += 1
+            await asyncio.sleep(config.delay() / 4)
+            headers = {"Retry-After": "0"} if config.error_status == 429 else None
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=config.error_status, headers=headers)
+
+        text = make_completion_text(config.shape)
+        if not payload.get("stream"):
+            await asyncio.sleep(config.delay())
+            return {
+                "model": payload.get("model"),
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": make_usage(payload, text),
+            }
+
+        async def events():
+            pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+            per_piece = config.delay() / max(len(pieces), 1)
+            for piece in pieces:
+                await asyncio.sleep(per_piece)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n"
+            yield f"data: {json.dumps({'choices': [{'delta': {}}], 'usage': make_usage(payload, text)})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+class StubServer:
+    """Run the stub on 127.0.0.1 in a background thread with its own event loop"""
+
+    def __init__(self, config: StubConfig, port: int = 0):
+        self.config = config
+        uvicorn_config = uvicorn.Config(
+            create_stub_app(config), host="127.0.0.1", port=port, log_level="warning", access_log=False
+        )
+        self.server = uvicorn.Server(uvicorn_config)
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--shape", choices=PAYLOAD_SHAPES, default="clean")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.shape)
+    uvicorn.run(create_stub_app(config), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,142 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from app.database import engine
-from app.models import Base
-from app.routers import recipes, health
-
-# Load environment variables
+# Load environment variables before app modules read their configuration
 load_dotenv()
 
+from app.compression import CompressionMiddleware
+from app.database import AsyncSessionLocal, engine, init_database
+from app.metrics import MetricsMiddleware
+from app.routers import recipes, health, export, jobs, nutrition, stats, usage
+from app.schemas import RecipeAnalysisRequest
+from app.services.analysis_jobs import AnalysisJobQueue
+from app.services.analysis_writer import AnalysisWriter
+from app.services.ingredient_index import IngredientIndex
+from app.services.model_pool import ModelPool
+from app.services.openrouter_service import OpenRouterService, create_http_client
+from app.services.recipe_cache import RecipeCache
+from app.services.recipe_service import RecipeService
+from app.services.similar_index import SimilarAnalysisIndex
+from app.services.single_flight import SingleFlight
+from app.services.stats_service import StatsRecorder
+from app.services.upstream_scheduler import UpstreamScheduler
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
+    # Create database tables and indexes
+    await init_database()
+    
+    # Shared, pooled HTTP client so OpenRouter calls reuse TCP/TLS connections
+    app.state.http_client = create_http_client()
+    app.state.recipe_cache = RecipeCache()
+    app.state.single_flight = SingleFlight()
+    # Caps, rate-limits and retries outbound OpenRouter calls across all requests
+    app.state.upstream_scheduler = UpstreamScheduler()
+    # Ordered models with per-model circuit breakers and latency windows for hedging
+    app.state.model_pool = ModelPool()
+    
+    # Each worker process has its own engine, caches and index; see start.py --production
+    workers = max(int(os.getenv("SERVER_WORKERS", "1")), 1)
+    refresh_seconds = float(os.getenv("RECIPE_INDEX_REFRESH_SECONDS", "60")) if workers > 1 else 0
+    
+    # Inverted index over stored recipes, warmed in the background. With several
+    # worker processes it is also refreshed with recipes the other workers stored.
+    app.state.ingredient_index = None
+    index_loader = None
+    if os.getenv("RECIPE_RETRIEVAL_ENABLED", "True").lower() == "true":
+        app.state.ingredient_index = IngredientIndex()
+        index_loader = asyncio.create_task(
+            app.state.ingredient_index.load_and_refresh(AsyncSessionLocal, refresh_seconds)
+        )
+    
+    # MinHash/LSH index of past ingredient sets, loaded from its snapshot and
+    # caught up from the database in the background, then refreshed like the
+    # ingredient index
+    app.state.similar_index = None
+    similar_loader = None
+    if os.getenv("RECIPE_SIMILAR_ENABLED", "True").lower() == "true":
+        app.state.similar_index = SimilarAnalysisIndex()
+        similar_loader = asyncio.create_task(app.state.similar_index.load_and_catch_up(
+            AsyncSessionLocal, float(os.getenv("RECIPE_SIMILAR_SAVE_SECONDS", "300")), refresh_seconds
+        ))
+    
+    def index_analysis(pending):
+        if app.state.ingredient_index is not None:
+            app.state.ingredient_index.add_recipes(pending.recipes)
+        if app.state.similar_index is not None:
+            app.state.similar_index.add(pending.id, pending.ingredients)
+    
+    # Write-behind queue: analyses are committed in batches off the request path
+    app.state.analysis_writer = None
+    if os.getenv("RECIPE_WRITE_BEHIND", "True").lower() == "true":
+        app.state.analysis_writer = AnalysisWriter(on_written=index_analysis)
+        app.state.analysis_writer.start()
+    
+    # Counts of served analyses and requested ingredients, flushed to the /api/stats rollups
+    app.state.stats_recorder = None
+    if os.getenv("STATS_ENABLED", "True").lower() == "true":
+        app.state.stats_recorder = StatsRecorder()
+        app.state.stats_recorder.start()
+    
+    # Submit/poll analysis jobs, drained by in-process workers
+    app.state.analysis_jobs = None
+    if os.getenv("ANALYSIS_JOBS_ENABLED", "True").lower() == "true":
+        async def run_analysis(ingredients, db):
+            state = app.state
+            service = RecipeService(
+                OpenRouterService(state.http_client, state.upstream_scheduler, state.model_pool),
+                state.recipe_cache, state.single_flight, state.analysis_writer, state.ingredient_index,
+                state.similar_index, state.stats_recorder
+            )
+            # A failed LLM call fails the attempt, so the job is retried rather than storing fallbacks
+            return await service.analyze_ingredients(RecipeAnalysisRequest(ingredients=ingredients), db, fallback=False)
+        
+        app.state.analysis_jobs = AnalysisJobQueue(run_analysis)
+        app.state.analysis_jobs.start()
+    try:
+        yield
+    finally:
+        # The server has stopped accepting requests; let in-flight LLM calls
+        # (running jobs, and shared calls whose callers went away) finish
+        drain_seconds = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "15"))
+        if app.state.analysis_jobs is not None:
+            await app.state.analysis_jobs.stop(drain_timeout=drain_seconds)
+        try:
+            await asyncio.wait_for(app.state.single_flight.wait_idle(), drain_seconds)
+        except asyncio.TimeoutError:
+            print(f"Abandoned in-flight LLM calls still running after {drain_seconds}s at shutdown")
+        if index_loader is not None:
+            # Awaited, so a load still reading the database finishes unwinding before the engine is disposed
+            index_loader.cancel()
+            try:
+                await index_loader
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Ingredient index loader failed: {e}")
+        if app.state.analysis_writer is not None:
+            await app.state.analysis_writer.stop()
+        if app.state.stats_recorder is not None:
+            await app.state.stats_recorder.stop()
+        if similar_loader is not None:
+            similar_loader.cancel()
+            try:
+                await similar_loader
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Similar-analysis index loader failed: {e}")
+            try:
+                await app.state.similar_index.save()  # after the writer's flush, so it has every analysis
+            except Exception as e:
+                print(f"Failed to save similar-analysis index: {e}")
+            app.state.similar_index.close()
+        await app.state.http_client.aclose()
+        await engine.dispose()
 
 app = FastAPI(
     title="Smart Recipe Analyzer API",
@@ -34,9 +154,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses above RESPONSE_COMPRESSION_MIN_SIZE (brotli when installed, else gzip)
+if os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true":
+    app.add_middleware(CompressionMiddleware)
+
+# Per-handler latency and in-flight requests for /metrics (outermost, so it sees the full response time)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(health.router)
 app.include_router(recipes.router, prefix="/api")
+app.include_router(nutrition.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(usage.router, prefix="/api")
+app.include_router(stats.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
 
 if __name__ == "__main__":
     import uvicorn
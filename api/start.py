@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 """
 Startup script for the Smart Recipe Analyzer API
+
+    python start.py                 # development: single process, auto-reload
+    python start.py --production    # multiple workers, uvloop/httptools, graceful drain
 """
 
+import argparse
+import asyncio
 import os
 import sys
 import subprocess
@@ -23,10 +28,11 @@ def check_requirements():
         print("Please run: pip install -r requirements.txt")
         return False
 
-def check_env():
+def check_env(production=False):
     """Check environment configuration"""
     env_file = Path(".env")
-    if not env_file.exists():
+    # In production the variables usually come from the environment, not a file
+    if not env_file.exists() and not production:
         print("⚠️  .env file not found")
         print("Please copy .env.example to .env and configure your OpenRouter API key")
         return False
@@ -45,8 +51,85 @@ def check_env():
     print("✅ Environment configuration looks good")
     return True
 
+def _installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def run_production(host, port, workers):
+    """
+    Run without reload under several worker processes.
+    
+    Every worker imports main and builds its own database engine and pool,
+    HTTP client, recipe cache, ingredient index and write-behind queue:
+    
+    - SERVER_WORKERS is exported so the upstream scheduler splits the
+      OPENROUTER_* concurrency and rate limits between workers
+    - the recipe cache is per worker, so hit rates drop as workers are added;
+      size RECIPE_CACHE_MAX_BYTES per worker
+    - each worker refreshes its ingredient and similar-set indexes every
+      RECIPE_INDEX_REFRESH_SECONDS with what the others stored; only one
+      worker at a time writes the similar-set snapshot
+    - DB_POOL_SIZE is per worker; SQLite allows one writer at a time, which
+      SQLITE_BUSY_TIMEOUT_MS and the per-worker write-behind batching absorb
+    - analysis jobs are claimed atomically and their leases renewed while
+      they run, so workers never run one twice
+    
+    The schema is upgraded once here, before the workers start, so they do
+    not race each other through the same migrations.
+    """
+    import uvicorn
+    from app.migrations import main as upgrade_database
+    
+    os.environ["SERVER_WORKERS"] = str(workers)
+    asyncio.run(upgrade_database())
+    
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    print(f"🏭 Production mode: {workers} workers, {loop} event loop, {http} HTTP parser")
+    
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        reload=False,
+        # Longer than a load balancer's idle timeout (60s on most), so the
+        # proxy, not the app, closes idle keep-alive connections
+        timeout_keep_alive=int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "75")),
+        backlog=int(os.getenv("SERVER_BACKLOG", "2048")),
+        # On SIGTERM: stop accepting, give in-flight requests (and their LLM
+        # calls) this long, then run the lifespan shutdown, which drains
+        # running jobs for SHUTDOWN_DRAIN_SECONDS and flushes queued writes
+        timeout_graceful_shutdown=int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")),
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("SERVER_ACCESS_LOG", "False").lower() == "true",
+        log_level="info"
+    )
+
 def main():
     """Main startup function"""
+    # .env may also set the SERVER_* defaults below
+    from dotenv import load_dotenv
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description="Start the Smart Recipe Analyzer API")
+    parser.add_argument("--production", action="store_true", help="Run multiple workers without reload")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SERVER_WORKERS", str(min(os.cpu_count() or 1, 4)))),
+        help="Worker processes in production mode"
+    )
+    args = parser.parse_args()
+    
     print("🚀 Starting Smart Recipe Analyzer API...")
     print("-" * 50)
     
@@ -55,12 +138,22 @@ def main():
         sys.exit(1)
     
     # Check environment
-    if not check_env():
+    if not check_env(production=args.production):
+        if args.production:
+            sys.exit(1)
         print("\n💡 API will still start but LLM features may not work without proper configuration")
     
+    if args.production:
+        try:
+            run_production(args.host, args.port, max(args.workers, 1))
+        except Exception as e:
+            print(f"\n❌ Error starting server: {e}")
+            sys.exit(1)
+        return
+    
     print("\n🌟 Starting FastAPI server...")
-    print("📖 API Documentation: http://localhost:8000/docs")
-    print("💚 Health Check: http://localhost:8000/health")
+    print(f"📖 API Documentation: http://localhost:{args.port}/docs")
+    print(f"💚 Health Check: http://localhost:{args.port}/health")
     print("🔄 Press Ctrl+C to stop")
     print("-" * 50)
     
@@ -69,8 +162,8 @@ def main():
         import uvicorn
         uvicorn.run(
             "main:app", 
-            host="0.0.0.0", 
-            port=8000, 
+            host=args.host, 
+            port=args.port, 
             reload=True,
             log_level="info"
         )
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import create_database_engine, init_database
+from app.models import AnalysisJob
+from app.schemas import RecipeAnalysisResponse
+from app.services.analysis_jobs import FAILED, RUNNING, SUCCEEDED, AnalysisJobQueue
+
+async def _session_factory(tmp_path) -> async_sessionmaker:
+    engine = create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    await init_database(engine)
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+async def _wait_for(session_factory, job_id: str, statuses) -> AnalysisJob:
+    for _ in range(200):
+        async with session_factory() as db:
+            job = await db.get(AnalysisJob, job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job stayed {job.status}")
+
+def test_lease_is_renewed_while_a_slow_analysis_runs(tmp_path):
+    calls = []
+
+    async def analyze(ingredients, db):
+        calls.append(ingredients)
+        await asyncio.sleep(1.0)  # several leases long
+        return RecipeAnalysisResponse(recipes=[])
+
+    async def run():
+        session_factory = await _session_factory(tmp_path)
+        queues = [
+            AnalysisJobQueue(analyze, session_factory, workers=1, lease_seconds=0.3, poll_interval=0.05)
+            for _ in range(2)
+        ]
+        async with session_factory() as db:
+            job, _ = await queues[0].submit(db, ["rice"])
+        for queue in queues:
+            queue.start()
+        finished = await _wait_for(session_factory, job.id, {SUCCEEDED, FAILED})
+        for queue in queues:
+            await queue.stop()
+        assert finished.status == SUCCEEDED
+        assert finished.attempts == 1
+        assert calls == [["rice"]]
+    asyncio.run(run())
+
+def test_failed_analysis_is_retried_then_marked_failed(tmp_path):
+    calls = []
+
+    async def analyze(ingredients, db):
+        calls.append(ingredients)
+        raise RuntimeError("OpenRouter API error: 500")
+
+    async def run():
+        session_factory = await _session_factory(tmp_path)
+        queue = AnalysisJobQueue(analyze, session_factory, workers=1, max_attempts=3, poll_interval=0.05)
+        async with session_factory() as db:
+            job, _ = await queue.submit(db, ["rice"])
+        queue.start()
+        finished = await _wait_for(session_factory, job.id, {SUCCEEDED, FAILED})
+        await queue.stop()
+        assert finished.status == FAILED
+        assert "500" in finished.error
+        assert len(calls) == 3
+    asyncio.run(run())
+
+def test_worker_that_lost_its_lease_abandons_the_job(tmp_path):
+    started = asyncio.Event()
+
+    async def analyze(ingredients, db):
+        started.set()
+        await asyncio.sleep(5)
+        return RecipeAnalysisResponse(recipes=[])
+
+    async def run():
+        session_factory = await _session_factory(tmp_path)
+        queue = AnalysisJobQueue(analyze, session_factory, workers=1, lease_seconds=0.3, poll_interval=0.05)
+        async with session_factory() as db:
+            job, _ = await queue.submit(db, ["rice"])
+        queue.start()
+        await started.wait()
+
+        # Another worker reclaims the job, as if this one had stalled past its lease
+        async with session_factory() as db:
+            await db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job.id)
+                .values(attempts=AnalysisJob.attempts + 1, lease_expires_at=datetime.utcnow() + timedelta(hours=1))
+            )
+            await db.commit()
+        await asyncio.sleep(0.5)
+        await queue.stop()
+
+        async with session_factory() as db:
+            job = await db.get(AnalysisJob, job.id)
+        assert job.status == RUNNING and job.attempts == 2
+        assert queue.completed == 0
+    asyncio.run(run())
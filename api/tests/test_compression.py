@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+from app.compression import CompressionMiddleware, negotiate_encoding
+
+def _app() -> Starlette:
+    app = Starlette(routes=[
+        Route("/large", lambda request: PlainTextResponse("x" * 4096)),
+        Route("/small", lambda request: PlainTextResponse("x")),
+        Route("/cookie", lambda request: PlainTextResponse("x" * 4096, headers={"Vary": "Cookie"})),
+        Route("/events", lambda request: Response("data: x\n\n" * 500, media_type="text/event-stream")),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return app
+
+def _get(path: str, accept_encoding: str) -> httpx.Response:
+    async def get() -> httpx.Response:
+        async with httpx.AsyncClient(app=_app(), base_url="http://t") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+    return asyncio.run(get())
+
+def test_compressed_response_varies_on_accept_encoding():
+    response = _get("/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == "x" * 4096
+
+def test_uncompressed_responses_still_vary_on_accept_encoding():
+    # No acceptable encoding, and a body below the minimum size
+    for path, accept_encoding in (("/large", "identity"), ("/small", "gzip")):
+        response = _get(path, accept_encoding)
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+def test_vary_is_merged_with_existing_value():
+    assert _get("/cookie", "gzip").headers["vary"] == "Cookie, Accept-Encoding"
+    assert _get("/cookie", "identity").headers["vary"] == "Cookie, Accept-Encoding"
+
+def test_event_streams_are_left_alone():
+    response = _get("/events", "gzip")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding("gzip;q=0.5, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip, br;q=0", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
@@ -0,0 +1,24 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.database import create_database_engine
+from app.routers import health
+from app.services.model_pool import ModelPool
+
+def test_open_circuits_do_not_fail_readiness(tmp_path, monkeypatch):
+    monkeypatch.setattr(health, "engine", create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'ready.db'}"))
+    app = FastAPI()
+    app.include_router(health.router)
+    app.state.model_pool = ModelPool(models=["a"], failure_threshold=1, reset_timeout=60, hedging=False)
+    app.state.model_pool.record_failure("a")
+
+    async def get() -> httpx.Response:
+        async with httpx.AsyncClient(app=app, base_url="http://t") as client:
+            return await client.get("/health/ready")
+
+    response = asyncio.run(get())
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert response.json()["checks"]["upstream"] == "all model circuits open"
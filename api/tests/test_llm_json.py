@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from app.metrics import LLM_INVALID_RECIPES
+from app.services.llm_json import RecipeStreamParser, extract_recipe_objects, normalize_recipe_data, parse_recipes
+
+def _recipe(name: str) -> dict:
+    return {
+        "name": name,
+        "ingredients": ["200g rice", "2 eggs"],
+        "instructions": ["Cook the rice", "Fry the eggs"],
+        "cookingTime": "20 minutes",
+        "difficulty": "Easy",
+        "servings": 2,
+        "nutrition": {"calories": 400, "protein": "15g", "carbs": "60g"},
+    }
+
+DOCUMENT = json.dumps({"recipes": [_recipe("A"), _recipe("B")]})
+
+@pytest.mark.parametrize("content", [
+    DOCUMENT,
+    f"```json\n{DOCUMENT}\n```",
+    f"```\n{DOCUMENT}",  # fence never closed
+    f"Sure!\n```json\n{DOCUMENT}\n```\nLet me know if you need more.",
+    f"```json {DOCUMENT}```",
+    f"Here are your recipes:\n{DOCUMENT}\nEnjoy!",
+    json.dumps([_recipe("A"), _recipe("B")]),
+])
+def test_extract_recipe_objects(content):
+    assert [recipe["name"] for recipe in extract_recipe_objects(content)] == ["A", "B"]
+
+def test_trailing_commas_are_dropped():
+    content = DOCUMENT.replace('"Fry the eggs"]', '"Fry the eggs",]').replace("]}", ",]}")
+    assert [recipe["name"] for recipe in extract_recipe_objects(content)] == ["A", "B"]
+
+def test_raw_newlines_inside_strings_are_accepted():
+    content = DOCUMENT.replace("Cook the rice", "Cook\nthe rice")
+    assert extract_recipe_objects(content)[0]["instructions"][0] == "Cook\nthe rice"
+
+def test_truncated_output_keeps_completed_recipes():
+    assert [recipe["name"] for recipe in extract_recipe_objects(DOCUMENT[:-40])] == ["A"]
+
+@pytest.mark.parametrize("content", ["", "Sorry, I can't help with that.", '{"recipes": [', "{not json}"])
+def test_no_recipes_in_malformed_output(content):
+    assert extract_recipe_objects(content) == []
+
+def test_stream_parser_emits_each_recipe_once_complete():
+    parser = RecipeStreamParser()
+    completed = []
+    # Chunks split inside strings, escapes and structural tokens
+    for start in range(0, len(DOCUMENT), 7):
+        completed.append([recipe["name"] for recipe in parser.feed(DOCUMENT[start:start + 7])])
+    names = [name for chunk in completed for name in chunk]
+    assert names == ["A", "B"]
+    # The first recipe came out before the document was finished
+    assert next(i for i, chunk in enumerate(completed) if chunk) < len(completed) - 1
+
+def test_stream_parser_handles_escaped_quotes_split_across_chunks():
+    recipe = _recipe('Mom\'s "best" rice')
+    document = json.dumps({"recipes": [recipe]})
+    split = document.index('\\"') + 1
+    parser = RecipeStreamParser()
+    assert parser.feed(document[:split]) == []
+    assert parser.feed(document[split:])[0]["name"] == 'Mom\'s "best" rice'
+
+def test_normalize_maps_legacy_fields_and_numeric_nutrients():
+    data = normalize_recipe_data({
+        "title": "Old", "ingredients": ["rice"], "instructions": ["Cook"], "prepTime": 15,
+        "nutritionalInfo": {"calories": "350 kcal", "protein": 12, "carbs": 40.5},
+    })
+    assert data["name"] == "Old"
+    assert data["cookingTime"] == "15 minutes"
+    assert data["nutrition"] == {"calories": 350, "protein": "12g", "carbs": "40.5g"}
+
+def test_parse_recipes_drops_invalid_recipes():
+    invalid = dict(_recipe("Broken"), instructions=[])
+    content = json.dumps({"recipes": [_recipe("A"), invalid]})
+    dropped = LLM_INVALID_RECIPES.value()
+    assert [recipe.name for recipe in parse_recipes(content)] == ["A"]
+    assert LLM_INVALID_RECIPES.value() == dropped + 1
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.metrics import RUNTIME_EVENTS, RUNTIME_GAUGE, collect_runtime_gauges
+from app.services.model_pool import ModelPool
+from app.services.recipe_cache import RecipeCache
+
+def _collect(**state) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    collect_runtime_gauges(SimpleNamespace(**state), engine)
+
+def test_monotonic_values_are_exported_as_counters():
+    cache = RecipeCache()
+    cache.hits, cache.misses, cache.evictions = 3, 1, 2
+    pool = ModelPool(models=["a"], failure_threshold=1, reset_timeout=60, hedging=False)
+    pool.record_failure("a")
+    pool.hedges = 4
+    _collect(recipe_cache=cache, model_pool=pool)
+
+    assert RUNTIME_EVENTS.value(component="recipe_cache", event="hits") == 3
+    assert RUNTIME_EVENTS.value(component="recipe_cache", event="evictions") == 2
+    assert RUNTIME_EVENTS.value(component="upstream", event="hedges") == 4
+    assert RUNTIME_EVENTS.value(component="model:a", event="circuit_trips") == 1
+    assert RUNTIME_GAUGE.value(component="recipe_cache", stat="hit_ratio") == 0.75
+    assert RUNTIME_GAUGE.value(component="model:a", stat="circuit_open") == 1
+
+    lines = RUNTIME_GAUGE.render()
+    assert "# TYPE recipe_runtime gauge" in lines
+    assert not any('stat="hits"' in line or 'stat="hedges"' in line for line in lines)
+    assert "# TYPE recipe_runtime_events_total counter" in RUNTIME_EVENTS.render()
+
+def test_circuit_trip_is_counted_once_while_open():
+    pool = ModelPool(models=["a"], failure_threshold=2, reset_timeout=60, hedging=False)
+    for _ in range(4):
+        pool.record_failure("a")
+    assert pool.stats()["a"]["trips"] == 1
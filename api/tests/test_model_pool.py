@@ -0,0 +1,85 @@
+import pytest
+
+from app.services import model_pool
+from app.services.model_pool import CircuitBreaker, ModelPool
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(model_pool.time, "monotonic", fake)
+    return fake
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A probe that never reports back frees the slot after reset_timeout
+    clock.now += 30
+    assert breaker.allow()
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()  # one failure is enough in half-open state
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    assert breaker.trips == 2
+
+def test_pool_skips_models_with_open_circuits(clock):
+    pool = ModelPool(models=["a", "b"], failure_threshold=1, reset_timeout=30, hedging=False)
+    pool.record_failure("a")
+    assert pool.available() == ["b"]
+    clock.now += 30
+    assert pool.available() == ["a", "b"]
+
+def test_hedge_delay_uses_p95_once_enough_samples(clock):
+    pool = ModelPool(
+        models=["a"], hedging=True, hedge_delay=10, hedge_min_delay=1, hedge_min_samples=20
+    )
+    for seconds in range(1, 20):
+        pool.record_success("a", seconds / 10)
+    assert pool.hedge_delay("a") == 10
+
+    pool.record_success("a", 2.0)
+    assert pool.hedge_delay("a") == pytest.approx(1.9)
+
+    fast = ModelPool(models=["a"], hedge_delay=10, hedge_min_delay=1, hedge_min_samples=20)
+    for _ in range(20):
+        fast.record_success("a", 0.1)
+    assert fast.hedge_delay("a") == 1
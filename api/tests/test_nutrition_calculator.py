@@ -0,0 +1,53 @@
+import pytest
+
+from app.schemas import NutritionalInfo, Recipe
+from app.services.nutrition_calculator import (
+    COUNT, DEFAULT, MASS, VOLUME, NutritionCalculator, default_calculator, parse_amount
+)
+
+LLM_NUTRITION = NutritionalInfo(calories=321, protein="9g", carbs="40g")
+
+def _recipe(ingredients, servings=1) -> Recipe:
+    return Recipe(
+        id="r1", name="Test", ingredients=ingredients, instructions=["Cook"], cookingTime="10 minutes",
+        difficulty="Easy", nutrition=LLM_NUTRITION, servings=servings
+    )
+
+@pytest.mark.parametrize("line, parsed", [
+    ("1 1/2 cups rice", (1.5, VOLUME, 1.0)),
+    ("200g pasta", (200.0, MASS, 1.0)),
+    ("1,200 g flour", (1200.0, MASS, 1.0)),
+    ("1,5 kg potatoes", (1.5, MASS, 1000.0)),
+    ("½ cup milk", (0.5, VOLUME, 1.0)),
+    ("2-3 eggs", (2.5, COUNT, 1.0)),
+    ("salt to taste", (None, DEFAULT, 0.0)),
+])
+def test_parse_amount(line, parsed):
+    assert parse_amount(line) == pytest.approx(parsed)
+
+def test_lines_without_amount_do_not_count_towards_coverage():
+    calculator = NutritionCalculator(min_coverage=0.6)
+    _, coverage = calculator.calculate([
+        (["chicken", "rice", "egg"], 2),
+        (["200g rice", "2 eggs", "salt"], 2),
+    ])
+    assert coverage.tolist() == pytest.approx([0.0, 2 / 3])
+
+def test_recipe_without_quantities_keeps_llm_nutrition():
+    calculator = NutritionCalculator(min_coverage=0.6)
+    [recipe] = calculator.apply([_recipe(["chicken", "rice", "egg"])])
+    assert recipe.nutrition == LLM_NUTRITION
+
+def test_recipe_with_quantities_gets_calculated_nutrition():
+    calculator = NutritionCalculator(min_coverage=0.6)
+    [recipe] = calculator.apply([_recipe(["200g rice", "2 eggs", "salt"])])
+    # 200 g rice at 365 kcal/100 g, two 50 g eggs at 143 kcal/100 g, salt has none
+    assert recipe.nutrition.calories == 873
+    assert recipe.nutritionalInfo == recipe.nutrition
+
+def test_nutrition_is_calculated_from_default_portions_when_asked():
+    # Fallback recipes have no estimate to keep, so defaults are better than nothing
+    assert default_calculator().nutrition(["egg"], servings=1).calories == 72
+
+def test_default_calculator_is_shared():
+    assert default_calculator() is default_calculator()
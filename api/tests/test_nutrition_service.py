@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.nutrition_service import parse_grams
+
+@pytest.mark.parametrize("value, grams", [
+    ("2.5g", 2.5),
+    ("18 g", 18.0),
+    ("1,5 g", 1.5),
+    ("1,200mg", 1.2),
+    ("1,200.5 mg", 1.201),
+    ("12,000", 12000.0),
+    ("1,000-1,200 mg", 1.1),
+    ("10-12g", 11.0),
+    ("~20 grams", 20.0),
+    ("1.2 kg", 1200.0),
+    ("trace", 0.0),
+    (7, 7.0),
+])
+def test_parse_grams(value, grams):
+    assert parse_grams(value) == pytest.approx(grams)
+
+@pytest.mark.parametrize("value", [None, "", "n/a", "5 cups", True])
+def test_parse_grams_without_amount(value):
+    assert parse_grams(value) is None
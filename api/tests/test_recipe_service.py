@@ -0,0 +1,68 @@
+import asyncio
+
+from app.metrics import STREAMS_INTERRUPTED
+from app.schemas import NutritionalInfo, Recipe, RecipeAnalysisRequest
+from app.services.recipe_cache import RecipeCache, make_cache_key
+from app.services.recipe_service import RecipeService
+
+def _recipe(name: str) -> Recipe:
+    return Recipe(
+        id=name, name=name, ingredients=["rice"], instructions=["Cook"], cookingTime="10 minutes",
+        difficulty="Easy", nutrition=NutritionalInfo(calories=100, protein="1g", carbs="20g")
+    )
+
+class StreamingOpenRouter:
+    """Streams `recipes`, then fails if `error` is set"""
+
+    recipe_count = 3
+
+    def __init__(self, recipes, error=None):
+        self.recipes = recipes
+        self.error = error
+
+    async def stream_recipes(self, ingredients, usage):
+        for recipe in self.recipes:
+            yield recipe
+        if self.error is not None:
+            raise self.error
+
+class RecordingWriter:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, pending):
+        self.submitted.append(pending)
+
+def _stream(openrouter) -> tuple:
+    cache = RecipeCache()
+    writer = RecordingWriter()
+    service = RecipeService(openrouter, cache, writer=writer)
+
+    async def collect():
+        return [event async for event in service.stream_ingredients(RecipeAnalysisRequest(ingredients=["rice"]), use_cache=False)]
+
+    return asyncio.run(collect()), cache, writer
+
+def test_stream_failing_midway_is_not_cached_or_stored():
+    interrupted = STREAMS_INTERRUPTED.value()
+    events, cache, writer = _stream(StreamingOpenRouter([_recipe("A")], error=RuntimeError("connection reset")))
+
+    assert [event for event, _ in events] == ["recipe", "error"]
+    assert events[-1][1]["partial"] is True
+    assert cache.get(make_cache_key(["rice"])) is None
+    assert writer.submitted == []
+    assert STREAMS_INTERRUPTED.value() == interrupted + 1
+
+def test_complete_stream_is_cached_and_stored():
+    events, cache, writer = _stream(StreamingOpenRouter([_recipe("A"), _recipe("B"), _recipe("C")]))
+
+    assert [event for event, _ in events] == ["recipe"] * 3 + ["done"]
+    assert len(cache.get(make_cache_key(["rice"]))) == 3
+    assert len(writer.submitted) == 1
+
+def test_stream_failing_before_any_recipe_serves_fallbacks():
+    events, cache, writer = _stream(StreamingOpenRouter([], error=RuntimeError("connection refused")))
+
+    assert events[-1][0] == "done"
+    assert "fallback" in events[-1][1]["message"]
+    assert writer.submitted == []
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import create_database_engine, init_database
+from app.models import RecipeAnalysis
+from app.services.similar_index import SimilarAnalysisIndex
+
+async def _database(path: str, analyses: dict) -> async_sessionmaker:
+    engine = create_database_engine(f"sqlite+aiosqlite:///{path}")
+    await init_database(engine)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await _store(session_factory, analyses)
+    return session_factory
+
+async def _store(session_factory: async_sessionmaker, analyses: dict) -> None:
+    async with session_factory() as db:
+        db.add_all(RecipeAnalysis(id=analysis_id, ingredients=json.dumps(ingredients)) for analysis_id, ingredients in analyses.items())
+        await db.commit()
+
+async def _loaded(session_factory: async_sessionmaker, path: str, **settings) -> SimilarAnalysisIndex:
+    index = SimilarAnalysisIndex(path=path, **settings)
+    await index.load_and_catch_up(session_factory)
+    return index
+
+async def _saved(session_factory: async_sessionmaker, path: str) -> None:
+    index = await _loaded(session_factory, path)
+    await index.save()
+    index.close()
+
+def test_snapshot_is_loaded_and_caught_up(tmp_path):
+    async def run():
+        snapshot = str(tmp_path / "similar_index.pkl")
+        session_factory = await _database(str(tmp_path / "a.db"), {"a1": ["egg", "milk", "flour"]})
+        await _saved(session_factory, snapshot)
+        await _store(session_factory, {"a2": ["rice", "beans", "onion"]})
+
+        index = await _loaded(session_factory, snapshot)
+        assert index.find(["egg", "milk", "flour", "salt"])[0] == "a1"
+        assert index.find(["rice", "beans", "onion"])[0] == "a2"
+        assert index._loaded_id == "a2"
+    asyncio.run(run())
+
+def test_snapshot_from_another_database_is_rebuilt(tmp_path):
+    async def run():
+        snapshot = str(tmp_path / "similar_index.pkl")
+        other = await _database(str(tmp_path / "other.db"), {"other": ["egg", "milk", "flour"]})
+        await _saved(other, snapshot)
+
+        session_factory = await _database(str(tmp_path / "a.db"), {"a1": ["rice", "beans", "onion"]})
+        index = await _loaded(session_factory, snapshot)
+        assert index.find(["egg", "milk", "flour"]) is None
+        assert index.find(["rice", "beans", "onion"])[0] == "a1"
+    asyncio.run(run())
+
+def test_snapshot_is_rebuilt_when_its_cursor_analysis_is_missing(tmp_path):
+    async def run():
+        snapshot = str(tmp_path / "similar_index.pkl")
+        database = str(tmp_path / "a.db")
+        session_factory = await _database(database, {"old": ["egg", "milk", "flour"]})
+        await _saved(session_factory, snapshot)
+
+        # Same URL, different contents
+        os.remove(database)
+        session_factory = await _database(database, {"new": ["rice", "beans", "onion"]})
+        index = await _loaded(session_factory, snapshot)
+        assert index.find(["egg", "milk", "flour"]) is None
+        assert index.find(["rice", "beans", "onion"])[0] == "new"
+    asyncio.run(run())
+
+def test_snapshot_with_other_settings_is_ignored(tmp_path):
+    async def run():
+        snapshot = str(tmp_path / "similar_index.pkl")
+        session_factory = await _database(str(tmp_path / "a.db"), {"a1": ["egg", "milk", "flour"]})
+        await _saved(session_factory, snapshot)
+
+        index = SimilarAnalysisIndex(path=snapshot, bands=8)
+        index._database = session_factory.kw["bind"].url.render_as_string(hide_password=True)
+        assert index._read_snapshot() is None
+    asyncio.run(run())
+
+def test_only_one_index_saves_a_shared_path(tmp_path):
+    async def run():
+        snapshot = str(tmp_path / "similar_index.pkl")
+        session_factory = await _database(str(tmp_path / "a.db"), {"a1": ["egg", "milk", "flour"]})
+        first = await _loaded(session_factory, snapshot)
+        second = await _loaded(session_factory, snapshot)
+        first.add("a2", ["rice", "beans"])
+        second.add("a3", ["kale", "garlic"])
+
+        await first.save()
+        await second.save()
+        assert second._dirty
+
+        first.close()
+        await second.save()
+        assert not second._dirty
+        second.close()
+    asyncio.run(run())
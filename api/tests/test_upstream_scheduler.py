@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.model_pool import CircuitBreaker, ModelPool
+from app.services.openrouter_service import OpenRouterService
+from app.services.upstream_scheduler import UpstreamBusyError, UpstreamHTTPError, UpstreamScheduler
+
+def _scheduler() -> UpstreamScheduler:
+    return UpstreamScheduler(
+        max_concurrency=4, rate_per_second=0, max_queue=10, max_retries=3, retry_base_delay=0.5, retry_max_delay=10
+    )
+
+def _throttled_then_ok(retry_after: float):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if len(calls) == 1:
+            raise UpstreamHTTPError(429, "rate limited", retry_after=retry_after)
+        return "ok"
+
+    return call, calls
+
+def test_long_retry_after_is_passed_on_as_busy():
+    call, calls = _throttled_then_ok(retry_after=60)
+    with pytest.raises(UpstreamBusyError) as raised:
+        asyncio.run(_scheduler().run(call))
+    assert raised.value.retry_after == 60
+    assert len(calls) == 1
+
+def test_retry_after_is_honoured_with_jitter(monkeypatch):
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    for _ in range(20):
+        call, _ = _throttled_then_ok(retry_after=2)
+        assert asyncio.run(_scheduler().run(call)) == "ok"
+    assert all(2 <= delay <= 2.5 for delay in delays)
+    assert len(set(delays)) > 1
+
+@pytest.mark.parametrize("status, headers, counts", [
+    (429, {}, False),
+    (503, {"Retry-After": "5"}, False),
+    (500, {}, True),
+])
+def test_only_real_failures_count_towards_the_circuit_breaker(monkeypatch, status, headers, counts):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    pool = ModelPool(models=["a"], failure_threshold=1, reset_timeout=60, hedging=False)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(status, headers=headers)))
+    service = OpenRouterService(client, model_pool=pool)
+
+    with pytest.raises(Exception):
+        asyncio.run(service.generate_recipes(["rice"]))
+    expected = CircuitBreaker.OPEN if counts else CircuitBreaker.CLOSED
+    assert pool.breakers["a"].state == expected